@@ -1,4 +1,10 @@
 import opendssdirect as dss
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+
+import dss_model
 
 def check_system_conditions():
     """Check and report system conditions that might cause convergence issues"""
@@ -47,12 +53,11 @@ def check_system_conditions():
         dss.Text.Command('Redirect loads.dss')
         dss.Circuit.SetActiveClass('Load')
         n_loads = len(dss.ActiveClass.AllNames())
-        total_mw = 0
-        total_mvar = 0
-        for load_name in dss.ActiveClass.AllNames():
-            dss.Circuit.SetActiveElement(f'Load.{load_name}')
-            total_mw += float(dss.Properties.Value('kW')) / 1000
-            total_mvar += float(dss.Properties.Value('kvar')) / 1000
+        
+        # Total demand straight from the parsed file rather than one engine query per load
+        loads = dss_model.load_model(files=['loads.dss'])['loads']
+        total_mw = loads['kw'][loads['enabled']].sum() / 1000
+        total_mvar = loads['kvar'][loads['enabled']].sum() / 1000
         print(f"Found {n_loads} loads")
         print(f"Total load: {total_mw:.1f} MW + j{total_mvar:.1f} MVAR")
         
@@ -1,21 +1,32 @@
 import matplotlib.pyplot as plt
 import numpy as np
+import sys
 
-# Data for critical buses
-critical_buses = {
-    '69_SPORN': {
-        'initial': 0.161,
-        'with_inverter': 0.361,  # 0.161 + 0.20 (expected improvement)
-        'target': 0.95,
-        'inverter_capacity': '3×50 MVAR'
-    },
-    '77_TURNER': {
-        'initial': 0.227,
-        'with_inverter': 0.377,  # 0.227 + 0.15 (expected improvement)
-        'target': 0.95,
-        'inverter_capacity': '2×50 MVAR'
+from modal_analysis import scenario_critical_buses
+
+# Inverter units of 50 MVAR at the two most critical buses
+INVERTER_UNITS = [3, 2]
+INVERTER_MVAR = 50
+
+# Minimum acceptable voltage the inverters aim for (pu)
+TARGET_VOLTAGE = 0.95
+
+# The two buses taking part most in the least stable Q-V mode
+scenario = scenario_critical_buses(count=len(INVERTER_UNITS))
+if scenario is None:
+    sys.exit(1)
+
+# Expected improvement from each bus's own dV/dQ, capped at the target; a bus
+# already above the target keeps its voltage
+critical_buses = {}
+for bus, voltage, sensitivity, units in zip(scenario['Bus'], scenario['Voltage'],
+                                            scenario['Sensitivity'], INVERTER_UNITS):
+    critical_buses[bus] = {
+        'initial': voltage,
+        'with_inverter': max(voltage, min(voltage + sensitivity * units * INVERTER_MVAR, TARGET_VOLTAGE)),
+        'target': TARGET_VOLTAGE,
+        'inverter_capacity': f'{units}×{INVERTER_MVAR} MVAR'
     }
-}
 
 # Create figure
 plt.figure(figsize=(12, 6))
@@ -33,7 +44,8 @@ plt.bar(bars + width, [v['target'] for v in critical_buses.values()],
         width, label='Target', color='green', alpha=0.7)
 
 # Add reference line for minimum acceptable voltage
-plt.axhline(y=0.95, color='g', linestyle='--', alpha=0.5, label='Minimum Acceptable (0.95 pu)')
+plt.axhline(y=TARGET_VOLTAGE, color='g', linestyle='--', alpha=0.5,
+            label=f'Minimum Acceptable ({TARGET_VOLTAGE} pu)')
 
 # Customize plot
 plt.title('Voltage Improvement with Smart Inverter Implementation\nfor Critical Buses', fontsize=14, pad=20)
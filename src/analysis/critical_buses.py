@@ -2,14 +2,14 @@ import matplotlib
 matplotlib.use('Agg')  # Force non-interactive backend
 import matplotlib.pyplot as plt
 import numpy as np
+import sys
 
-# Critical bus data
-data = {
-    'Bus': ['89_CLINCHRV', '92_SALTVLLE', '77_TURNER', '85_BEAVERCK', '69_SPORN'],
-    'Voltage': [0.678, 0.550, 0.227, 0.526, 0.161],
-    'Loss_In': [11601.50, 8710.97, 8700.41, 3601.15, 2409.80],
-    'Loss_Out': [8710.97, 8700.41, 3601.15, 2409.80, 0.0]
-}
+from modal_analysis import scenario_critical_buses
+
+# Critical bus data: the buses of the least stable Q-V mode of the solved circuit
+data = scenario_critical_buses()
+if data is None:
+    sys.exit(1)
 
 # Create figure with two subplots
 fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
@@ -62,11 +62,12 @@ with open('critical_buses_analysis.txt', 'w') as f:
     f.write("===========================================\n\n")
     
     f.write("1. Voltage Profile:\n")
+    f.write(f"Least stable Q-V mode eigenvalue: {data['Eigenvalue']:.4f}\n")
     f.write("-" * 50 + "\n")
-    f.write(f"{'Bus':<15} {'Voltage (pu)':<15}\n")
+    f.write(f"{'Bus':<15} {'Voltage (pu)':<15} {'Participation':<15}\n")
     f.write("-" * 50 + "\n")
     for i in range(len(data['Bus'])):
-        f.write(f"{data['Bus'][i]:<15} {data['Voltage'][i]:<15.3f}\n")
+        f.write(f"{data['Bus'][i]:<15} {data['Voltage'][i]:<15.3f} {data['Participation'][i]:<15.3f}\n")
     
     f.write("\n2. Power Loss Flow:\n")
     f.write("-" * 50 + "\n")
@@ -1,31 +1,30 @@
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+
+import dss_model
 
 def fix_generators():
     """Fix the generators.dss file by uncommenting the swing bus"""
     try:
-        # Read the file
-        with open('generators.dss', 'r') as f:
-            lines = f.readlines()
-        
-        # Create a backup
-        with open('generators.dss.bak', 'w') as f:
-            f.writelines(lines)
-        
-        # Find and fix the swing bus line
-        fixed_lines = []
-        for line in lines:
-            if '! New Generator.Gen_at_89_1' in line:
-                # Uncomment the line
-                fixed_line = line.replace('! New Generator.Gen_at_89_1', 'New Generator.Gen_at_89_1')
-                fixed_lines.append(fixed_line)
-                print(f"Fixed line: {line.strip()} -> {fixed_line.strip()}")
-            else:
-                fixed_lines.append(line)
-        
-        # Write the fixed file
-        with open('generators_fixed.dss', 'w') as f:
-            f.writelines(fixed_lines)
+        # Enable the swing bus definition, however it is commented out or formatted
+        changed = dss_model.edit_file('generators.dss', 'generators_fixed.dss',
+                                      [['enable', dss_model.SWING_GENERATOR]])
+        if changed is None:
+            print("generators_fixed.dss is up to date with generators.dss")
+            return True
+        elif not changed:
+            # Nothing to uncomment: the output is valid as long as the swing bus is defined
+            if dss_model.find_definition(dss_model.read_source('generators.dss'),
+                                         dss_model.SWING_GENERATOR) is None:
+                print(f"Swing bus generator {dss_model.SWING_GENERATOR} is not defined.")
+                return False
+            print("Swing bus is already active")
+            print(f"Created fixed file: generators_fixed.dss")
+            return True
         
+        print("Uncommented swing bus generator")
         print(f"Created fixed file: generators_fixed.dss")
         print("To use this file, modify master_file.dss to redirect to generators_fixed.dss instead of generators.dss")
         
@@ -1,127 +1,82 @@
+import opendssdirect as dss
 import os
-import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'simulation'))
+
+import circuit_builder
+import dss_model
 
 def fix_generators_file():
     """Fix the swing bus in the generators.dss file"""
     print("Fixing swing bus in generators.dss file...")
     
-    # Read the generators file
     try:
-        with open('generators.dss', 'r') as f:
-            content = f.read()
-        
-        # Check if the swing bus is commented out
-        swing_pattern = r'! swing bus - bus: 89_clinchrv\s*\n! New Generator\.Gen_at_89_1'
-        if re.search(swing_pattern, content):
-            print("Found commented swing bus. Uncommenting and fixing...")
-            
-            # Uncomment the swing bus
-            fixed_content = content.replace(
-                '! swing bus - bus: 89_clinchrv\n! New Generator.Gen_at_89_1',
-                '! swing bus - bus: 89_clinchrv\nNew Generator.Gen_at_89_1'
-            )
-            
-            # Create a backup of the original file
-            backup_file = 'generators.dss.bak'
-            with open(backup_file, 'w') as f:
-                f.write(content)
-            print(f"Created backup of original file: {backup_file}")
-            
-            # Write the fixed content
-            with open('generators.dss', 'w') as f:
-                f.write(fixed_content)
+        # Enable the swing bus definition in place, keeping a backup of the original
+        changed = dss_model.edit_file('generators.dss', 'generators.dss',
+                                      [['enable', dss_model.SWING_GENERATOR]],
+                                      backup='generators.dss.bak')
+        if changed is None:
+            print("generators.dss was already fixed and has not changed since")
+            return True
+        elif changed:
+            print("Created backup of original file: generators.dss.bak")
             print("Fixed generators.dss file")
-            
             return True
         else:
-            print("Swing bus is not commented out or has a different format.")
+            print("Swing bus is not commented out or is not defined.")
             return False
     
     except Exception as e:
         print(f"Error fixing generators file: {str(e)}")
         return False
 
-def create_modified_generators_file():
-    """Create a modified version of the generators file with the swing bus fixed"""
-    print("Creating modified generators file...")
+def build_fixed_circuit():
+    """Build the circuit with the swing bus fixed, held in memory
+    
+    The generator definitions are read with the swing bus uncommented, so
+    neither a fixed generators file nor a fixed master file is written.
+    """
+    print("Building circuit with fixed swing bus in memory...")
     
     try:
-        # Read the original file
-        with open('generators.dss', 'r') as f:
-            lines = f.readlines()
+        builder = circuit_builder.new_builder()
         
-        # Create a new file
-        with open('generators_fixed.dss', 'w') as f:
-            for line in lines:
-                # Check if this is the commented swing bus line
-                if '! New Generator.Gen_at_89_1' in line:
-                    # Uncomment the line and write it
-                    f.write(line.replace('! New Generator.Gen_at_89_1', 'New Generator.Gen_at_89_1'))
-                else:
-                    # Write the line as is
-                    f.write(line)
+        # Define the circuit
+        circuit_builder.add_stage(builder, "Circuit definition", [
+            'Clear',
+            'Set DefaultBaseFrequency=50',
+            'New Circuit.ieee118bus basekv=138.0 phases=3 pu=1.005 angle=39.69 frequency=50.0 '
+            'baseMVA=728.5374813610073 puZ1=[0.001, 0.2] bus1=89_clinchrv'
+        ], solve=False)
         
-        print("Created generators_fixed.dss with uncommented swing bus")
+        # Load circuit components, with the swing bus uncommented
+        commands = circuit_builder.read_commands('generators.dss', [['enable', dss_model.SWING_GENERATOR]])
+        for name in ['lines.dss', 'transformers.dss', 'loads.dss', 'shunts.dss',
+                     'sw_shunts.dss', 'dc_and_facts_equiv_elements.dss']:
+            commands += circuit_builder.read_commands(name)
+        circuit_builder.add_stage(builder, "Circuit components", commands, solve=False)
         
-        # Create a modified master file that uses the fixed generators file
-        with open('master_file_fixed.dss', 'w') as f:
-            f.write("""Clear
-
-! Set system base frequency
-Set DefaultBaseFrequency=50
-
-! Define the circuit
-New Circuit.ieee118bus
-~ basekv=138.0 
-~ phases=3 
-~ pu=1.005 
-~ angle=39.69 
-~ frequency=50.0 
-~ baseMVA=728.5374813610073 
-~ puZ1=[0.001, 0.2] 
-~ bus1=89_clinchrv
-
-! Load circuit components
-! Generator definitions (choose one)
-redirect generators_fixed.dss              ! Using fixed generator models with swing bus
-
-! Load other circuit elements
-redirect lines.dss                   ! Line definitions
-redirect transformers.dss            ! Transformer definitions
-redirect loads.dss                   ! Load definitions
-redirect shunts.dss                  ! Fixed shunt definitions
-redirect sw_shunts.dss              ! Switched shunt definitions
-redirect dc_and_facts_equiv_elements.dss     ! DC and FACTS elements
-
-! Set voltage bases and calculate voltage bases for all buses
-Set VoltageBases = [138.0]
-Calcv
-redirect confirm_kv_bases.dss
-
-! Solution parameters
-set algorithm=NEWTON                   ! Newton method
-set maxcontroliter=100              ! Maximum control iterations
-set maxiterations=1000               ! Maximum power flow iterations
-set tolerance=0.01                ! Relaxed convergence tolerance
-set controlmode=OFF                 ! Disable automatic controls initially
-
-! Solve options
-set loadmodel=1                     ! Constant power load model
-Solve mode=snap                     ! Snapshot power flow solution
-
-! Show results
-show voltages ln Nodes              ! Show voltage profile
-show powers MVA Elem                ! Show power flows
-show losses                         ! Show system losses
-summary                             ! Show system summary
-""")
+        # Set voltage bases and solution parameters, then solve a snapshot power flow
+        circuit_builder.add_stage(builder, "Snapshot solution", [
+            'Set VoltageBases=[138.0]',
+            'Calcv'
+        ] + circuit_builder.read_commands('confirm_kv_bases.dss') + [
+            'set algorithm=NEWTON',
+            'set maxcontroliter=100',
+            'set maxiterations=1000',
+            'set tolerance=0.01',
+            'set controlmode=OFF',
+            'set loadmodel=1',
+            'set mode=snap'
+        ])
         
-        print("Created master_file_fixed.dss that uses the fixed generators file")
-        return True
+        return builder
     
     except Exception as e:
-        print(f"Error creating modified files: {str(e)}")
-        return False
+        print(f"Error building fixed circuit: {str(e)}")
+        return None
 
 def main():
     """Main function"""
@@ -132,13 +87,29 @@ def main():
     # Try to fix the generators file directly
     if fix_generators_file():
         print("\nSuccessfully fixed generators.dss file.")
+        return
+    
+    # If direct fix fails, fix the circuit in memory instead of modifying original files
+    builder = build_fixed_circuit()
+    if not builder:
+        print("\nFailed to fix the swing bus issue.")
+        return
+    
+    # Only write a master file when asked to
+    if '--export' in sys.argv:
+        circuit_builder.export(builder, 'master_file_fixed.dss')
+        print("Exported master_file_fixed.dss with the fixed swing bus")
+    
+    if not dss.Basic.Start(0):
+        print("ERROR: Failed to start OpenDSS engine")
+        return
+    
+    if circuit_builder.send(builder):
+        losses = dss.Circuit.Losses()
+        print(f"\nCircuit with fixed swing bus converged: {dss.Circuit.NumBuses()} buses, "
+              f"losses {losses[0] / 1000000:.2f} MW")
     else:
-        # If direct fix fails, create modified files
-        if create_modified_generators_file():
-            print("\nCreated modified files instead of modifying original files.")
-            print("To use the fixed files, run OpenDSS with master_file_fixed.dss")
-        else:
-            print("\nFailed to fix the swing bus issue.")
+        print("\nCircuit with fixed swing bus did not converge.")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
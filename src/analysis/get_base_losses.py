@@ -1,4 +1,10 @@
 import opendssdirect as dss
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+
+from state_extraction import get_bus_state, get_element_state
 
 def get_base_case_losses():
     """Get losses for base case"""
@@ -45,15 +51,10 @@ def get_base_case_losses():
         reactive_loss = losses[1]/1000  # Convert to MVAR
         
         # Get voltage range
-        voltages = []
-        dss.Circuit.SetActiveBus("")
-        for bus in dss.Circuit.AllBusNames():
-            dss.Circuit.SetActiveBus(bus)
-            v_mag = dss.Bus.puVmagAngle()[0]
-            voltages.append(v_mag)
+        voltages = get_bus_state()['v_pu']
         
-        min_v = min(voltages)
-        max_v = max(voltages)
+        min_v = voltages.min()
+        max_v = voltages.max()
         
         # Print results
         print("\nBase Case Results:")
@@ -63,12 +64,12 @@ def get_base_case_losses():
         
         # Get individual line losses
         print("\nMajor Line Losses:")
-        dss.Circuit.SetActiveClass('Line')
-        for line_name in dss.ActiveClass.AllNames():
-            dss.Circuit.SetActiveElement(f'Line.{line_name}')
-            line_losses = dss.CktElement.Losses()
-            if abs(line_losses[0]) > 1000000:  # Show lines with losses > 1 MW
-                print(f"{line_name}: {line_losses[0]/1000000:.2f} MW")
+        elements = get_element_state()
+        for name, loss_kw in zip(elements['element_names'], elements['loss_kw']):
+            if not name.lower().startswith('line.'):
+                continue
+            if abs(loss_kw) > 1000:  # Show lines with losses > 1 MW
+                print(f"{name.split('.', 1)[1]}: {loss_kw/1000:.2f} MW")
         
     except Exception as e:
         print(f"\nError: {str(e)}")
@@ -0,0 +1,317 @@
+import opendssdirect as dss
+import numpy as np
+import os
+import sys
+import time
+from scipy import linalg
+from scipy.sparse.linalg import ArpackNoConvergence, LinearOperator, eigs
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'simulation'))
+
+import admittance
+import native_powerflow
+import time_series
+from dss_model import bus_name
+
+# Smallest Q-V modes computed per operating point
+MODES = 3
+
+# Critical buses reported per scenario
+CRITICAL_COUNT = 5
+
+# Relative accuracy ARPACK stops at; participation factors need far less
+EIGS_TOLERANCE = 1e-6
+
+def qv_operator(factor, transpose=False):
+    """Inverse of the reduced Q-V Jacobian as an operator on the PQ buses
+
+    The reduced Jacobian J_QV - J_Qθ J_Pθ^-1 J_PV is the inverse of the
+    Q-V block of the inverse full Jacobian, so with the sparse full
+    Jacobian factorization of admittance.factorize_jacobian() it is applied
+    with one solve and never formed. transpose applies its transpose, for
+    the left eigenvectors.
+    """
+    n_pvpq = len(factor['pvpq'])
+    size = n_pvpq + len(factor['pq'])
+    trans = 'T' if transpose else 'N'
+
+    def apply(x):
+        x = np.asarray(x, dtype=float)
+        rhs = np.zeros((size,) + x.shape[1:])
+        rhs[n_pvpq:] = x
+        return factor['lu'].solve(rhs, trans=trans)[n_pvpq:]
+
+    return apply
+
+def qv_modes(factor, modes=MODES):
+    """Smallest eigenvalues of the reduced Q-V Jacobian and the participation factors of their modes
+
+    The smallest eigenvalues are the largest of the inverse, which ARPACK
+    finds with a few solves of the existing factorization. Returns a dict
+    with the 'eigenvalues' (Mvar per pu voltage per 100 MVA, smallest
+    magnitude first; a small positive value is a mode close to voltage
+    collapse and a negative one is past it), the 'participation' of every
+    PQ bus ('buses', positions in the Ybus) in each mode, one column per
+    mode, and the right and left eigenvectors.
+    """
+    n_pq = len(factor['pq'])
+    apply = qv_operator(factor)
+    apply_transpose = qv_operator(factor, transpose=True)
+    modes = min(modes, n_pq)
+    mu = None
+
+    # ARPACK needs at least two more buses than modes
+    if modes < n_pq - 1:
+        try:
+            operator = LinearOperator((n_pq, n_pq), matvec=apply, dtype=float)
+            operator_t = LinearOperator((n_pq, n_pq), matvec=apply_transpose, dtype=float)
+            mu, right = eigs(operator, k=modes, which='LM', tol=EIGS_TOLERANCE)
+            mu_t, left = eigs(operator_t, k=modes, which='LM', tol=EIGS_TOLERANCE)
+
+            # The transpose has the same eigenvalues; pair each with its left eigenvector
+            left = left[:, [np.argmin(np.abs(mu_t - m)) for m in mu]]
+        except ArpackNoConvergence:
+            mu = None
+
+    if mu is None:
+        # Small systems, or ARPACK giving up: form the inverse reduced Jacobian densely
+        mu, left, right = linalg.eig(apply(np.eye(n_pq)), left=True, right=True)
+        keep = np.argsort(-np.abs(mu))[:modes]
+        mu, left, right = mu[keep], left[:, keep].conj(), right[:, keep]
+
+    eigenvalues = 1 / mu
+    order = np.argsort(np.abs(eigenvalues))
+    eigenvalues, right, left = eigenvalues[order], right[:, order], left[:, order]
+
+    # p_ki = right_ki left_ki with the pair normalized so each mode's factors sum to one
+    participation = (right * left / np.sum(right * left, axis=0)).real
+
+    return {
+        'eigenvalues': eigenvalues.real,
+        'participation': participation,
+        'buses': factor['pq'],
+        'bus_names': factor['bus_names'][factor['pq']],
+        'right': right,
+        'left': left
+    }
+
+def rank_buses(analysis, v, count=CRITICAL_COUNT):
+    """(bus name, participation factor, voltage in pu) of the buses taking part most in the least stable mode"""
+    participation = analysis['participation'][:, 0]
+    ranked = np.argsort(-participation)[:count]
+    return [(str(analysis['bus_names'][k]), float(participation[k]), float(np.abs(v[analysis['buses'][k]])))
+            for k in ranked]
+
+def critical_buses(ymatrix, v, pv, count=CRITICAL_COUNT, modes=MODES, ds_demand=None):
+    """Buses taking part most in the least stable Q-V mode at a converged operating point
+
+    v holds the complex per unit voltages in the bus order of ymatrix and
+    pv the positions of the voltage-controlled buses. Returns the
+    qv_modes() result and the rank_buses() list, highest participation
+    first.
+    """
+    v = np.asarray(v, dtype=complex)
+    analysis = qv_modes(admittance.factorize_jacobian(ymatrix, v, pv, ds_demand), modes)
+    return analysis, rank_buses(analysis, v, count)
+
+def track_critical_buses(ymatrix, voltages, pv, count=CRITICAL_COUNT, modes=MODES, ds_demand=None):
+    """Critical buses at every time step of a simulation
+
+    voltages holds one row of complex per unit bus voltages per time step,
+    in the bus order of ymatrix. The Jacobian sparsity pattern is built
+    once for the topology and PV buses and only refilled and factorized
+    per step. Rows with missing voltages give None. Returns one dict per
+    step with the least stable 'eigenvalue' and the critical 'buses' as
+    critical_buses() lists them.
+    """
+    steps = []
+    for v in voltages:
+        if not np.all(np.isfinite(v)) or np.any(v == 0):
+            steps.append(None)
+            continue
+        analysis, buses = critical_buses(ymatrix, v, pv, count, modes, ds_demand)
+        steps.append({'eigenvalue': float(analysis['eigenvalues'][0]), 'buses': buses})
+    return steps
+
+def most_critical(steps, count=CRITICAL_COUNT):
+    """Buses most often critical over a time series, by count and then by summed participation"""
+    score = {}
+    for step in steps:
+        if step is None:
+            continue
+        for name, participation, _ in step['buses']:
+            hits, total = score.get(name, (0, 0.0))
+            score[name] = (hits + 1, total + participation)
+    return sorted(score, key=lambda name: score[name], reverse=True)[:count]
+
+def cube_voltages(cube, ymatrix):
+    """Complex per unit voltages of a voltage cube in the bus order of ymatrix
+
+    The positive-sequence voltage of a balanced bus is its phase 1
+    voltage. Buses the cube does not hold are NaN.
+    """
+    n_times = cube['magnitude'].shape[0]
+    voltages = np.full((n_times, len(ymatrix['bus_names'])), np.nan, dtype=complex)
+
+    for i, name in enumerate(ymatrix['bus_names']):
+        k = cube['bus_index'].get(name.lower())
+        if k is not None:
+            voltages[:, i] = cube['magnitude'][:, k, 0] * np.exp(1j * np.radians(cube['angle'][:, k, 0]))
+    return voltages
+
+def load_scenario(load_mult=None):
+    """Load the converged 118-bus circuit into the engine, solved at load_mult if given"""
+    if not time_series.initialize_stabilized_circuit():
+        return False
+    if load_mult is None:
+        return True
+    return time_series.scale_loads_safely(load_mult) and time_series.try_solve_with_options()
+
+def branch_losses(buses, engine=dss):
+    """Losses of the branches at each of a set of buses, split by flow direction
+
+    Returns a dict of bus name to [loss in, loss out] in kW, where loss in
+    is the loss of the branches feeding the bus and loss out of those it
+    feeds, and the (bus, bus, loss in kW) branches between two of the
+    buses.
+    """
+    buses = [name.lower() for name in buses]
+    flows = {name: [0.0, 0.0] for name in buses}
+    between = []
+
+    if not engine.PDElements.First():
+        return flows, between
+    while True:
+        terminals = [bus_name(name) for name in engine.CktElement.BusNames()]
+        if len(terminals) == 2 and terminals[0] != terminals[1]:
+            loss = engine.CktElement.Losses()[0] / 1000
+            power = engine.CktElement.Powers()
+            p_from = sum(power[0:2 * engine.CktElement.NumConductors():2])
+
+            # Power enters terminal 1 when positive, so it flows from bus 1 to bus 2
+            sending, receiving = terminals if p_from >= 0 else terminals[::-1]
+            if sending in flows:
+                flows[sending][1] += loss
+            if receiving in flows:
+                flows[receiving][0] += loss
+            if sending in flows and receiving in flows:
+                between.append((sending, receiving, loss))
+
+        if not engine.PDElements.Next():
+            break
+    return flows, between
+
+def scenario_critical_buses(count=CRITICAL_COUNT, load_mult=None, engine=dss):
+    """Critical buses of the circuit solved in the engine, as the analysis scripts plot them
+
+    Loads the 118-bus circuit first (at load_mult if given) unless engine
+    is another context that already holds a solved circuit. Returns a dict
+    of lists: 'Bus', 'Voltage' (pu), 'Participation', 'Sensitivity' (dV/dQ
+    of the bus itself, pu per Mvar), 'Loss_In' and 'Loss_Out' (kW), plus
+    the least stable 'Eigenvalue' and the 'Branches' between critical
+    buses. Returns None if the circuit cannot be solved.
+    """
+    try:
+        if engine is dss and not load_scenario(load_mult):
+            print("ERROR: Could not solve the circuit for the modal analysis")
+            return None
+
+        ymatrix = admittance.ymatrix_from_engine(engine)
+        v, pv = admittance.engine_operating_point(ymatrix, engine)
+
+        # One factorization serves the eigen-solve and the sensitivities
+        factor = admittance.factorize_jacobian(ymatrix, v, pv)
+        analysis = qv_modes(factor)
+        buses = rank_buses(analysis, v, count)
+        names = [name for name, _, _ in buses]
+
+        positions = [ymatrix['bus_index'][name] for name in names]
+        sensitivities = admittance.voltage_sensitivities(factor, positions)
+        flows, between = branch_losses(names, engine)
+
+        return {
+            'Bus': [name.upper() for name in names],
+            'Voltage': [voltage for _, _, voltage in buses],
+            'Participation': [participation for _, participation, _ in buses],
+            'Sensitivity': [float(sensitivities['dv_dq'][k, i]) for i, k in enumerate(positions)],
+            'Loss_In': [flows[name][0] for name in names],
+            'Loss_Out': [flows[name][1] for name in names],
+            'Eigenvalue': float(analysis['eigenvalues'][0]),
+            'Branches': [(a.upper(), b.upper(), loss) for a, b, loss in between]
+        }
+
+    except Exception as e:
+        print(f"ERROR in modal analysis: {str(e)}")
+        return None
+
+def cube_critical_buses(cube, count=CRITICAL_COUNT):
+    """Critical buses at every time step of a voltage cube
+
+    The circuit is loaded into the engine for its Ybus and PV buses only;
+    the voltages are those the simulation stored. Returns the
+    track_critical_buses() steps, or None if the circuit cannot be loaded.
+    """
+    try:
+        if not load_scenario():
+            print("ERROR: Could not load the circuit for the modal analysis")
+            return None
+
+        ymatrix = admittance.ymatrix_from_engine()
+        _, pv = admittance.engine_operating_point(ymatrix)
+        return track_critical_buses(ymatrix, cube_voltages(cube, ymatrix), pv, count)
+
+    except Exception as e:
+        print(f"ERROR in modal analysis of the voltage cube: {str(e)}")
+        return None
+
+def main():
+    print("=" * 80)
+    print(" Q-V MODAL ANALYSIS OVER THE DAILY LOAD PROFILE")
+    print("=" * 80)
+
+    dss_dir = sys.argv[1] if len(sys.argv) > 1 else '.'
+    load_mult = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+
+    # Operating points from the native power flow, which uses the Ybus bus order
+    network = native_powerflow.build_network(dss_dir)
+    ymatrix = admittance.ymatrix_from_model(network)
+
+    # The first hour starts flat, every other hour from the last solved one
+    voltages = []
+    pv = None
+    v = None
+    for multiplier in time_series.BASE_LOAD_MULTIPLIERS:
+        result = native_powerflow.solve_power_flow(network, load_mult=multiplier * load_mult, v0=v)
+        if not result['converged']:
+            voltages.append(np.full(ymatrix['y'].shape[0], np.nan, dtype=complex))
+            continue
+        v = result['v']
+        voltages.append(v)
+
+        # Modal analysis needs one PV set; keep the buses that held their voltage all day
+        pv = result['pv_buses'] if pv is None else np.intersect1d(pv, result['pv_buses'])
+
+    if pv is None:
+        print(f"FAILED: Power flow did not converge at any hour at {load_mult:.0%} load")
+        return
+
+    start_time = time.perf_counter()
+    steps = track_critical_buses(ymatrix, voltages, pv)
+    elapsed = time.perf_counter() - start_time
+    solved = sum(step is not None for step in steps)
+    print(f"Modal analysis of {solved} hours in {elapsed:.3f} s "
+          f"({elapsed / max(solved, 1) * 1000:.1f} ms per hour)")
+
+    print("\nHour  Load   Eigenvalue  Critical buses (participation)")
+    for hour, (multiplier, step) in enumerate(zip(time_series.BASE_LOAD_MULTIPLIERS, steps)):
+        if step is None:
+            print(f"{hour:>4}  {multiplier:.2f}   did not converge")
+            continue
+        buses = ', '.join(f"{name} ({participation:.2f})" for name, participation, _ in step['buses'][:3])
+        print(f"{hour:>4}  {multiplier:.2f}   {step['eigenvalue']:>10.4f}  {buses}")
+
+    print(f"\nMost critical over the day: {', '.join(most_critical(steps))}")
+
+if __name__ == "__main__":
+    main()
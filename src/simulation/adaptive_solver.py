@@ -0,0 +1,97 @@
+import json
+import math
+import os
+import threading
+
+# Convergence statistics live next to the DSS files and persist between runs
+STATS_FILE = '.solver_stats.json'
+
+# Width of one operating region, in load multiplier
+REGION_WIDTH = 0.05
+
+# Options that failed this often in a region without ever converging are skipped there
+SKIP_AFTER_FAILURES = 3
+
+# Statistics loaded from disk, keyed by the absolute path of their file
+_stats = {}
+
+# Sessions solving in several threads record into the same statistics
+_lock = threading.RLock()
+
+def option_key(options):
+    """Key identifying a solver option set"""
+    return f"{options['algorithm']}/{options['iterations']}/{options['tolerance']}"
+
+def region_key(load_mult):
+    """Key of the operating region a load multiplier falls in"""
+    return f"{math.floor(load_mult / REGION_WIDTH + 1e-9) * REGION_WIDTH:.2f}"
+
+def load_stats(path=STATS_FILE):
+    """Statistics for a stats file, read from disk the first time"""
+    path = os.path.abspath(path)
+    with _lock:
+        if path not in _stats:
+            _stats[path] = {}
+            if os.path.isfile(path):
+                try:
+                    with open(path, 'r') as f:
+                        _stats[path] = json.load(f)
+                except Exception as e:
+                    print(f"WARNING: Ignoring unreadable solver statistics {path}: {str(e)}")
+        return _stats[path]
+
+def save_stats(path=STATS_FILE):
+    """Write the statistics back to disk"""
+    stats = load_stats(path)
+    path = os.path.abspath(path)
+
+    try:
+        # Write to a scratch file first so a half-written file is never read
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with _lock, open(tmp_path, 'w') as f:
+            json.dump(stats, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, path)
+        return True
+    except Exception as e:
+        print(f"ERROR saving solver statistics: {str(e)}")
+        return False
+
+def record(options, load_mult, converged, elapsed, iterations, path=STATS_FILE):
+    """Record the outcome of one solve attempt"""
+    with _lock:
+        region = load_stats(path).setdefault(region_key(load_mult), {})
+        entry = region.setdefault(option_key(options), {
+            'successes': 0,
+            'failures': 0,
+            'total_time': 0.0,
+            'total_iterations': 0
+        })
+
+        entry['successes' if converged else 'failures'] += 1
+        entry['total_time'] += elapsed
+        entry['total_iterations'] += iterations
+
+def order_options(solution_options, load_mult, path=STATS_FILE):
+    """The solver options to try in this operating region
+
+    solution_options are listed most accurate first and keep that order,
+    so a faster but looser option never takes over a region unnoticed.
+    Options that failed SKIP_AFTER_FAILURES times here without ever
+    converging are left out, unless that would leave nothing to try.
+    """
+    region = load_stats(path).get(region_key(load_mult), {})
+
+    kept = []
+    for options in solution_options:
+        entry = region.get(option_key(options))
+        if entry is not None and not entry['successes'] and entry['failures'] >= SKIP_AFTER_FAILURES:
+            continue
+        kept.append(options)
+
+    return kept or list(solution_options)
+
+def clear_stats(path=STATS_FILE):
+    """Forget all recorded statistics"""
+    _stats.pop(os.path.abspath(path), None)
+    if os.path.isfile(path):
+        os.remove(path)
@@ -0,0 +1,437 @@
+import opendssdirect as dss
+import numpy as np
+import hashlib
+import os
+import sys
+import time
+from scipy import sparse
+from scipy.sparse.linalg import splu
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+
+import circuit_cache
+import native_powerflow
+from dss_model import bus_name
+
+# Matrices built from the DSS files live next to them, keyed by the file contents
+YMATRIX_DIR = '.ymatrix_cache'
+
+# Files the branch and shunt admittances are read from; loads and generators do not enter Ybus
+TOPOLOGY_FILES = ['confirm_kv_bases.dss', 'lines.dss', 'transformers.dss', 'shunts.dss']
+
+# Phase shift operator of the symmetrical components
+ALPHA = np.exp(2j * np.pi / 3)
+
+# Matrices already loaded in this process, keyed by topology hash
+_loaded = {}
+
+# Jacobian sparsity patterns, keyed by topology hash and PV buses
+_patterns = {}
+
+def topology_hash(y, bus_names):
+    """Hash of the bus order, sparsity pattern and admittances of a matrix"""
+    y = sparse.csc_matrix(y)
+    y.sort_indices()
+
+    digest = hashlib.sha256()
+    digest.update('\n'.join(bus_names).encode())
+    digest.update(y.indptr.astype(np.int64).tobytes())
+    digest.update(y.indices.astype(np.int64).tobytes())
+    digest.update(np.round(y.data, 9).tobytes())
+    return digest.hexdigest()[:24]
+
+def make_ymatrix(y, bus_names, kv_base, slack, **metadata):
+    """Bus admittance matrix in CSC format with its bus ordering
+
+    The dict holds 'y' (per unit on native_powerflow.S_BASE_MVA), the
+    'bus_names' and 'bus_index' of its rows and columns, 'kv_base' (kV
+    line to line), the 'slack' bus position and its 'topology_hash'. A
+    matrix already loaded with the same hash is returned instead, so
+    anything computed from it is shared.
+    """
+    y = sparse.csc_matrix(y)
+    y.sort_indices()
+    bus_names = [str(name) for name in bus_names]
+
+    key = topology_hash(y, bus_names)
+    if key in _loaded:
+        return _loaded[key]
+
+    ymatrix = dict(metadata,
+                   y=y,
+                   bus_names=np.array(bus_names),
+                   bus_index={name: i for i, name in enumerate(bus_names)},
+                   kv_base=np.asarray(kv_base, dtype=float),
+                   slack=int(slack),
+                   topology_hash=key)
+    _loaded[key] = ymatrix
+    return ymatrix
+
+def ymatrix_from_model(network):
+    """Ybus of a native_powerflow network, built from the parsed DSS files
+
+    The ideal source sits behind its impedance on an extra bus named
+    'source', the last one, which is the slack bus.
+    """
+    kv_base = np.append(network['kv_base'], network['kv_base'][network['bus_index'][bus_name(network['source']['bus'])]])
+    return make_ymatrix(network['ybus'], list(network['bus_names']) + ['source'], kv_base, network['slack'],
+                        source='model')
+
+def node_ymatrix(engine=dss, network_only=True):
+    """System Y of the compiled circuit per node, in siemens, and the node order
+
+    With network_only, the admittances loads, generators and sources add
+    to the system Y are taken out again, leaving lines, transformers and
+    shunts. The engine's own matrix is left as it was.
+    """
+    data, indices, indptr = engine.YMatrix.getYsparse()
+    y = sparse.csc_matrix((data, indices, indptr))
+    node_names = [name.lower() for name in engine.Circuit.YNodeOrder()]
+
+    if network_only:
+        node_index = {name: i for i, name in enumerate(node_names)}
+        pd_elements = {name.lower() for name in engine.PDElements.AllNames()}
+        rows, cols, values = [], [], []
+
+        for element in engine.Circuit.AllElementNames():
+            if element.lower() in pd_elements:
+                continue
+            engine.Circuit.SetActiveElement(element)
+            yprim = np.array(engine.CktElement.YPrim()).view(complex)
+            if len(yprim) == 0:
+                continue
+
+            # Primitive rows follow the element's terminals, conductor by conductor
+            n_conductors = engine.CktElement.NumConductors()
+            buses = engine.CktElement.BusNames()
+            nodes = np.array([node_index.get(f'{bus_name(buses[k // n_conductors])}.{node}', -1) if node else -1
+                              for k, node in enumerate(engine.CktElement.NodeOrder())])
+            yprim = yprim.reshape(len(nodes), len(nodes))
+
+            connected = nodes >= 0
+            r, c = np.meshgrid(nodes[connected], nodes[connected], indexing='ij')
+            rows.append(r.ravel())
+            cols.append(c.ravel())
+            values.append(yprim[np.ix_(connected, connected)].ravel())
+
+        if values:
+            injections = sparse.csc_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+                                           shape=y.shape)
+            y = (y - injections).tocsc()
+            y.eliminate_zeros()
+
+    return y, node_names
+
+def ymatrix_from_engine(engine=dss):
+    """Positive-sequence bus Ybus of the compiled circuit, extracted from the engine
+
+    The three-phase node matrix of node_ymatrix() is reduced to one row
+    per bus with the symmetrical component transform and put in per unit
+    on native_powerflow.S_BASE_MVA. The slack bus is the bus of the
+    circuit's Vsource. 'node_transform' maps node voltages in YNodeOrder
+    onto positive-sequence bus voltages in volts.
+    """
+    y_nodes, node_names = node_ymatrix(engine)
+
+    bus_names = []
+    bus_index = {}
+    node_bus = []
+    node_phase = []
+    for node in node_names:
+        bus, _, phase = node.partition('.')
+        if bus not in bus_index:
+            bus_index[bus] = len(bus_names)
+            bus_names.append(bus)
+        node_bus.append(bus_index[bus])
+        node_phase.append(int(phase) - 1)
+    node_bus = np.array(node_bus)
+    node_phase = np.array(node_phase)
+
+    # I1 = (Ia + a Ib + a^2 Ic) / 3 and, for balanced voltages, Vabc = V1 [1, a^2, a]
+    n_nodes = len(node_names)
+    to_sequence = sparse.csr_matrix((ALPHA ** node_phase / 3, (node_bus, np.arange(n_nodes))),
+                                    shape=(len(bus_names), n_nodes))
+    from_sequence = sparse.csr_matrix((ALPHA ** -node_phase, (np.arange(n_nodes), node_bus)),
+                                      shape=(n_nodes, len(bus_names)))
+
+    kv_base = []
+    for bus in bus_names:
+        engine.Circuit.SetActiveBus(bus)
+        kv_base.append(engine.Bus.kVBase() * np.sqrt(3))
+    kv_base = np.array(kv_base)
+
+    # Per unit: y_ij * kV_i * kV_j / MVA on line-to-line bases
+    scale = sparse.diags(kv_base)
+    y = scale @ (to_sequence @ y_nodes @ from_sequence) @ scale / native_powerflow.S_BASE_MVA
+
+    engine.Vsources.First()
+    slack = bus_index[bus_name(engine.CktElement.BusNames()[0])]
+
+    return make_ymatrix(y, bus_names, kv_base, slack, source='engine',
+                        node_names=np.array(node_names),
+                        node_transform=to_sequence)
+
+def ymatrix_path(dss_dir, key):
+    """File holding the model Ybus for a cache key"""
+    return os.path.join(dss_dir, YMATRIX_DIR, f'{key}.npz')
+
+def load_ymatrix(dss_dir='.', files=TOPOLOGY_FILES, frequency=50.0):
+    """Ybus built from the DSS files, read from YMATRIX_DIR when they have not changed
+
+    Only the files that set branch and shunt admittances are parsed, so
+    load and generator edits do not invalidate the cached matrix.
+    """
+    paths = [os.path.join(dss_dir, file) for file in files if os.path.isfile(os.path.join(dss_dir, file))]
+    key = circuit_cache.compute_cache_key(paths, {'frequency': frequency, 'source': native_powerflow.DEFAULT_SOURCE})
+    path = ymatrix_path(dss_dir, key)
+
+    if os.path.isfile(path):
+        try:
+            with np.load(path) as data:
+                y = sparse.csc_matrix((data['data'], data['indices'], data['indptr']), shape=tuple(data['shape']))
+                return make_ymatrix(y, data['bus_names'].tolist(), data['kv_base'], int(data['slack']),
+                                    source='model')
+        except Exception as e:
+            print(f"WARNING: Rebuilding unreadable Ybus {path}: {str(e)}")
+
+    ymatrix = ymatrix_from_model(native_powerflow.build_network(dss_dir, files=files, frequency=frequency))
+    save_ymatrix(ymatrix, path)
+    return ymatrix
+
+def save_ymatrix(ymatrix, path):
+    """Write a Ybus and its bus ordering as a compressed .npz file"""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a scratch file first so readers never see half a file
+        y = ymatrix['y']
+        tmp_path = f'{path}.{os.getpid()}.tmp.npz'
+        np.savez_compressed(tmp_path, data=y.data, indices=y.indices, indptr=y.indptr,
+                            shape=np.array(y.shape), bus_names=ymatrix['bus_names'],
+                            kv_base=ymatrix['kv_base'], slack=ymatrix['slack'])
+        os.replace(tmp_path, path)
+        return True
+    except Exception as e:
+        print(f"ERROR saving Ybus: {str(e)}")
+        return False
+
+def engine_operating_point(ymatrix, engine=dss):
+    """Positive-sequence per unit voltages and PV buses of the solved engine circuit
+
+    ymatrix must come from ymatrix_from_engine() for the same circuit.
+    Buses of voltage-controlling (model=3) generators other than the slack
+    bus are PV buses.
+    """
+    node_volts = np.array(engine.Circuit.YNodeVArray()).view(complex)
+    v = ymatrix['node_transform'] @ node_volts / (ymatrix['kv_base'] * 1000 / np.sqrt(3))
+
+    pv = set()
+    if engine.Generators.First():
+        while True:
+            if engine.Generators.Model() == 3:
+                pv.add(ymatrix['bus_index'][bus_name(engine.Generators.Bus1())])
+            if not engine.Generators.Next():
+                break
+    pv.discard(ymatrix['slack'])
+    return v, np.array(sorted(pv), dtype=int)
+
+def jacobian_pattern(ymatrix, pv):
+    """Sparsity pattern of the power flow Jacobian for a set of PV buses
+
+    The Jacobian has the layout of native_powerflow.build_jacobian() and
+    one non-zero per Ybus entry and block, so its CSC structure and the
+    Ybus entry behind every value are worked out once per topology and
+    PV set. fill_jacobian() then only computes the values.
+    """
+    pv = np.asarray(pv, dtype=int)
+    key = (ymatrix['topology_hash'], pv.tobytes())
+    if key in _patterns:
+        return _patterns[key]
+
+    y = ymatrix['y'].tocoo()
+    n = y.shape[0]
+    pq = np.setdiff1d(np.arange(n), np.concatenate([[ymatrix['slack']], pv]))
+    pvpq = np.concatenate([pv, pq])
+    n_pvpq = len(pvpq)
+
+    # Every Ybus entry plus one diagonal entry per bus for the current terms
+    rows = np.concatenate([y.row, np.arange(n)])
+    cols = np.concatenate([y.col, np.arange(n)])
+    n_entries = len(rows)
+
+    # Jacobian row of the P and Q mismatch of every bus, which is also the
+    # column of its angle and magnitude; -1 where there is none
+    p_row = np.full(n, -1)
+    p_row[pvpq] = np.arange(n_pvpq)
+    q_row = np.full(n, -1)
+    q_row[pq] = n_pvpq + np.arange(len(pq))
+
+    # Values are taken from [dS/dVa.real, dS/dVm.real, dS/dVa.imag, dS/dVm.imag]
+    sources, j_rows, j_cols = [], [], []
+    for block, (row_map, col_map) in enumerate([(p_row, p_row), (p_row, q_row), (q_row, p_row), (q_row, q_row)]):
+        used = (row_map[rows] >= 0) & (col_map[cols] >= 0)
+        sources.append(block * n_entries + np.flatnonzero(used))
+        j_rows.append(row_map[rows[used]])
+        j_cols.append(col_map[cols[used]])
+    sources = np.concatenate(sources)
+    j_rows = np.concatenate(j_rows)
+    j_cols = np.concatenate(j_cols)
+
+    # Entries at the same position are summed into one CSC value
+    size = n_pvpq + len(pq)
+    positions, inverse = np.unique(j_rows * size + j_cols, return_inverse=True)
+    template = sparse.csc_matrix((np.arange(1, len(positions) + 1, dtype=float),
+                                  (positions // size, positions % size)), shape=(size, size))
+
+    pattern = {
+        'n': n,
+        'pv': pv,
+        'pvpq': pvpq,
+        'pq': pq,
+        'rows': rows,
+        'cols': cols,
+        'y_data': np.concatenate([y.data, np.zeros(n)]),
+        'sources': sources,
+        'inverse': inverse,
+        'n_values': len(positions),
+        'order': template.data.astype(int) - 1,
+        'indices': template.indices,
+        'indptr': template.indptr,
+        'shape': (size, size)
+    }
+    _patterns[key] = pattern
+    return pattern
+
+def fill_jacobian(pattern, ymatrix, v, ds_demand=None):
+    """Power flow Jacobian at an operating point on a jacobian_pattern()
+
+    Same matrix as native_powerflow.build_jacobian(), without building
+    the intermediate sparse products.
+    """
+    rows = pattern['rows']
+    cols = pattern['cols']
+    n = pattern['n']
+    current = ymatrix['y'] @ v
+    v_norm = v / np.abs(v)
+
+    # dS/dVa and dS/dVm per Ybus entry, with the current terms on the diagonal
+    ds_dva = -1j * v[rows] * np.conj(pattern['y_data'] * v[cols])
+    ds_dvm = v[rows] * np.conj(pattern['y_data'] * v_norm[cols])
+    ds_dva[-n:] += 1j * v * np.conj(current)
+    ds_dvm[-n:] += np.conj(current) * v_norm
+    if ds_demand is not None:
+        ds_dvm[-n:] += ds_demand
+
+    values = np.concatenate([ds_dva.real, ds_dvm.real, ds_dva.imag, ds_dvm.imag])[pattern['sources']]
+    data = np.bincount(pattern['inverse'], weights=values, minlength=pattern['n_values'])
+    return sparse.csc_matrix((data[pattern['order']], pattern['indices'], pattern['indptr']),
+                             shape=pattern['shape'])
+
+def factorize_jacobian(ymatrix, v, pv, ds_demand=None):
+    """Factorize the power flow Jacobian at an operating point
+
+    v holds the complex per unit voltages in the bus order of ymatrix and
+    pv the positions of the voltage-controlled buses. ds_demand is the
+    derivative of the load power with respect to |V| (constant power loads
+    if not given). The factorization is reused by every
+    voltage_sensitivities() call at this operating point, and the sparsity
+    pattern by every factorization with the same topology and PV buses.
+    """
+    pattern = jacobian_pattern(ymatrix, pv)
+    jacobian = fill_jacobian(pattern, ymatrix, np.asarray(v, dtype=complex), ds_demand)
+    return {
+        'lu': splu(jacobian),
+        'n': pattern['n'],
+        'pvpq': pattern['pvpq'],
+        'pq': pattern['pq'],
+        'bus_names': ymatrix['bus_names']
+    }
+
+def voltage_sensitivities(factor, buses=None):
+    """dV/dP and dV/dQ: voltage magnitude change per MW and Mvar injected at buses
+
+    Returns a dict with 'buses' and the arrays 'dv_dp' and 'dv_dq', one
+    row per bus of the matrix and one column per injection bus, in per
+    unit voltage per MW or Mvar. All columns come from one solve with the
+    factorization. Slack and PV bus voltages do not move, and a reactive
+    injection at a PV or slack bus has no effect.
+    """
+    n = factor['n']
+    pvpq = factor['pvpq']
+    pq = factor['pq']
+    n_pvpq = len(pvpq)
+    buses = np.arange(n) if buses is None else np.atleast_1d(np.asarray(buses, dtype=int))
+    m = len(buses)
+
+    # Jacobian row of the P and Q mismatch of every bus, -1 where there is none
+    p_row = np.full(n, -1)
+    p_row[pvpq] = np.arange(n_pvpq)
+    q_row = np.full(n, -1)
+    q_row[pq] = n_pvpq + np.arange(len(pq))
+
+    rhs = np.zeros((n_pvpq + len(pq), 2 * m))
+    columns = np.arange(m)
+    has_p = p_row[buses] >= 0
+    has_q = q_row[buses] >= 0
+    rhs[p_row[buses][has_p], columns[has_p]] = 1.0
+    rhs[q_row[buses][has_q], m + columns[has_q]] = 1.0
+
+    dx = factor['lu'].solve(rhs)
+    dv = np.zeros((n, 2 * m))
+    dv[pq] = dx[n_pvpq:] / native_powerflow.S_BASE_MVA
+
+    return {
+        'buses': buses,
+        'dv_dp': dv[:, :m],
+        'dv_dq': dv[:, m:]
+    }
+
+def clear_ymatrix_cache(dss_dir='.'):
+    """Remove all stored matrices from memory and disk"""
+    _loaded.clear()
+    _patterns.clear()
+    directory = os.path.join(dss_dir, YMATRIX_DIR)
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+def main():
+    print("=" * 80)
+    print(" YBUS AND VOLTAGE SENSITIVITIES")
+    print("=" * 80)
+
+    dss_dir = sys.argv[1] if len(sys.argv) > 1 else '.'
+    load_mult = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+
+    start_time = time.perf_counter()
+    ymatrix = load_ymatrix(dss_dir)
+    print(f"Ybus {ymatrix['topology_hash']}: {ymatrix['y'].shape[0]} buses, {ymatrix['y'].nnz} non-zeros "
+          f"({time.perf_counter() - start_time:.3f} s)")
+
+    # Operating point from the native power flow, which uses the same bus order,
+    # solved from a flat start with the PV buses at their setpoints
+    network = native_powerflow.build_network(dss_dir)
+    result = native_powerflow.solve_power_flow(network, load_mult=load_mult, v0=None)
+    if not result['converged']:
+        print(f"FAILED: Power flow did not converge at {load_mult:.0%} load")
+        return
+
+    start_time = time.perf_counter()
+    factor = factorize_jacobian(ymatrix, result['v'], result['pv_buses'])
+    sensitivities = voltage_sensitivities(factor, factor['pq'])
+    print(f"dV/dP and dV/dQ for {len(factor['pq'])} load buses in "
+          f"{(time.perf_counter() - start_time) * 1000:.1f} ms")
+
+    # Buses whose voltage drops most per Mvar of their own load
+    self_dq = sensitivities['dv_dq'][factor['pq'], np.arange(len(factor['pq']))]
+    print("\nMost reactive-power sensitive buses (dV/dQ, pu per 100 Mvar):")
+    for k in np.argsort(-self_dq)[:5]:
+        bus = factor['pq'][k]
+        print(f"  {ymatrix['bus_names'][bus]}: {self_dq[k] * 100:.4f}, "
+              f"voltage {abs(result['v'][bus]):.3f} pu")
+
+if __name__ == "__main__":
+    main()
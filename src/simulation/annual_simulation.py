@@ -0,0 +1,258 @@
+import opendssdirect as dss
+import numpy as np
+import hashlib
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+
+import circuit_cache
+import result_store
+import time_series
+import voltage_cube
+from solver_state import get_voltage_state, set_voltage_state
+
+# Yearly profile (Hour,LoadMultiplier), relative to the DSS files directory. Without
+# it the daily profile is repeated for every day of the year.
+ANNUAL_PROFILE_FILE = os.path.join('..', 'profiles', 'annual_load_profile.csv')
+
+HOURS_PER_YEAR = 8760
+
+# Hours between checkpoints; one result store part file is written per checkpoint
+CHECKPOINT_HOURS = result_store.FLUSH_HOURS
+
+CHECKPOINT_FILE = os.path.join('simulation_results', 'annual_checkpoint.npz')
+
+# The annual voltages get their own cubes, one per run, so the daily ones are left alone
+ANNUAL_CUBE_DIR = os.path.join('simulation_results', 'annual_voltage_cube')
+
+def read_annual_profile():
+    """Yearly load multipliers, from ANNUAL_PROFILE_FILE or the repeated daily profile"""
+    if os.path.isfile(ANNUAL_PROFILE_FILE):
+        multipliers, _ = time_series.read_load_profiles(ANNUAL_PROFILE_FILE)
+        print(f"Using the {len(multipliers)}-hour profile in {ANNUAL_PROFILE_FILE}")
+        return multipliers
+
+    daily = time_series.BASE_LOAD_MULTIPLIERS
+    if os.path.isfile(time_series.LOAD_PROFILE_FILE):
+        daily, _ = time_series.read_load_profiles(time_series.LOAD_PROFILE_FILE)
+    print(f"No annual profile found, repeating the daily profile for {HOURS_PER_YEAR // 24} days")
+    return list(np.tile(daily, HOURS_PER_YEAR // len(daily) + 1)[:HOURS_PER_YEAR])
+
+def profile_hash(base_multipliers):
+    """Hash of the circuit and the profile a checkpoint is only valid for"""
+    digest = hashlib.sha256()
+    digest.update(circuit_cache.compute_cache_key(time_series.STAGED_BUILD_FILES,
+                                                  time_series.SNAPSHOT_SETTINGS).encode())
+    digest.update(np.asarray(base_multipliers, dtype=float).tobytes())
+    return digest.hexdigest()[:24]
+
+def new_summary():
+    """Running totals of an annual run, kept instead of the hourly results"""
+    return {
+        'solved_hours': 0,
+        'failed_hours': 0,
+        'cached_hours': 0,
+        'short_hours': 0,
+        'energy_loss_mwh': 0.0,
+        'peak_loss_mw': 0.0,
+        'min_voltage': None,
+        'max_voltage': None,
+        'solve_time': 0.0
+    }
+
+def update_summary(summary, results, n_hours):
+    """Fold the hourly results of one chunk into the running totals"""
+    summary['solved_hours'] += len(results)
+    summary['failed_hours'] += n_hours - len(results)
+    for r in results:
+        summary['cached_hours'] += int(r['cached'])
+        summary['short_hours'] += int(time_series.short_of_target(r))
+        summary['energy_loss_mwh'] += r['active_loss_mw']
+        summary['peak_loss_mw'] = max(summary['peak_loss_mw'], r['active_loss_mw'])
+        summary['min_voltage'] = r['min_voltage'] if summary['min_voltage'] is None \
+            else min(summary['min_voltage'], r['min_voltage'])
+        summary['max_voltage'] = r['max_voltage'] if summary['max_voltage'] is None \
+            else max(summary['max_voltage'], r['max_voltage'])
+        summary['solve_time'] += r['solve_time']
+
+def save_checkpoint(path, state):
+    """Write a checkpoint so a killed run can continue from it"""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a scratch file first so a half-written checkpoint is never read
+        tmp_path = f'{path}.{os.getpid()}.tmp.npz'
+        voltages, node_order = get_voltage_state()
+        np.savez(tmp_path,
+                 voltages=voltages,
+                 node_order=np.array(node_order),
+                 state=json.dumps(state))
+        os.replace(tmp_path, path)
+        return True
+    except Exception as e:
+        print(f"ERROR saving checkpoint: {str(e)}")
+        return False
+
+def load_checkpoint(path):
+    """Read a checkpoint, or None if there is none"""
+    if not os.path.isfile(path):
+        return None
+
+    try:
+        with np.load(path) as data:
+            return {
+                'voltages': data['voltages'],
+                'node_order': data['node_order'].tolist(),
+                'state': json.loads(str(data['state']))
+            }
+    except Exception as e:
+        print(f"WARNING: Ignoring unreadable checkpoint {path}: {str(e)}")
+        return None
+
+def run_annual_simulation(max_load_factor=None, continuation=True, max_step=0.05,
+                          use_solve_cache=True, resume=True, checkpoint_path=CHECKPOINT_FILE,
+                          refine=False):
+    """Run a yearly profile hour by hour, streaming results and checkpointing
+
+    Hours are solved in chunks of CHECKPOINT_HOURS. After each chunk the
+    result store and voltage cube are flushed to disk and a checkpoint
+    with the converged voltages and the last completed hour is written.
+    With resume=True a checkpoint of the same circuit and profile is
+    picked up and the run continues after its last completed hour. With
+    refine=True hours that fail to converge are approached in smaller load
+    steps, as in time_series.simulate_profile().
+    """
+    time_series.print_section("RUNNING ANNUAL SIMULATION")
+    os.makedirs('simulation_results', exist_ok=True)
+
+    base_multipliers = read_annual_profile()
+    n_hours = len(base_multipliers)
+    run_hash = profile_hash(base_multipliers)
+
+    checkpoint = load_checkpoint(checkpoint_path) if resume else None
+    if checkpoint is not None and checkpoint['state']['profile_hash'] != run_hash:
+        print("Checkpoint belongs to a different circuit or profile, starting over")
+        checkpoint = None
+
+    if checkpoint is not None:
+        state = checkpoint['state']
+        print(f"Resuming run {state['run_id']} after hour {state['next_hour'] - 1}")
+
+        # Continue from the converged state the checkpoint was taken in
+        if not time_series.scale_loads_safely(state['last_multiplier']):
+            return False
+        set_voltage_state(checkpoint['voltages'], checkpoint['node_order'])
+
+        writer = result_store.open_run(state['run_id'], resume_parts=state['parts'])
+        cube = voltage_cube.open_cube(voltage_cube.cube_dir(state['run_id'], ANNUAL_CUBE_DIR), mode='r+')
+    else:
+        # Scale the profile so its peak stays below the maximum loadability
+        if max_load_factor is None:
+            loadability = time_series.find_max_load_factor()
+            if not loadability:
+                print("\nFailed to find a convergent load level")
+                return False
+            max_load_factor = loadability['max_load_factor'] * time_series.LOADABILITY_MARGIN
+
+        state = {
+            'profile_hash': run_hash,
+            'run_id': result_store.new_run_id(),
+            'max_load_factor': max_load_factor,
+            'next_hour': 0,
+            'parts': 0,
+            'last_multiplier': None,
+            'summary': new_summary()
+        }
+        writer = result_store.open_run(state['run_id'])
+        cube = voltage_cube.create_cube(dss.Circuit.AllBusNames(), n_hours,
+                                        voltage_cube.cube_dir(state['run_id'], ANNUAL_CUBE_DIR))
+
+    load_multipliers = [m * state['max_load_factor'] for m in base_multipliers]
+    start_time = time.perf_counter()
+
+    for start in range(state['next_hour'], n_hours, CHECKPOINT_HOURS):
+        end = min(start + CHECKPOINT_HOURS, n_hours)
+        results = time_series.simulate_profile(load_multipliers[start:end], continuation, max_step,
+                                               use_solve_cache=use_solve_cache, writer=writer,
+                                               cube=cube, first_hour=start, refine=refine)
+        update_summary(state['summary'], results, end - start)
+
+        # Everything up to this hour is on disk before the checkpoint says so
+        if writer['buffered_hours']:
+            result_store.flush(writer)
+        voltage_cube.flush_cube(cube)
+
+        state['next_hour'] = end
+        state['parts'] = writer['parts']
+        state['last_multiplier'] = dss.Solution.LoadMult()
+        save_checkpoint(checkpoint_path, state)
+
+        print(f"\nCheckpoint: {end} of {n_hours} hours done "
+              f"({time.perf_counter() - start_time:.1f} s this session)")
+
+    run_id = result_store.close_run(writer)
+    print(f"\nResults stored under run ID {run_id}, voltages in {cube['directory']}")
+
+    save_annual_summary(state)
+
+    # A finished run has nothing to resume
+    if os.path.isfile(checkpoint_path):
+        os.remove(checkpoint_path)
+    return True
+
+def save_annual_summary(state, path='simulation_results/annual_results.txt'):
+    """Save the annual totals to a text file"""
+    summary = state['summary']
+
+    with open(path, 'w') as f:
+        f.write("Annual Simulation Results\n")
+        f.write("=========================\n\n")
+        f.write(f"Run ID: {state['run_id']}\n")
+        f.write(f"Note: All loads were scaled by a maximum factor of {state['max_load_factor']:.2f} for convergence.\n\n")
+
+        f.write(f"Hours solved: {summary['solved_hours']}\n")
+        f.write(f"Hours failed: {summary['failed_hours']}\n")
+        f.write(f"Hours reusing a cached solution: {summary['cached_hours']}\n")
+        f.write(f"Hours short of their target load: {summary['short_hours']}\n\n")
+
+        if summary['solved_hours']:
+            f.write(f"Energy losses: {summary['energy_loss_mwh']:.2f} MWh\n")
+            f.write(f"Peak active losses: {summary['peak_loss_mw']:.2f} MW\n")
+            f.write(f"Lowest voltage: {summary['min_voltage']:.3f} pu\n")
+            f.write(f"Highest voltage: {summary['max_voltage']:.3f} pu\n")
+            f.write(f"Total solve time: {summary['solve_time']:.1f} s\n")
+
+    print(f"Results saved to {path}")
+
+def main():
+    try:
+        # Fix the swing bus
+        if not time_series.fix_swing_bus():
+            print("Failed to fix or verify swing bus")
+            return
+
+        # Initialize the circuit with voltage stabilization
+        if not time_series.initialize_stabilized_circuit():
+            print("Failed to initialize stabilized circuit")
+            return
+
+        max_load_factor = None
+        if '--max-load' in sys.argv:
+            max_load_factor = float(sys.argv[sys.argv.index('--max-load') + 1])
+
+        run_annual_simulation(max_load_factor=max_load_factor,
+                              use_solve_cache='--no-solve-cache' not in sys.argv,
+                              resume='--restart' not in sys.argv,
+                              refine='--refine' in sys.argv)
+
+    except Exception as e:
+        print(f"ERROR: {str(e)}")
+        error = dss.Error.Description()
+        if error:
+            print(f"OpenDSS Error: {error}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+import numpy as np
+import sys
+import time
+from scipy import sparse
+from scipy.sparse.linalg import splu
+
+import native_powerflow
+from native_powerflow import LOAD_VOLTAGE_LIMITS, S_BASE_MVA, build_jacobian, load_power
+
+def load_incidence(network):
+    """Sparse (buses x loads) matrix summing each load onto its bus"""
+    loads = network['loads']
+    n = network['n_buses'] + 1
+    n_loads = len(loads['name'])
+    return sparse.csr_matrix((np.ones(n_loads), (loads['bus'], np.arange(n_loads))), shape=(n, n_loads))
+
+def scenario_loads(network, load_matrix):
+    """Nominal complex load per bus for every scenario, shaped (buses x scenarios)
+
+    load_matrix holds one row per scenario with a multiplier for each load,
+    in the order of network['loads'].
+    """
+    loads = network['loads']
+    s_nominal = loads['p'] + 1j * loads['q']
+    load_matrix = np.atleast_2d(np.asarray(load_matrix, dtype=float))
+    return load_incidence(network) @ (load_matrix.T * s_nominal[:, None])
+
+def generator_incidence(network, rows):
+    """Sparse (len(rows) x generators) matrix summing each generator onto its bus in rows"""
+    gens = network['generators']
+    on_row = np.isin(gens['bus'], rows)
+    return sparse.csr_matrix((np.ones(on_row.sum()),
+                              (np.searchsorted(rows, gens['bus'][on_row]), np.flatnonzero(on_row))),
+                             shape=(len(rows), len(gens['name'])))
+
+def limit_states(network, base):
+    """Reactive limit state of every PV bus in a solved case: 0 regulating, 1 at Qmax, 2 at Qmin"""
+    pv_all, _, qmax, _ = native_powerflow.generator_setpoints(network)
+    state = np.zeros(len(pv_all), dtype=int)
+    limited = ~np.isin(pv_all, base['pv_buses'])
+    at_max = np.isclose(base['q_fixed'][pv_all], qmax)
+    state[limited & at_max] = 1
+    state[limited & ~at_max] = 2
+    return state
+
+def chord_solve(ybus, v, v_mag, angle, scheduled, s_load, lu, pvpq, pq, cols,
+                tolerance, max_iterations, load_limits):
+    """Chord iterations on the scenario columns cols, updating v, v_mag and angle in place
+
+    Returns the converged flags and iteration counts of cols.
+    """
+    n_pvpq = len(pvpq)
+    active = np.ones(len(cols), dtype=bool)
+    converged = np.zeros(len(cols), dtype=bool)
+    iterations = np.zeros(len(cols), dtype=int)
+
+    for iteration in range(max_iterations + 1):
+        index = np.flatnonzero(active)
+        if len(index) == 0:
+            break
+        sub = cols[index]
+
+        # Mismatches of all active scenarios at once
+        v_active = v[:, sub]
+        s_demand, _ = load_power(s_load[:, sub], v_mag[:, sub], load_limits)
+        mismatch = v_active * np.conj(ybus @ v_active) - (scheduled[:, index] - s_demand)
+        f = np.vstack([mismatch.real[pvpq], mismatch.imag[pq]])
+
+        error = np.max(np.abs(f), axis=0)
+        done = error < tolerance
+        diverged = ~np.isfinite(error)
+        converged[index[done]] = True
+        iterations[index[done]] = iteration
+        active[index[done | diverged]] = False
+
+        remaining = ~(done | diverged)
+        if not remaining.any() or iteration == max_iterations:
+            iterations[index[remaining]] = iteration
+            break
+
+        # Chord step: the shared factorization applied to every remaining scenario
+        sub = sub[remaining]
+        dx = lu.solve(-f[:, remaining])
+        angle[np.ix_(pvpq, sub)] += dx[:n_pvpq]
+        v_mag[np.ix_(pq, sub)] += dx[n_pvpq:]
+        v[:, sub] = v_mag[:, sub] * np.exp(1j * angle[:, sub])
+
+    return converged, iterations
+
+def solve_batch(network, load_matrix, gen_mult=None, v0=None, out_of_service=None, tolerance=1e-8,
+                max_iterations=50, load_limits=LOAD_VOLTAGE_LIMITS, fallback=True):
+    """Solve one power flow per row of load_matrix as stacked matrix operations
+
+    A base case at the mean load vector is solved with the full Newton
+    method. Its Jacobian is factorized and shared by every scenario: each
+    iteration evaluates all mismatches with one sparse-dense product and
+    applies all updates with one multi-right-hand-side solve. Scenarios
+    that push a generator past a reactive limit have it pinned at the
+    limit, as solve_power_flow() does, pinned ones that can hold their
+    setpoint again are released, and the scenarios are solved again with a
+    Jacobian factorized once for every distinct set of pinned generators.
+    Scenarios this does not converge are re-solved individually when
+    fallback=True.
+
+    out_of_service optionally marks the generators each scenario loses, one
+    row per scenario in the order of network['generators']. A bus that
+    loses all its generators is solved as a load bus with the same shared
+    factorizations, and the output is redispatched as in
+    native_powerflow.without_generators().
+
+    Without a gen_mult the generation follows the mean load, as in
+    native_powerflow.bus_injections(). v0 optionally warm-starts the base
+    case, for example with the 'base_v' of a previous batch. Returns a dict
+    of stacked arrays, one row per scenario: complex bus voltages 'v' (per
+    unit), 'converged', 'iterations', 'outside_limits' (reactive limits
+    still violated, never counted as converged) and the metrics of
+    get_system_metrics().
+    """
+    start_time = time.perf_counter()
+
+    load_matrix = np.atleast_2d(np.asarray(load_matrix, dtype=float))
+    n_scenarios = load_matrix.shape[0]
+    ybus = network['ybus']
+    slack = network['slack']
+    n = network['n_buses'] + 1
+
+    # Base case at the average operating point, with the generation dispatched for it
+    mean_scale = load_matrix.mean(axis=0)
+    if gen_mult is None:
+        nominal = network['loads']['p']
+        gen_mult = (nominal * mean_scale).sum() / nominal.sum() if nominal.sum() else 1.0
+    base = native_powerflow.solve_power_flow(network, gen_mult=gen_mult, load_scale=mean_scale,
+                                             v0=v0, load_limits=load_limits)
+    if not base['converged']:
+        print("ERROR: Base case for the batch did not converge")
+        return None
+
+    _, s_base = native_powerflow.bus_injections(network, gen_mult=gen_mult, load_scale=mean_scale)
+    s_load = scenario_loads(network, load_matrix)
+    pv_all, vset = native_powerflow.generator_setpoints(network)[:2]
+
+    # Generation and reactive limits of every scenario, without its lost units
+    gens = network['generators']
+    if out_of_service is None:
+        out_of_service = np.zeros((n_scenarios, len(gens['name'])), dtype=bool)
+    in_service = ~np.atleast_2d(np.asarray(out_of_service, dtype=bool))
+    dispatch = gens['p'] * in_service
+    remaining = dispatch.sum(axis=1, keepdims=True)
+    dispatch = dispatch * np.divide(gens['p'].sum() * gen_mult, remaining,
+                                    out=np.zeros_like(remaining), where=remaining > 0)
+    p_gen = generator_incidence(network, np.arange(n)) @ dispatch.T
+
+    pv_incidence = generator_incidence(network, pv_all)
+    qmax = pv_incidence @ (in_service * gens['qmax']).T
+    qmin = pv_incidence @ (in_service * gens['qmin']).T
+    lost = (pv_incidence @ in_service.T.astype(float)) == 0
+
+    v0 = base['v']
+    _, ds_demand = load_power(s_base, np.abs(v0), load_limits)
+
+    # Base Jacobian over every bus, each set of pinned generators takes its rows and columns
+    buses = np.arange(n)
+    jacobian = build_jacobian(ybus, v0, ybus @ v0, ds_demand, buses, buses).tocsr()
+
+    angle = np.repeat(np.angle(v0)[:, None], n_scenarios, axis=1)
+    v_mag = np.repeat(np.abs(v0)[:, None], n_scenarios, axis=1)
+    v = v_mag * np.exp(1j * angle)
+
+    converged = np.zeros(n_scenarios, dtype=bool)
+    iterations = np.zeros(n_scenarios, dtype=int)
+    outside_limits = np.zeros(n_scenarios, dtype=bool)
+
+    # Every scenario starts with the generators the base case pinned at a limit
+    states = np.repeat(limit_states(network, base)[None, :], n_scenarios, axis=0)
+    # and with the buses that lost all their generators as load buses (state 3)
+    states[lost.T] = 3
+    pending = np.arange(n_scenarios)
+    factorizations = {}
+
+    # Like solve_power_flow(), each round pins the generators that went past a limit
+    # and releases the pinned ones that can hold their setpoint again
+    for _ in range(len(pv_all) + 1):
+        if len(pending) == 0:
+            break
+        patterns, group = np.unique(states[pending], axis=0, return_inverse=True)
+        group = group.ravel()
+        next_pending = []
+
+        for k, state in enumerate(patterns):
+            cols = pending[group == k]
+            pv = pv_all[state == 0]
+            pq = np.setdiff1d(np.arange(n), np.concatenate([[slack], pv]))
+            pvpq = np.concatenate([pv, pq])
+
+            # One factorization of the base Jacobian per set of pinned generators
+            key = state.tobytes()
+            if key not in factorizations:
+                index = np.concatenate([pvpq, n + pq])
+                factorizations[key] = splu(jacobian[index][:, index].tocsc())
+
+            q_fixed = np.zeros((n, len(cols)))
+            q_fixed[pv_all[state == 1]] = qmax[state == 1][:, cols]
+            q_fixed[pv_all[state == 2]] = qmin[state == 2][:, cols]
+            scheduled = p_gen[:, cols] + 1j * q_fixed
+
+            # PV buses hold their setpoint magnitude, kept from the base case
+            done, steps = chord_solve(ybus, v, v_mag, angle, scheduled, s_load, factorizations[key],
+                                      pvpq, pq, cols, tolerance, max_iterations, load_limits)
+            iterations[cols] += steps
+
+            # Generators still regulating must stay within their limits
+            solved = cols[done]
+            s_demand, _ = load_power(s_load[:, solved], v_mag[:, solved], load_limits)
+            v_solved = v[:, solved]
+            q_gen = (v_solved * np.conj(ybus @ v_solved)).imag[pv_all] + s_demand.imag[pv_all]
+            regulating = (state == 0)[:, None]
+            over = regulating & (q_gen > qmax[:, solved] + tolerance)
+            under = regulating & (q_gen < qmin[:, solved] - tolerance)
+
+            # A generator at Qmax above its setpoint, or at Qmin below it, has reactive
+            # power to spare and goes back to regulating at its setpoint
+            v_pv = v_mag[np.ix_(pv_all, solved)]
+            release = ((state == 1)[:, None] & (v_pv > vset[:, None] + tolerance)) | \
+                      ((state == 2)[:, None] & (v_pv < vset[:, None] - tolerance))
+            violated = (over | under | release).any(axis=0)
+
+            converged[solved[~violated]] = True
+            outside_limits[solved[violated]] = True
+            states[solved] = np.where(over.T, 1, np.where(under.T, 2, np.where(release.T, 0, states[solved])))
+            v_mag[np.ix_(pv_all, solved)] = np.where(release, vset[:, None], v_pv)
+            v[:, solved] = v_mag[:, solved] * np.exp(1j * angle[:, solved])
+            next_pending.append(solved[violated])
+
+        pending = np.concatenate(next_pending)
+        outside_limits[pending] = True
+        outside_limits[converged] = False
+
+    # Scenarios too far from the base case get their own Newton solve
+    refined = np.flatnonzero(~converged)
+    if fallback:
+        for i in refined:
+            remaining_network = native_powerflow.without_generators(network, ~in_service[i])
+            result = native_powerflow.solve_power_flow(remaining_network, gen_mult=gen_mult,
+                                                       load_scale=load_matrix[i], v0=v0,
+                                                       load_limits=load_limits)
+            v[:, i] = result['v']
+            converged[i] = result['converged']
+            outside_limits[i] = False
+            iterations[i] += result['iterations']
+
+    metrics = batch_metrics(network, v)
+    v_buses = v[:network['n_buses']].T
+
+    return dict(metrics, **{
+        'v': v_buses,
+        'converged': converged,
+        'iterations': iterations,
+        'outside_limits': outside_limits,
+        'refined': refined if fallback else np.array([], dtype=int),
+        'pinned_sets': len(factorizations),
+        'base_v': v0,
+        'solve_time': time.perf_counter() - start_time
+    })
+
+def batch_metrics(network, v):
+    """get_system_metrics() for stacked (buses x scenarios) voltages"""
+    branches = network['branches']
+    v_f = v[branches['from']]
+    v_t = v[branches['to']]
+    i_f = branches['y_ff'][:, None] * v_f + branches['y_ft'][:, None] * v_t
+    i_t = branches['y_tf'][:, None] * v_f + branches['y_tt'][:, None] * v_t
+
+    # Series element losses, as dss.Circuit.Losses() counts them
+    losses = (v_f * np.conj(i_f) + v_t * np.conj(i_t)).sum(axis=0)
+    v_pu = np.abs(v[:network['n_buses']])
+
+    return {
+        'active_loss_mw': losses.real * S_BASE_MVA,
+        'reactive_loss_mvar': losses.imag * S_BASE_MVA,
+        'min_voltage': v_pu.min(axis=0),
+        'max_voltage': v_pu.max(axis=0),
+        'avg_voltage': v_pu.mean(axis=0)
+    }
+
+def main():
+    print("=" * 80)
+    print(" BATCHED POWER FLOW")
+    print("=" * 80)
+
+    dss_dir = sys.argv[1] if len(sys.argv) > 1 else '.'
+    load_mult = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    n_scenarios = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+
+    network = native_powerflow.build_network(dss_dir)
+
+    # Independent +/-10% variations of every load around the given level
+    rng = np.random.default_rng(0)
+    load_matrix = load_mult * rng.uniform(0.9, 1.1, size=(n_scenarios, len(network['loads']['name'])))
+
+    result = solve_batch(network, load_matrix)
+    if result is None:
+        return
+
+    n_converged = int(result['converged'].sum())
+    print(f"Solved {n_scenarios} scenarios in {result['solve_time']:.3f} s "
+          f"({n_scenarios / result['solve_time']:.0f} per second)")
+    print(f"  Converged: {n_converged}, refined individually: {len(result['refined'])}, "
+          f"Jacobians factorized: {result['pinned_sets']}")
+    if n_converged:
+        ok = result['converged']
+        print(f"  Active Losses: {result['active_loss_mw'][ok].min():.2f} - "
+              f"{result['active_loss_mw'][ok].max():.2f} MW")
+        print(f"  Voltage Range: {result['min_voltage'][ok].min():.3f} - "
+              f"{result['max_voltage'][ok].max():.3f} pu")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import opendssdirect as dss
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+
+import dss_model
+
+def new_builder():
+    """Start an empty circuit build held in memory
+
+    A build is a list of stages. Each stage is a block of DSS commands that
+    is sent to the engine in one call and optionally solved afterwards, so
+    nothing is written to disk unless the build is exported.
+    """
+    return {'stages': []}
+
+def add_stage(builder, description, commands=(), solve=True):
+    """Append a stage of commands; solve runs the solver once they are sent"""
+    stage = {'description': description, 'commands': list(commands), 'solve': solve}
+    builder['stages'].append(stage)
+    return stage
+
+def add_commands(stage, *commands):
+    """Append commands to a stage"""
+    stage['commands'].extend(commands)
+
+def read_commands(path, edits=None):
+    """Commands of a DSS file without comments and blank lines
+
+    edits are dss_model.apply_edits() edits made to the parsed file first,
+    such as enabling a commented-out definition, without writing it back.
+    Redirect and Compile commands are replaced by the commands of the
+    named file, relative to the file naming it.
+    """
+    statements = dss_model.read_source(path)
+    if edits:
+        dss_model.apply_edits(statements, edits)
+
+    commands = []
+    for line in dss_model.strip_comments(dss_model.render_source(statements)):
+        line = line.strip()
+        if not line:
+            continue
+
+        parts = line.split(None, 1)
+        if parts[0].lower() in ('redirect', 'compile') and len(parts) > 1:
+            included = parts[1].strip().strip('"\'')
+            commands.extend(read_commands(os.path.join(os.path.dirname(path), included)))
+        else:
+            commands.append(line)
+    return commands
+
+def send(builder, engine=dss):
+    """Send every stage to the engine, one batched call per stage
+
+    Stops at the first stage whose solve does not converge. engine is the
+    OpenDSS context to build in, the module-level one unless a session's
+    own context is given.
+    """
+    for stage in builder['stages']:
+        try:
+            if stage['commands']:
+                engine.Text.Commands('\n'.join(stage['commands']))
+        except Exception as e:
+            print(f"ERROR in stage '{stage['description']}': {str(e)}")
+            return False
+
+        if stage['solve']:
+            engine.Solution.Solve()
+            if not engine.Solution.Converged():
+                print(f"ERROR: Circuit did not converge after stage '{stage['description']}'")
+                return False
+            print(f"Converged after stage '{stage['description']}'")
+    return True
+
+def to_script(builder):
+    """The build as the text of a DSS script"""
+    lines = []
+    for stage in builder['stages']:
+        lines.append(f"! {stage['description']}")
+        lines.extend(stage['commands'])
+        if stage['solve']:
+            lines.append('Solve')
+        lines.append('')
+    return '\n'.join(lines)
+
+def export(builder, path):
+    """Write the build to a single self-contained DSS script
+
+    This is the only part of the builder that touches disk. The script is
+    written under a temporary name first, so concurrent exports never leave
+    a partly written file behind.
+    """
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(to_script(builder))
+    os.replace(tmp_path, path)
+    return path
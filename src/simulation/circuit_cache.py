@@ -0,0 +1,98 @@
+import opendssdirect as dss
+import numpy as np
+import hashlib
+import json
+import os
+import shutil
+
+from solver_state import get_voltage_state, set_voltage_state
+
+# Snapshots live next to the DSS files the simulation scripts are run from
+CACHE_DIR = '.circuit_cache'
+
+def compute_cache_key(dss_files, settings):
+    """Hash the contents of the DSS input files together with the solver settings"""
+    digest = hashlib.sha256()
+
+    for file in sorted(dss_files):
+        digest.update(os.path.basename(file).encode())
+        with open(file, 'rb') as f:
+            digest.update(f.read())
+
+    digest.update(json.dumps(settings, sort_keys=True).encode())
+    return digest.hexdigest()[:16]
+
+def snapshot_dir(key, cache_dir=CACHE_DIR):
+    """Directory holding the snapshot for a cache key"""
+    return os.path.abspath(os.path.join(cache_dir, key))
+
+def has_snapshot(key, cache_dir=CACHE_DIR):
+    """Check whether a complete snapshot exists for a cache key"""
+    directory = snapshot_dir(key, cache_dir)
+    return (os.path.isfile(os.path.join(directory, 'Master.dss')) and
+            os.path.isfile(os.path.join(directory, 'voltages.npz')))
+
+def save_snapshot(key, cache_dir=CACHE_DIR, engine=dss):
+    """Save the compiled circuit and its converged voltage state
+
+    engine is the OpenDSS context to save from, the module-level one unless
+    a session's own context is given.
+    """
+    directory = snapshot_dir(key, cache_dir)
+
+    try:
+        if not engine.Solution.Converged():
+            print("WARNING: Circuit is not converged, snapshot not saved")
+            return False
+
+        # Write to a scratch directory first so a half-written snapshot is never used
+        tmp_directory = f'{directory}.{os.getpid()}.tmp'
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        os.makedirs(tmp_directory)
+
+        engine.Text.Command(f'Save Circuit Dir={tmp_directory}')
+
+        voltages, node_order = get_voltage_state(engine)
+        np.savez(os.path.join(tmp_directory, 'voltages.npz'),
+                 voltages=voltages,
+                 node_order=np.array(node_order))
+
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmp_directory, directory)
+
+        print(f"Saved circuit snapshot to {directory}")
+        return True
+
+    except Exception as e:
+        print(f"ERROR saving circuit snapshot: {str(e)}")
+        return False
+
+def restore_snapshot(key, settings_commands=(), cache_dir=CACHE_DIR, engine=dss):
+    """Compile a cached circuit and seed it with its converged voltages"""
+    if not has_snapshot(key, cache_dir):
+        return False
+
+    directory = snapshot_dir(key, cache_dir)
+
+    try:
+        print(f"Restoring circuit snapshot from {directory}")
+        engine.Text.Command('Clear')
+        engine.Text.Command(f'Redirect {os.path.join(directory, "Master.dss")}')
+
+        # Solver options are not part of a saved circuit
+        for command in settings_commands:
+            engine.Text.Command(command)
+
+        state = np.load(os.path.join(directory, 'voltages.npz'))
+        if not set_voltage_state(state['voltages'], state['node_order'].tolist(), engine=engine):
+            return False
+
+        return True
+
+    except Exception as e:
+        print(f"ERROR restoring circuit snapshot: {str(e)}")
+        return False
+
+def clear_cache():
+    """Remove all cached snapshots"""
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
@@ -0,0 +1,344 @@
+import contextlib
+import json
+import multiprocessing
+import numpy as np
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+
+import circuit_cache
+import native_powerflow
+import sensitivity_factors
+import time_series
+import what_if
+from state_extraction import get_branch_flows, get_bus_state
+
+# Acceptable post-contingency bus voltages (pu)
+VOLTAGE_LIMITS = (0.95, 1.05)
+
+# Outages estimated to load any branch above this fraction of normamps get an AC solve
+SCREENING_LOADING = 0.9
+
+# The outages ranked most severe always get an AC solve, whatever their estimated loading
+MIN_AC_SOLVES = 10
+
+# Loadability search result, kept in the circuit snapshot directory of the same model
+LOADABILITY_FILE = 'loadability.json'
+
+# Per-worker engine state, set up once by init_worker()
+_worker = {}
+
+def branch_ratings(network):
+    """Normal and emergency MVA ratings of every branch from normamps and emergamps"""
+    branches = network['branches']
+    scale = np.sqrt(3) * branches['kv_base'] / 1000
+    return branches['normamps'] * scale, branches['emergamps'] * scale
+
+def match_branch_flows(network, flows):
+    """Sending-end MW and MVAR of every network branch from get_branch_flows()"""
+    position = {name.lower(): i for i, name in enumerate(flows['element_names'])}
+    index = np.array([position.get(name.lower(), -1) for name in network['branches']['name']])
+    found = index >= 0
+
+    p_mw = np.zeros(len(index))
+    q_mvar = np.zeros(len(index))
+    p_mw[found] = flows['p_kw'][index[found]] / 1000
+    q_mvar[found] = flows['q_kvar'][index[found]] / 1000
+    return p_mw, q_mvar
+
+def screen_outages(network, factors, p_mw, q_mvar):
+    """Estimate the branch loadings after every single-branch outage
+
+    Post-outage active flows come from the LODF applied to the base case
+    flows, with reactive flows held at their base values. Returns one dict
+    per outage, most severe first.
+    """
+    names = network['branches']['name']
+    normal_mva, _ = branch_ratings(network)
+
+    # Monitored branches down the rows, outages across the columns
+    post_p = p_mw[:, None] + factors['lodf'] * p_mw[None, :]
+    loading = np.sqrt(post_p ** 2 + q_mvar[:, None] ** 2) / normal_mva[:, None]
+    np.fill_diagonal(loading, 0.0)
+
+    worst = loading.argmax(axis=0)
+    severity = loading[worst, np.arange(len(names))]
+    severity[factors['islanding']] = np.inf
+
+    order = np.argsort(-severity, kind='stable')
+    return [
+        {
+            'element': names[k],
+            'index': int(k),
+            'islanding': bool(factors['islanding'][k]),
+            'estimated_loading': float(severity[k]),
+            'limiting_branch': None if factors['islanding'][k] else names[worst[k]]
+        }
+        for k in order
+    ]
+
+def select_for_ac(screened, full=False):
+    """Outages that need a full AC solve after screening"""
+    candidates = [outage for outage in screened if not outage['islanding']]
+    if full:
+        return candidates
+    return [outage for rank, outage in enumerate(candidates)
+            if rank < MIN_AC_SOLVES or outage['estimated_loading'] >= SCREENING_LOADING]
+
+def find_violations(bus_state, flows, outaged=None):
+    """Voltage and thermal limit violations of the solved circuit"""
+    v_pu = bus_state['v_pu']
+    low = v_pu < VOLTAGE_LIMITS[0]
+    high = v_pu > VOLTAGE_LIMITS[1]
+
+    names = flows['element_names']
+    overloaded = flows['pct_normal'] > 100
+    if outaged is not None:
+        overloaded &= np.char.lower(names.astype(str)) != outaged.lower()
+
+    return {
+        'voltage': [(str(bus), float(v)) for bus, v in zip(bus_state['bus_names'][low | high], v_pu[low | high])],
+        'thermal': [(str(name), float(normal), float(emergency)) for name, normal, emergency in
+                    zip(names[overloaded], flows['pct_normal'][overloaded], flows['pct_emergency'][overloaded])]
+    }
+
+def solve_base_case(load_mult):
+    """Solve the initialized circuit at the study load level"""
+    if not time_series.scale_loads_safely(load_mult):
+        return False
+    return time_series.try_solve_with_options()
+
+def study_load_level(use_cache=True):
+    """Peak load of the daily study profile, scaled as run_time_series() scales it
+
+    The circuit is converged at a light load when it is built, so the N-1
+    analysis is run at the profile's peak instead: the highest convergent
+    load factor, less LOADABILITY_MARGIN, times the profile's largest
+    multiplier. The stabilized circuit must already be initialized. With
+    use_cache the highest load factor is searched for once per model and
+    read back on later runs. Returns None if no convergent load level is
+    found.
+    """
+    model_hash = circuit_cache.compute_cache_key(time_series.STAGED_BUILD_FILES,
+                                                 time_series.SNAPSHOT_SETTINGS)
+    path = os.path.join(circuit_cache.snapshot_dir(model_hash), LOADABILITY_FILE)
+
+    max_load_factor = None
+    if use_cache and os.path.isfile(path):
+        try:
+            with open(path, 'r') as f:
+                max_load_factor = json.load(f)['max_load_factor']
+            print(f"Loadability from the circuit cache: {max_load_factor:.2%}")
+        except Exception as e:
+            print(f"WARNING: Ignoring unreadable loadability cache {path}: {str(e)}")
+
+    if max_load_factor is None:
+        loadability = time_series.find_max_load_factor()
+        if not loadability:
+            return None
+        max_load_factor = loadability['max_load_factor']
+
+        if use_cache:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'max_load_factor': max_load_factor}, f)
+            os.replace(tmp_path, path)
+
+    return max_load_factor * time_series.LOADABILITY_MARGIN * max(time_series.BASE_LOAD_MULTIPLIERS)
+
+def init_worker(dss_dir, load_mult, use_cache=True, quiet=True):
+    """Compile the circuit once in a worker and converge the base case every outage starts from"""
+    os.chdir(dss_dir)
+    _worker['quiet'] = quiet
+
+    with worker_output():
+        ready = (time_series.initialize_stabilized_circuit(use_cache=use_cache) and
+                 solve_base_case(load_mult))
+
+    _worker['ready'] = ready
+    if ready:
+        _worker['base'] = what_if.take_snapshot()
+
+@contextlib.contextmanager
+def worker_output():
+    """Silence the simulation's progress output inside quiet workers"""
+    if _worker.get('quiet', True):
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            yield
+    else:
+        yield
+
+def run_outage(element):
+    """Take one element out of service, solve from the base state and check the limits"""
+    result = {
+        'element': element,
+        'worker': os.getpid(),
+        'converged': False,
+        'violations': None,
+        'error': None
+    }
+
+    if not _worker.get('ready'):
+        result['error'] = 'Worker circuit failed to initialize'
+        return result
+
+    start_time = time.perf_counter()
+    stats = {}
+
+    try:
+        # The intact circuit and its converged voltages come back on leaving the branch
+        with worker_output(), what_if.branch(_worker['base']):
+            what_if.disable_element(_worker['base'], element)
+            result['converged'] = what_if.solve(_worker['base'], stats=stats)
+
+            if result['converged']:
+                bus_state = get_bus_state()
+                result['violations'] = find_violations(bus_state, get_branch_flows(), element)
+                result['min_voltage'] = float(bus_state['v_pu'].min())
+                result['max_voltage'] = float(bus_state['v_pu'].max())
+
+    except Exception as e:
+        result['error'] = str(e)
+
+    result['iterations'] = stats.get('iterations', 0)
+    result['elapsed'] = time.perf_counter() - start_time
+    return result
+
+def run_outages(elements, load_mult, max_workers=None, dss_dir='.', use_cache=True):
+    """Run AC outage solves on a process pool, yielding each result as it finishes"""
+    dss_dir = os.path.abspath(dss_dir)
+
+    # Spawned workers each get a fresh engine rather than a copy of ours
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context,
+                             initializer=init_worker,
+                             initargs=(dss_dir, load_mult, use_cache)) as executor:
+        futures = [executor.submit(run_outage, element) for element in elements]
+        for future in as_completed(futures):
+            yield future.result()
+
+def analyze_contingencies(load_mult=None, max_workers=None, dss_dir='.', full=False, use_cache=True):
+    """N-1 analysis over every line and transformer
+
+    All outages are ranked with the DC distribution factors, then only the
+    ones select_for_ac() keeps get an AC solve. Without a load_mult the
+    study's peak load from study_load_level() is used; the circuit is
+    initialized once for both. Returns a dict with the base case
+    violations, the screened outages and the AC results keyed by element
+    name.
+    """
+    start_time = time.perf_counter()
+
+    # Base case flows for the screening; this also caches the circuit for the workers
+    cwd = os.getcwd()
+    os.chdir(dss_dir)
+    try:
+        if not time_series.initialize_stabilized_circuit(use_cache=use_cache):
+            print("ERROR: Failed to initialize the circuit")
+            return None
+
+        if load_mult is None:
+            load_mult = study_load_level(use_cache=use_cache)
+            if load_mult is None:
+                print("ERROR: Failed to find a convergent study load level")
+                return None
+            print(f"Study load level: {load_mult:.2%}")
+
+        if not solve_base_case(load_mult):
+            print("ERROR: Base case did not converge")
+            return None
+        flows = get_branch_flows()
+        base_violations = find_violations(get_bus_state(), flows)
+        network = native_powerflow.build_network('.', files=sensitivity_factors.TOPOLOGY_FILES)
+        factors = sensitivity_factors.load_factors('.', network=network)
+    finally:
+        os.chdir(cwd)
+
+    time_series.print_section("SCREENING OUTAGES")
+    p_mw, q_mvar = match_branch_flows(network, flows)
+    screened = screen_outages(network, factors, p_mw, q_mvar)
+    selected = select_for_ac(screened, full=full)
+    print(f"Screened {len(screened)} outages in {time.perf_counter() - start_time:.2f} s: "
+          f"{sum(o['islanding'] for o in screened)} split the network, "
+          f"{len(selected)} selected for AC solves")
+
+    time_series.print_section("SOLVING SELECTED OUTAGES")
+    ac_results = {}
+    for result in run_outages([o['element'] for o in selected], load_mult,
+                              max_workers=max_workers, dss_dir=dss_dir, use_cache=use_cache):
+        ac_results[result['element']] = result
+        if result['error'] or not result['converged']:
+            print(f"{result['element']}: {'ERROR ' + result['error'] if result['error'] else 'did not converge'}")
+        else:
+            print(f"{result['element']}: {len(result['violations']['voltage'])} voltage and "
+                  f"{len(result['violations']['thermal'])} thermal violations")
+
+    elapsed = time.perf_counter() - start_time
+    print(f"\nN-1 analysis finished in {elapsed:.2f} s")
+
+    return {
+        'load_mult': load_mult,
+        'base_violations': base_violations,
+        'screened': screened,
+        'ac_results': ac_results,
+        'elapsed': elapsed
+    }
+
+def save_contingency_report(report, path='simulation_results/contingency_results.txt'):
+    """Save the N-1 results to a text file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, 'w') as f:
+        f.write("N-1 Contingency Analysis Results\n")
+        f.write("================================\n\n")
+        f.write(f"Load level: {report['load_mult']:.2%}\n")
+        f.write(f"Outages screened: {len(report['screened'])}\n")
+        f.write(f"Outages solved with AC power flow: {len(report['ac_results'])}\n")
+        f.write(f"Base case violations: {len(report['base_violations']['voltage'])} voltage, "
+                f"{len(report['base_violations']['thermal'])} thermal\n\n")
+
+        f.write("Outages by Estimated Severity:\n")
+        f.write("-----------------------------\n")
+        for outage in report['screened']:
+            if outage['islanding']:
+                f.write(f"{outage['element']}: splits the network\n")
+                continue
+
+            f.write(f"{outage['element']}: estimated {outage['estimated_loading']:.1%} "
+                    f"of normal rating on {outage['limiting_branch']}\n")
+
+            result = report['ac_results'].get(outage['element'])
+            if result is None:
+                continue
+            if not result['converged']:
+                f.write("  AC: did not converge\n")
+                continue
+
+            f.write(f"  AC: voltage {result['min_voltage']:.3f} - {result['max_voltage']:.3f} pu\n")
+            for bus, v in result['violations']['voltage']:
+                f.write(f"    Voltage violation at {bus}: {v:.3f} pu\n")
+            for element, normal, emergency in result['violations']['thermal']:
+                rating = 'emergency' if emergency > 100 else 'normal'
+                f.write(f"    Thermal violation on {element}: {normal:.1f}% of normal, "
+                        f"{emergency:.1f}% of emergency ({rating} rating exceeded)\n")
+
+    print(f"Results saved to {path}")
+
+def main():
+    time_series.print_section("N-1 CONTINGENCY ANALYSIS")
+
+    load_mult = float(sys.argv[1]) if len(sys.argv) > 1 and not sys.argv[1].startswith('--') else None
+    max_workers = None
+    if '--workers' in sys.argv:
+        max_workers = int(sys.argv[sys.argv.index('--workers') + 1])
+
+    report = analyze_contingencies(load_mult, max_workers=max_workers, full='--full' in sys.argv)
+    if report is not None:
+        save_contingency_report(report)
+
+if __name__ == "__main__":
+    main()
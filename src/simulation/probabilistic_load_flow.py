@@ -0,0 +1,349 @@
+import numpy as np
+import pandas as pd
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import batch_powerflow
+import native_powerflow
+from native_powerflow import NETWORK_FILES, S_BASE_MVA
+from time_series import LOAD_PROFILE_FILE, read_load_profiles
+
+# Relative standard deviation of each load around its profile value
+LOAD_STD = 0.1
+
+# Probability that a generator is out of service in a sample
+FORCED_OUTAGE_RATE = 0.04
+
+# Samples drawn and solved together by one worker
+BATCH_SIZE = 2000
+
+# Width of the load level bands, relative to load_level, solved as one batch
+LEVEL_BAND = 0.1
+
+# Acceptable bus voltages (pu); a line violates when it exceeds normamps
+VOLTAGE_LIMITS = (0.95, 1.05)
+
+# Histogram bins the streaming quantiles are read from
+VOLTAGE_BINS = np.linspace(0.5, 1.5, 2001)
+LOADING_BINS = np.linspace(0.0, 3.0, 3001)
+
+# Quantiles reported per bus and line
+QUANTILES = (0.05, 0.5, 0.95)
+
+# Per-worker network, set up once by init_worker()
+_worker = {}
+
+def new_statistics(n_values, bins=None):
+    """Empty streaming statistics for n_values quantities
+
+    Moments are kept as count, mean and sum of squared deviations, and
+    quantiles are read from fixed-bin histograms, so the memory used does
+    not grow with the number of samples.
+    """
+    return {
+        'count': 0,
+        'mean': np.zeros(n_values),
+        'm2': np.zeros(n_values),
+        'min': np.full(n_values, np.inf),
+        'max': np.full(n_values, -np.inf),
+        'violations': np.zeros(n_values, dtype=np.int64),
+        'bins': bins,
+        'histogram': None if bins is None else np.zeros((n_values, len(bins) - 1), dtype=np.int64)
+    }
+
+def update_statistics(stats, samples, violated=None):
+    """Fold a (samples x values) batch into the statistics"""
+    samples = np.atleast_2d(samples)
+    if samples.shape[0] == 0:
+        return stats
+
+    batch = new_statistics(samples.shape[1], stats['bins'])
+    batch['count'] = samples.shape[0]
+    batch['mean'] = samples.mean(axis=0)
+    batch['m2'] = ((samples - batch['mean']) ** 2).sum(axis=0)
+    batch['min'] = samples.min(axis=0)
+    batch['max'] = samples.max(axis=0)
+    if violated is not None:
+        batch['violations'] = violated.sum(axis=0)
+
+    # Every value's bin, offset so one bincount fills all the histograms
+    if stats['bins'] is not None:
+        n_bins = len(stats['bins']) - 1
+        index = np.clip(np.searchsorted(stats['bins'], samples, side='right') - 1, 0, n_bins - 1)
+        index += np.arange(samples.shape[1]) * n_bins
+        batch['histogram'] = np.bincount(index.ravel(), minlength=samples.shape[1] * n_bins) \
+            .reshape(samples.shape[1], n_bins)
+
+    return merge_statistics(stats, batch)
+
+def merge_statistics(stats, other):
+    """Merge other into stats in place (Chan et al. pairwise update)"""
+    if other['count'] == 0:
+        return stats
+
+    count = stats['count'] + other['count']
+    delta = other['mean'] - stats['mean']
+    stats['mean'] = stats['mean'] + delta * other['count'] / count
+    stats['m2'] = stats['m2'] + other['m2'] + delta ** 2 * stats['count'] * other['count'] / count
+    stats['count'] = count
+
+    stats['min'] = np.minimum(stats['min'], other['min'])
+    stats['max'] = np.maximum(stats['max'], other['max'])
+    stats['violations'] = stats['violations'] + other['violations']
+    if stats['histogram'] is not None:
+        stats['histogram'] = stats['histogram'] + other['histogram']
+    return stats
+
+def histogram_quantiles(stats, quantiles=QUANTILES):
+    """Quantiles of every value, interpolated within its histogram bins"""
+    histogram = stats['histogram']
+    bins = stats['bins']
+    cumulative = np.cumsum(histogram, axis=1)
+
+    result = np.full((len(quantiles), histogram.shape[0]), np.nan)
+    if stats['count'] == 0:
+        return result
+
+    rows = np.arange(histogram.shape[0])
+    for i, q in enumerate(quantiles):
+        target = q * stats['count']
+        bin_index = np.minimum((cumulative < target).sum(axis=1), histogram.shape[1] - 1)
+        before = np.where(bin_index > 0, cumulative[rows, bin_index - 1], 0)
+        in_bin = np.maximum(histogram[rows, bin_index], 1)
+        fraction = np.clip((target - before) / in_bin, 0.0, 1.0)
+        result[i] = bins[bin_index] + fraction * (bins[bin_index + 1] - bins[bin_index])
+
+    # Values beyond the bin range were counted in the edge bins
+    return np.clip(result, stats['min'], stats['max'])
+
+def summarize_statistics(stats, quantiles=QUANTILES):
+    """Mean, standard deviation, extremes, quantiles and violation probability"""
+    count = stats['count']
+    summary = {
+        'mean': stats['mean'],
+        'std': np.sqrt(stats['m2'] / (count - 1)) if count > 1 else np.zeros_like(stats['mean']),
+        'min': stats['min'],
+        'max': stats['max'],
+        'violation_probability': stats['violations'] / max(count, 1)
+    }
+    if stats['histogram'] is not None:
+        for q, values in zip(quantiles, histogram_quantiles(stats, quantiles)):
+            summary[f'q{q * 100:g}'] = values
+    return summary
+
+def new_plf_statistics(network):
+    """Streaming statistics of bus voltages, line loadings and system losses"""
+    return {
+        'samples': 0,
+        'failed': 0,
+        'voltage': new_statistics(network['n_buses'], VOLTAGE_BINS),
+        'loading': new_statistics(len(network['branches']['name']), LOADING_BINS),
+        'active_loss_mw': new_statistics(1)
+    }
+
+def merge_plf_statistics(total, part):
+    """Merge the statistics of one batch into the running totals"""
+    total['samples'] += part['samples']
+    total['failed'] += part['failed']
+    for name in ('voltage', 'loading', 'active_loss_mw'):
+        merge_statistics(total[name], part[name])
+    return total
+
+def profile_matrix(network, multipliers, load_profiles):
+    """Hour x load matrix of profile multipliers
+
+    Loads with their own column in load_profiles follow it, the others
+    follow the system multipliers, as in time_series.simulate_loadshape().
+    """
+    columns = {name.lower(): values for name, values in load_profiles.items()}
+    matrix = np.repeat(np.asarray(multipliers, dtype=float)[:, None], len(network['loads']['name']), axis=1)
+    for i, name in enumerate(network['loads']['name']):
+        own = columns.get(name.split('.', 1)[1].lower())
+        if own is not None:
+            matrix[:, i] = own
+    return matrix
+
+def sample_scenarios(rng, network, n_samples, load_level=1.0, profile=None,
+                     load_std=LOAD_STD, outage_rate=FORCED_OUTAGE_RATE):
+    """Per-load multipliers, profile hours and generator outages for a batch of samples
+
+    Each sample draws an hour of the profile (if given), scales it by
+    load_level and multiplies every load by its own normal deviation.
+    Every generator is independently out of service with outage_rate.
+    """
+    n_loads = len(network['loads']['name'])
+    if profile is None:
+        hours = np.zeros(n_samples, dtype=int)
+        base = np.full((n_samples, 1), float(load_level))
+    else:
+        hours = rng.integers(len(profile), size=n_samples)
+        base = load_level * profile[hours]
+
+    load_matrix = np.maximum(base * rng.normal(1.0, load_std, size=(n_samples, n_loads)), 0.0)
+    outages = rng.random((n_samples, len(network['generators']['name']))) < outage_rate
+    return load_matrix, hours, outages
+
+def branch_loading(network, v):
+    """Sending-end current of every branch as a fraction of normamps
+
+    v holds the bus voltages of each sample, shaped (samples x buses).
+    """
+    branches = network['branches']
+    v_f = v[:, branches['from']]
+    v_t = v[:, branches['to']]
+    i_from = np.abs(branches['y_ff'] * v_f + branches['y_ft'] * v_t)
+
+    i_base = S_BASE_MVA * 1000 / (np.sqrt(3) * branches['kv_base'])
+    return i_from * i_base / branches['normamps']
+
+def init_worker(dss_dir, files=NETWORK_FILES, profile=None):
+    """Build the network model once in a worker process"""
+    _worker['network'] = native_powerflow.build_network(dss_dir, files=files)
+    _worker['profile'] = profile
+
+def add_solutions(stats, network, v, active_loss_mw):
+    """Fold the converged (samples x buses) voltages of some samples into the statistics"""
+    v_pu = np.abs(v)
+    loading = branch_loading(network, v)
+    update_statistics(stats['voltage'], v_pu, (v_pu < VOLTAGE_LIMITS[0]) | (v_pu > VOLTAGE_LIMITS[1]))
+    update_statistics(stats['loading'], loading, loading > 1.0)
+    update_statistics(stats['active_loss_mw'], active_loss_mw[:, None])
+
+def run_batch(seed, n_samples, load_level=1.0, load_std=LOAD_STD, outage_rate=FORCED_OUTAGE_RATE):
+    """Draw and solve one batch of samples, returning only its statistics"""
+    network = _worker['network']
+    rng = np.random.default_rng(seed)
+    load_matrix, hours, outages = sample_scenarios(rng, network, n_samples, load_level, _worker['profile'],
+                                            load_std, outage_rate)
+
+    stats = new_plf_statistics(network)
+    stats['samples'] = n_samples
+
+    # Samples at a similar load level share a band, which keeps them close to
+    # the base cases their batched solves factorize
+    level = np.floor(load_matrix.mean(axis=1) / (load_level * LEVEL_BAND))
+
+    # Neighbouring bands are similar, so each base case starts from the previous
+    # one and the first from a flat start
+    v0 = None
+    for band in np.unique(level):
+        in_band = np.flatnonzero(level == band)
+        result = batch_powerflow.solve_batch(network, load_matrix[in_band], v0=v0,
+                                             out_of_service=outages[in_band])
+        if result is None:
+            stats['failed'] += len(in_band)
+            continue
+        v0 = result['base_v']
+
+        converged = result['converged']
+        stats['failed'] += int((~converged).sum())
+        if converged.any():
+            add_solutions(stats, network, result['v'][converged], result['active_loss_mw'][converged])
+
+    return stats
+
+def run_probabilistic_load_flow(n_samples, load_level=1.0, dss_dir='.', files=NETWORK_FILES,
+                                use_profile=True, load_std=LOAD_STD, outage_rate=FORCED_OUTAGE_RATE,
+                                batch_size=BATCH_SIZE, max_workers=None, seed=0):
+    """Monte Carlo load flow over sampled demand and generator outages
+
+    Batches are solved on a process pool and only their statistics come
+    back, merged as they arrive; at most two batches per worker are in
+    flight. max_workers=1 solves in this process. Returns the network and
+    the merged statistics from new_plf_statistics().
+    """
+    network = native_powerflow.build_network(dss_dir, files=files)
+
+    profile = None
+    profile_path = os.path.join(dss_dir, LOAD_PROFILE_FILE)
+    if use_profile and os.path.isfile(profile_path):
+        profile = profile_matrix(network, *read_load_profiles(profile_path))
+        print(f"Sampling demand from the {len(profile)}-hour profile in {profile_path}")
+
+    # Independent, reproducible random streams for every batch
+    sizes = [min(batch_size, n_samples - start) for start in range(0, n_samples, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    batch_args = [(seeds[i], size, load_level, load_std, outage_rate) for i, size in enumerate(sizes)]
+
+    total = new_plf_statistics(network)
+    start_time = time.perf_counter()
+
+    def merge(part):
+        merge_plf_statistics(total, part)
+        print(f"  {total['samples']} / {n_samples} samples "
+              f"({total['samples'] / (time.perf_counter() - start_time):.0f} per second)")
+
+    if max_workers == 1:
+        init_worker(dss_dir, files, profile)
+        for args in batch_args:
+            merge(run_batch(*args))
+        return network, total
+
+    max_workers = max_workers or os.cpu_count()
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context,
+                             initializer=init_worker,
+                             initargs=(os.path.abspath(dss_dir), files, profile)) as executor:
+        pending = set()
+        for args in batch_args:
+            if len(pending) >= 2 * max_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    merge(future.result())
+            pending.add(executor.submit(run_batch, *args))
+
+        for future in pending:
+            merge(future.result())
+
+    return network, total
+
+def save_plf_results(network, stats, directory='simulation_results'):
+    """Write the per-bus and per-line statistics to CSV files"""
+    os.makedirs(directory, exist_ok=True)
+
+    buses = pd.DataFrame(summarize_statistics(stats['voltage']))
+    buses.insert(0, 'bus', network['bus_names'][:network['n_buses']])
+    buses.to_csv(os.path.join(directory, 'plf_bus_voltages.csv'), index=False)
+
+    lines = pd.DataFrame(summarize_statistics(stats['loading']))
+    lines.insert(0, 'element', network['branches']['name'])
+    lines.to_csv(os.path.join(directory, 'plf_line_loading.csv'), index=False)
+
+    print(f"Results saved to {directory}/plf_bus_voltages.csv and {directory}/plf_line_loading.csv")
+    return buses, lines
+
+def main():
+    print("=" * 80)
+    print(" PROBABILISTIC LOAD FLOW")
+    print("=" * 80)
+
+    n_samples = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    load_level = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    max_workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+
+    start_time = time.perf_counter()
+    network, stats = run_probabilistic_load_flow(n_samples, load_level=load_level, max_workers=max_workers)
+    elapsed = time.perf_counter() - start_time
+
+    converged = stats['voltage']['count']
+    print(f"\n{converged} of {stats['samples']} samples converged in {elapsed:.2f} s")
+    if converged == 0:
+        return
+
+    buses, lines = save_plf_results(network, stats)
+    losses = summarize_statistics(stats['active_loss_mw'])
+    print(f"  Active Losses: {losses['mean'][0]:.2f} +/- {losses['std'][0]:.2f} MW")
+
+    print("  Buses most likely to leave the voltage limits:")
+    for _, row in buses.nlargest(5, 'violation_probability').iterrows():
+        print(f"    {row['bus']}: {row['violation_probability']:.1%} (mean {row['mean']:.3f} pu)")
+
+    print("  Lines most likely to exceed normamps:")
+    for _, row in lines.nlargest(5, 'violation_probability').iterrows():
+        print(f"    {row['element']}: {row['violation_probability']:.1%} (mean {row['mean']:.1%})")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
 import opendssdirect as dss
 import os
 import sys
-import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+
+from state_extraction import get_bus_state
 
 def execute_command(cmd, description):
     print(f"\nExecuting: {description}")
@@ -29,25 +32,16 @@ def analyze_voltages():
     v_min_bus = ""
     v_max_bus = ""
     
-    # Get all bus voltages
-    dss.Circuit.SetActiveBus("")
-    buses = dss.Circuit.AllBusNames()
+    # Get all bus voltages in one pass
+    bus_state = get_bus_state()
     
-    for bus in buses:
-        # Set the active bus
-        dss.Circuit.SetActiveBus(bus)
-        
-        # Get base voltage (138 kV for all buses in this case)
-        base_kv = 138.0
-        
-        # Get voltage magnitudes
-        v_mag_array = dss.Bus.VMagAngle()[::2]  # Even indices are magnitudes
-        if len(v_mag_array) >= 3:  # Three-phase
-            # Calculate average phase voltage magnitude in per unit
-            v_mag = np.mean(v_mag_array) / (base_kv * 1000)  # Convert from V to kV
-        else:  # Single-phase or two-phase
-            v_mag = v_mag_array[0] / (base_kv * 1000)  # Convert from V to kV
-            
+    # Get base voltage (138 kV for all buses in this case)
+    base_kv = 138.0
+    
+    # Average phase voltage magnitude in per unit
+    v_mags = bus_state['v_mean'] / (base_kv * 1000)  # Convert from V to kV
+    
+    for bus, v_mag in zip(bus_state['bus_names'], v_mags):
         actual_kv = v_mag * base_kv
         
         # Determine voltage status
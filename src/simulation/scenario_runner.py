@@ -0,0 +1,210 @@
+import opendssdirect as dss
+import contextlib
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+
+import circuit_cache
+import result_store
+import time_series
+from solver_state import get_voltage_state, set_voltage_state
+
+# Per-worker engine state, set up once by init_worker()
+_worker = {}
+
+def init_worker(dss_dir, use_cache=True, quiet=True):
+    """Compile and converge the 118-bus circuit once in a worker process"""
+    os.chdir(dss_dir)
+    _worker['quiet'] = quiet
+
+    with worker_output():
+        ready = time_series.initialize_stabilized_circuit(use_cache=use_cache)
+
+    _worker['ready'] = ready
+    if ready:
+        # Converged base state every scenario starts from
+        _worker['base_state'] = get_voltage_state()
+
+def init_forked_worker(dss_dir, quiet=True):
+    """Set up a worker forked from a process that already converged the circuit
+
+    The engine and the base state in _worker are inherited from the parent
+    through copy-on-write memory, so there is nothing to compile here.
+    """
+    os.chdir(dss_dir)
+    _worker['quiet'] = quiet
+
+def prepare_parent_circuit(dss_dir, use_cache=True):
+    """Compile and converge the circuit in this process for forked workers to inherit"""
+    cwd = os.getcwd()
+    os.chdir(dss_dir)
+    try:
+        ready = time_series.initialize_stabilized_circuit(use_cache=use_cache)
+    finally:
+        os.chdir(cwd)
+
+    _worker['ready'] = ready
+    if ready:
+        _worker['base_state'] = get_voltage_state()
+    return ready
+
+@contextlib.contextmanager
+def worker_output():
+    """Silence the simulation's progress output inside quiet workers"""
+    if _worker.get('quiet', True):
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            yield
+    else:
+        yield
+
+def reset_worker_circuit(disabled_elements=()):
+    """Undo a scenario's changes and return to the converged base state"""
+    for element in disabled_elements:
+        dss.Text.Command(f'Enable {element}')
+
+    for command in time_series.SNAPSHOT_SETTINGS:
+        dss.Text.Command(command)
+
+    set_voltage_state(*_worker['base_state'])
+
+def run_scenario(scenario):
+    """Run one scenario on this worker's circuit
+
+    A scenario is a dict with a 'name', a list of 'load_multipliers' and
+    optionally 'solver_settings' (a dict of 'algorithm', 'iterations' or
+    'tolerance' overriding those fields of every fallback solver option,
+    see time_series.solver_ladder()), 'disable' (element
+    names to take out of service), 'continuation' (warm-started hours) and
+    'use_solve_cache' (reuse solutions of operating points seen before).
+    Hourly results are also written to the result store under the
+    scenario name as run ID.
+    """
+    result = {
+        'name': scenario['name'],
+        'worker': os.getpid(),
+        'results': [],
+        'failed_hours': [],
+        'run_id': scenario.get('run_id', scenario['name']),
+        'error': None
+    }
+
+    if not _worker.get('ready'):
+        result['error'] = 'Worker circuit failed to initialize'
+        return result
+
+    start_time = time.perf_counter()
+    disabled = scenario.get('disable', [])
+
+    try:
+        with worker_output():
+            # Apply contingencies; solver overrides go to the fallback ladder, which
+            # sets the solver options itself on every attempt
+            for element in disabled:
+                dss.Text.Command(f'Disable {element}')
+
+            load_multipliers = scenario['load_multipliers']
+            writer = result_store.open_run(result['run_id'])
+            results = time_series.simulate_profile(
+                load_multipliers,
+                continuation=scenario.get('continuation', False),
+                max_step=scenario.get('max_step', 0.05),
+                use_solve_cache=scenario.get('use_solve_cache', True),
+                cache_context={'disable': disabled},
+                writer=writer,
+                solver_overrides=scenario.get('solver_settings')
+            )
+            result_store.close_run(writer)
+
+        result['results'] = results
+        solved_hours = {r['hour'] for r in results}
+        result['failed_hours'] = [h for h in range(len(load_multipliers)) if h not in solved_hours]
+
+    except Exception as e:
+        result['error'] = str(e)
+
+    finally:
+        reset_worker_circuit(disabled)
+
+    result['elapsed'] = time.perf_counter() - start_time
+    return result
+
+def run_scenarios(scenarios, max_workers=None, dss_dir='.', use_cache=True, fork=False):
+    """Run scenarios on a process pool, yielding each result as it finishes
+
+    With fork=True the circuit is compiled and converged once in this
+    process and the workers are forked from it, so they start with a ready
+    engine instead of each restoring or building their own. Where fork is
+    not available the workers are spawned as usual.
+    """
+    dss_dir = os.path.abspath(dss_dir)
+
+    if fork and 'fork' not in multiprocessing.get_all_start_methods():
+        print("WARNING: fork is not available on this platform, spawning workers instead")
+        fork = False
+
+    if fork:
+        # Forked workers share this process's converged engine until they write to it
+        prepare_parent_circuit(dss_dir, use_cache=use_cache)
+        context = multiprocessing.get_context('fork')
+        initializer, initargs = init_forked_worker, (dss_dir,)
+    else:
+        # Warm the snapshot cache once so workers restore instead of rebuilding
+        if use_cache:
+            warm_cache(dss_dir)
+
+        # Spawned workers each get a fresh engine rather than a copy of ours
+        context = multiprocessing.get_context('spawn')
+        initializer, initargs = init_worker, (dss_dir, use_cache)
+
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context,
+                             initializer=initializer, initargs=initargs) as executor:
+        futures = [executor.submit(run_scenario, scenario) for scenario in scenarios]
+        for future in as_completed(futures):
+            yield future.result()
+
+def warm_cache(dss_dir):
+    """Build the circuit snapshot in this process if it is not cached yet"""
+    cwd = os.getcwd()
+    os.chdir(dss_dir)
+    try:
+        key = circuit_cache.compute_cache_key(time_series.STAGED_BUILD_FILES,
+                                              time_series.SNAPSHOT_SETTINGS)
+        if not circuit_cache.has_snapshot(key):
+            time_series.initialize_stabilized_circuit(use_cache=True)
+    finally:
+        os.chdir(cwd)
+
+def build_load_factor_scenarios(load_factors):
+    """Scenarios running the daily profile at several peak load factors"""
+    return [
+        {
+            'name': f'load_factor_{factor:.2f}',
+            'load_multipliers': [m * factor for m in time_series.BASE_LOAD_MULTIPLIERS]
+        }
+        for factor in load_factors
+    ]
+
+def main():
+    time_series.print_section("RUNNING SCENARIO BATCH")
+
+    load_factors = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8]
+    scenarios = build_load_factor_scenarios(load_factors)
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 and not sys.argv[1].startswith('--') else None
+
+    start_time = time.perf_counter()
+    for result in run_scenarios(scenarios, max_workers=max_workers, fork='--fork' in sys.argv):
+        if result['error']:
+            print(f"{result['name']}: ERROR {result['error']}")
+            continue
+        print(f"{result['name']}: {len(result['results'])} hours solved, "
+              f"{len(result['failed_hours'])} failed, "
+              f"{result['elapsed']:.2f} s on worker {result['worker']}")
+
+    print(f"\nBatch finished in {time.perf_counter() - start_time:.2f} s")
+
+if __name__ == "__main__":
+    main()
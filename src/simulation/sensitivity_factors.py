@@ -0,0 +1,208 @@
+import numpy as np
+import hashlib
+import os
+import sys
+import time
+from scipy import sparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+
+import native_powerflow
+from dss_model import bus_name
+
+# Factor files live next to the DSS files the simulation scripts are run from
+FACTORS_DIR = '.sensitivity_factors'
+
+# Files the branch topology and reactances are read from
+TOPOLOGY_FILES = ['confirm_kv_bases.dss', 'lines.dss', 'transformers.dss']
+
+# An outage whose own transfer factor is this close to 1 splits the network
+ISLANDING_TOLERANCE = 1e-6
+
+# Factors already loaded in this process, keyed by topology hash
+_loaded = {}
+
+def topology_hash(network):
+    """Hash of the buses, branch connections and reactances the factors depend on"""
+    branches = network['branches']
+
+    digest = hashlib.sha256()
+    digest.update('\n'.join(network['bus_names']).encode())
+    digest.update('\n'.join(branches['name']).encode())
+    digest.update(branches['from'].astype(np.int64).tobytes())
+    digest.update(branches['to'].astype(np.int64).tobytes())
+    digest.update(np.round(branches['x_pu'], 12).tobytes())
+    digest.update(bus_name(network['source']['bus']).encode())
+    return digest.hexdigest()[:24]
+
+def compute_factors(network):
+    """DC power transfer and line outage distribution factors of the network branches
+
+    Returns a dict with 'ptdf' (branches x buses, flow per unit injection at
+    a bus withdrawn at the reference bus), 'lodf' (branches x branches, flow
+    change on a branch per unit of pre-outage flow on the outaged branch)
+    and 'islanding' (branches whose outage splits the network), along with
+    the bus and branch names that index them.
+    """
+    branches = network['branches']
+    n_buses = network['n_buses']
+    n_branches = len(branches['name'])
+    reference = network['bus_index'][bus_name(network['source']['bus'])]
+
+    # Branch-bus incidence and the DC susceptance matrices
+    rows = np.concatenate([np.arange(n_branches), np.arange(n_branches)])
+    cols = np.concatenate([branches['from'], branches['to']])
+    signs = np.concatenate([np.ones(n_branches), -np.ones(n_branches)])
+    incidence = sparse.csr_matrix((signs, (rows, cols)), shape=(n_branches, n_buses))
+    b_branch = sparse.diags(1 / branches['x_pu'])
+    b_bus = (incidence.T @ b_branch @ incidence).toarray()
+
+    # Bus angles per unit injection, with the reference bus angle held at zero
+    others = np.setdiff1d(np.arange(n_buses), [reference])
+    ptdf = np.zeros((n_branches, n_buses))
+    b_flow = (b_branch @ incidence).toarray()
+    ptdf[:, others] = np.linalg.solve(b_bus[np.ix_(others, others)], b_flow[:, others].T).T
+
+    # Moving one unit from each branch's from bus to its to bus
+    transfer = (incidence @ ptdf.T).T
+    self_transfer = np.diag(transfer).copy()
+    islanding = 1 - self_transfer < ISLANDING_TOLERANCE
+
+    lodf = transfer / np.where(islanding, 1.0, 1 - self_transfer)
+    lodf[:, islanding] = 0.0
+    np.fill_diagonal(lodf, -1.0)
+
+    return {
+        'bus_names': np.array(network['bus_names'][:n_buses]),
+        'branch_names': np.array(branches['name']),
+        'reference_bus': reference,
+        'ptdf': ptdf,
+        'lodf': lodf,
+        'islanding': islanding
+    }
+
+def factors_path(key):
+    """File holding the factors for a topology hash"""
+    return os.path.join(FACTORS_DIR, f'{key}.npz')
+
+def load_factors(dss_dir='.', files=TOPOLOGY_FILES, network=None):
+    """Distribution factors for the network, computed only when its topology is new
+
+    The network is built from the DSS files unless given. Factors are kept
+    in memory and as compressed .npz files under FACTORS_DIR, keyed by
+    topology_hash().
+    """
+    if network is None:
+        network = native_powerflow.build_network(dss_dir, files=files)
+
+    key = topology_hash(network)
+    if key in _loaded:
+        return _loaded[key]
+
+    path = os.path.join(dss_dir, factors_path(key))
+    factors = None
+    if os.path.isfile(path):
+        try:
+            with np.load(path) as data:
+                factors = {name: data[name] for name in data.files}
+            factors['reference_bus'] = int(factors['reference_bus'])
+        except Exception as e:
+            print(f"WARNING: Recomputing unreadable sensitivity factors {path}: {str(e)}")
+            factors = None
+
+    if factors is None:
+        factors = compute_factors(network)
+        save_factors(factors, path)
+
+    factors['topology_hash'] = key
+    factors['bus_index'] = {name: i for i, name in enumerate(factors['bus_names'])}
+    factors['branch_index'] = {name.lower(): i for i, name in enumerate(factors['branch_names'])}
+    _loaded[key] = factors
+    return factors
+
+def save_factors(factors, path):
+    """Write factors as a compressed .npz file"""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a scratch file first so readers never see half a file
+        tmp_path = f'{path}.{os.getpid()}.tmp.npz'
+        np.savez_compressed(tmp_path, **factors)
+        os.replace(tmp_path, path)
+        return True
+    except Exception as e:
+        print(f"ERROR saving sensitivity factors: {str(e)}")
+        return False
+
+def bus_position(factors, bus):
+    """Column of a bus, given by index or by name"""
+    if isinstance(bus, str):
+        return factors['bus_index'][bus_name(bus)]
+    return int(bus)
+
+def branch_position(factors, branch):
+    """Row of a branch, given by index or by name such as 'Line.1_2_1_1'"""
+    if isinstance(branch, str):
+        return factors['branch_index'][branch.lower()]
+    return int(branch)
+
+def injection_flows(factors, bus, amount=1.0, withdrawal_bus=None):
+    """Flow change on every branch for an injection at a bus
+
+    The injection is withdrawn at withdrawal_bus, or at the reference bus
+    if none is given. Flows are in the unit of amount.
+    """
+    column = factors['ptdf'][:, bus_position(factors, bus)]
+    if withdrawal_bus is not None:
+        column = column - factors['ptdf'][:, bus_position(factors, withdrawal_bus)]
+    return amount * column
+
+def outage_flows(factors, branch, flows):
+    """Flows on every branch after the outage of one branch
+
+    flows holds the pre-outage flow of every branch; the outaged branch
+    itself ends up at zero. Returns None if the outage splits the network,
+    which the linear factors cannot describe.
+    """
+    k = branch_position(factors, branch)
+    if factors['islanding'][k]:
+        return None
+
+    flows = np.asarray(flows, dtype=float)
+    return flows + factors['lodf'][:, k] * flows[k]
+
+def clear_factors_cache(dss_dir='.'):
+    """Remove all stored factors from memory and disk"""
+    _loaded.clear()
+    directory = os.path.join(dss_dir, FACTORS_DIR)
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+def main():
+    print("=" * 80)
+    print(" PTDF/LODF SENSITIVITY FACTORS")
+    print("=" * 80)
+
+    dss_dir = sys.argv[1] if len(sys.argv) > 1 else '.'
+
+    start_time = time.perf_counter()
+    factors = load_factors(dss_dir)
+    print(f"Topology {factors['topology_hash']}: {len(factors['branch_names'])} branches, "
+          f"{len(factors['bus_names'])} buses ({time.perf_counter() - start_time:.3f} s)")
+    print(f"  Reference bus: {factors['bus_names'][factors['reference_bus']]}")
+    print(f"  Outages that split the network: {int(factors['islanding'].sum())}")
+
+    # The branches most sensitive to each outage, by largest absolute LODF
+    lodf = np.abs(factors['lodf'])
+    np.fill_diagonal(lodf, 0.0)
+    for k in np.argsort(-lodf.max(axis=0))[:5]:
+        l = lodf[:, k].argmax()
+        print(f"  Outage of {factors['branch_names'][k]} moves {lodf[l, k]:.1%} "
+              f"of its flow onto {factors['branch_names'][l]}")
+
+if __name__ == "__main__":
+    main()
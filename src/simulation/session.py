@@ -0,0 +1,174 @@
+import opendssdirect as dss
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+
+import adaptive_solver
+import circuit_builder
+import circuit_cache
+import time_series
+from solver_state import get_voltage_state, set_voltage_state
+from state_extraction import (get_branch_flows, get_bus_state, get_element_state,
+                              summarize_voltages)
+
+# A missing snapshot is built by one session at a time; the others then restore it
+_build_lock = threading.Lock()
+
+class Session:
+    """A circuit in its own OpenDSS engine context
+
+    Every session owns a separate DSS C-API context, so sessions in one
+    process do not share any engine state and can solve at the same time
+    from different threads. Calls on one session are serialized by its
+    lock; hold session.lock to make several calls as one step.
+
+    Every file is passed to the engine by absolute path, so no session
+    changes the process directory or any process-wide engine setting.
+    """
+
+    def __init__(self, dss_dir='.'):
+        self.dss_dir = os.path.abspath(dss_dir)
+        self.engine = dss.NewContext()
+        self.lock = threading.RLock()
+
+    def command(self, command):
+        """Run a DSS command and return its result text"""
+        with self.lock:
+            self.engine.Text.Command(command)
+            return self.engine.Text.Result()
+
+    def compile(self, path):
+        """Compile a DSS file, relative to dss_dir unless absolute"""
+        return self.command(f'Redirect {os.path.join(self.dss_dir, path)}')
+
+    def load_circuit(self):
+        """Load the converged 118-bus circuit from the snapshot cache in dss_dir
+
+        If there is no snapshot yet, this session builds the circuit with
+        time_series.stabilized_build() in its own engine and saves it.
+        """
+        files = [os.path.join(self.dss_dir, name) for name in time_series.STAGED_BUILD_FILES]
+        key = circuit_cache.compute_cache_key(files, time_series.SNAPSHOT_SETTINGS)
+        cache_dir = os.path.join(self.dss_dir, circuit_cache.CACHE_DIR)
+
+        try:
+            with _build_lock:
+                if not circuit_cache.has_snapshot(key, cache_dir):
+                    with self.lock:
+                        if not circuit_builder.send(time_series.stabilized_build(self.dss_dir),
+                                                    engine=self.engine):
+                            return False
+                        circuit_cache.save_snapshot(key, cache_dir, engine=self.engine)
+
+            with self.lock:
+                if not circuit_cache.restore_snapshot(key, time_series.SNAPSHOT_SETTINGS,
+                                                      cache_dir, engine=self.engine):
+                    return False
+                return self.solve()
+
+        except Exception as e:
+            print(f"ERROR loading circuit into session: {str(e)}")
+            return False
+
+    def solve(self, load_mult=None, seed=None, stats=None):
+        """Solve with the fallback options, as time_series.try_solve_with_options()
+
+        load_mult scales the loads first if given. seed is an optional
+        (voltages, node_order) pair every attempt starts from. Convergence
+        statistics are kept with the other runs in dss_dir.
+        """
+        with self.lock:
+            if load_mult is not None:
+                self.engine.Solution.LoadMult(load_mult)
+
+            return time_series.try_solve_with_options(
+                seed=seed, stats=stats, engine=self.engine,
+                stats_file=os.path.join(self.dss_dir, adaptive_solver.STATS_FILE))
+
+    def voltage_state(self):
+        """Node voltage vector and node order, as solver_state.get_voltage_state()"""
+        with self.lock:
+            return get_voltage_state(self.engine)
+
+    def set_voltage_state(self, voltages, node_order=None):
+        """Seed the next solve, as solver_state.set_voltage_state()"""
+        with self.lock:
+            return set_voltage_state(voltages, node_order, engine=self.engine)
+
+    def bus_state(self):
+        """Per-bus voltages, as state_extraction.get_bus_state()"""
+        with self.lock:
+            return get_bus_state(self.engine)
+
+    def branch_flows(self):
+        """Branch flows and loading, as state_extraction.get_branch_flows()"""
+        with self.lock:
+            return get_branch_flows(self.engine)
+
+    def element_state(self):
+        """Element losses, as state_extraction.get_element_state()"""
+        with self.lock:
+            return get_element_state(self.engine)
+
+    def metrics(self):
+        """Losses and voltage range, as time_series.get_system_metrics()"""
+        with self.lock:
+            losses = self.engine.Circuit.Losses()
+            min_v, max_v, avg_v = summarize_voltages(self.bus_state()['v_pu'])
+            return {
+                'active_loss_mw': losses[0] / 1000000,
+                'reactive_loss_mvar': losses[1] / 1000000,
+                'min_voltage': min_v,
+                'max_voltage': max_v,
+                'avg_voltage': avg_v
+            }
+
+def run_concurrently(tasks, max_workers=None):
+    """Run (session, function) pairs on a thread pool; function is called with its session
+
+    Returns the results in the order of tasks.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(function, session) for session, function in tasks]
+        return [future.result() for future in futures]
+
+def main():
+    time_series.print_section("CONCURRENT OPENDSS SESSIONS")
+
+    dss_dir = sys.argv[1] if len(sys.argv) > 1 else '.'
+    load_mult = float(sys.argv[2]) if len(sys.argv) > 2 else time_series.INITIAL_LOAD_MULT
+
+    start_time = time.perf_counter()
+    sessions = [Session(dss_dir) for _ in range(3)]
+    if not all(run_concurrently([(session, Session.load_circuit) for session in sessions])):
+        print("ERROR: Failed to load the circuit into every session")
+        return
+    print(f"Loaded {len(sessions)} sessions in {time.perf_counter() - start_time:.2f} s")
+
+    # Base case, the first line out of service and a 10% higher load, side by side
+    base, contingency, sensitivity = sessions
+    line = contingency.engine.Lines.AllNames()[0]
+    contingency.command(f'Disable Line.{line}')
+
+    def study(load):
+        return lambda session: session.solve(load_mult=load) and session.metrics()
+
+    start_time = time.perf_counter()
+    results = run_concurrently([(base, study(load_mult)),
+                                (contingency, study(load_mult)),
+                                (sensitivity, study(load_mult * 1.1))])
+    print(f"Solved concurrently in {time.perf_counter() - start_time:.3f} s")
+
+    for name, metrics in zip(['Base case', f'Line.{line} out', 'Load +10%'], results):
+        if not metrics:
+            print(f"  {name}: did not converge")
+            continue
+        print(f"  {name}: {metrics['active_loss_mw']:.2f} MW losses, "
+              f"voltage {metrics['min_voltage']:.3f} - {metrics['max_voltage']:.3f} pu")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import numpy as np
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+# Converged solutions live next to the DSS files the simulation scripts are run from
+SOLVE_CACHE_DIR = '.solve_cache'
+
+# Entries kept on disk and in memory before the least recently used are evicted
+MAX_DISK_ENTRIES = 1024
+MAX_MEMORY_ENTRIES = 128
+
+# Load and generation multipliers closer than this share a cache entry
+LOAD_RESOLUTION = 1e-4
+
+# In-memory LRU layer in front of the disk cache
+_memory = OrderedDict()
+
+def make_key(model_hash, load_vector, solver_options, resolution=LOAD_RESOLUTION):
+    """Hash the model, the quantized load/generation vector and the solver options"""
+    quantized = np.round(np.asarray(load_vector, dtype=float) / resolution).astype(np.int64)
+
+    digest = hashlib.sha256()
+    digest.update(model_hash.encode())
+    digest.update(quantized.tobytes())
+    digest.update(json.dumps(solver_options, sort_keys=True).encode())
+    return digest.hexdigest()[:24]
+
+def entry_path(key):
+    """File holding the cached solution for a key"""
+    return os.path.join(SOLVE_CACHE_DIR, f'{key}.npz')
+
+def lookup(key):
+    """Return the cached solution for a key, or None
+
+    The result is a dict with 'voltages', 'node_order' and 'metrics'.
+    """
+    if key in _memory:
+        _memory.move_to_end(key)
+        return _memory[key]
+
+    path = entry_path(key)
+    if not os.path.isfile(path):
+        return None
+
+    try:
+        with np.load(path) as data:
+            entry = {
+                'voltages': data['voltages'],
+                'node_order': data['node_order'].tolist(),
+                'metrics': json.loads(str(data['metrics']))
+            }
+    except FileNotFoundError:
+        # Evicted by another process since the check above
+        return None
+    except Exception as e:
+        print(f"WARNING: Discarding unreadable solve cache entry {path}: {str(e)}")
+        discard(path)
+        return None
+
+    # Touch the file so disk eviction sees it as recently used
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    remember(key, entry)
+    return entry
+
+def store(key, voltages, node_order, metrics):
+    """Cache a converged solution under a key"""
+    entry = {
+        'voltages': np.asarray(voltages),
+        'node_order': list(node_order),
+        'metrics': dict(metrics)
+    }
+    remember(key, entry)
+
+    try:
+        os.makedirs(SOLVE_CACHE_DIR, exist_ok=True)
+
+        # Write to a scratch file first so readers never see half an entry
+        path = entry_path(key)
+        tmp_path = f'{path}.{os.getpid()}.tmp.npz'
+        np.savez(tmp_path,
+                 voltages=entry['voltages'],
+                 node_order=np.array(entry['node_order']),
+                 metrics=json.dumps(entry['metrics']))
+        os.replace(tmp_path, path)
+
+        evict_disk_entries()
+        return True
+
+    except Exception as e:
+        print(f"ERROR saving solve cache entry: {str(e)}")
+        return False
+
+def remember(key, entry):
+    """Add an entry to the in-memory layer, evicting the least recently used"""
+    _memory[key] = entry
+    _memory.move_to_end(key)
+    while len(_memory) > MAX_MEMORY_ENTRIES:
+        _memory.popitem(last=False)
+
+def evict_disk_entries(max_entries=MAX_DISK_ENTRIES):
+    """Delete the least recently used entries beyond max_entries"""
+    entries = [os.path.join(SOLVE_CACHE_DIR, name)
+               for name in os.listdir(SOLVE_CACHE_DIR) if name.endswith('.npz')
+               and '.tmp' not in name]
+    if len(entries) <= max_entries:
+        return
+
+    entries.sort(key=modified_time)
+    for path in entries[:len(entries) - max_entries]:
+        discard(path)
+
+def modified_time(path):
+    """Last use of a cache file, or 0 if another process removed it"""
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0
+
+def discard(path):
+    """Remove a cache file, ignoring files another process already removed"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def clear_solve_cache():
+    """Remove all cached solutions from memory and disk"""
+    _memory.clear()
+    if os.path.isdir(SOLVE_CACHE_DIR):
+        for name in os.listdir(SOLVE_CACHE_DIR):
+            discard(os.path.join(SOLVE_CACHE_DIR, name))
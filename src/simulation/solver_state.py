@@ -0,0 +1,37 @@
+import opendssdirect as dss
+import numpy as np
+
+def get_voltage_state(engine=dss):
+    """Return the engine's node voltage vector (complex, volts) and its node order"""
+    voltages = np.array(engine.Circuit.YNodeVArray()).view(complex)
+    node_order = list(engine.Circuit.YNodeOrder())
+    return voltages, node_order
+
+def set_voltage_state(voltages, node_order=None, engine=dss):
+    """Seed the engine's node voltage vector so the next Solve starts from it"""
+    try:
+        # Refuse to seed a circuit whose node ordering has changed
+        if node_order is not None and list(engine.Circuit.YNodeOrder()) != list(node_order):
+            print("WARNING: Node order changed, cannot restore voltage state")
+            return False
+
+        # The V vector only exists once the system Y matrix has been allocated
+        try:
+            v_pointer = engine.YMatrix.VVector()
+        except Exception:
+            engine.Solution.BuildYMatrix(2, True)  # 2 = whole matrix, allocate V and I
+            v_pointer = engine.YMatrix.VVector()
+
+        # Slot 0 of the engine vector is the ground reference
+        n_nodes = engine.Circuit.NumNodes()
+        ffi = engine.YMatrix._api_util.ffi
+        engine_v = np.frombuffer(ffi.buffer(v_pointer, 16 * (n_nodes + 1)), dtype=complex)
+        engine_v[1:] = np.asarray(voltages, dtype=complex)
+
+        # Tell the solver not to overwrite the seeded voltages with a flat start
+        engine.YMatrix.SolutionInitialized(True)
+        return True
+
+    except Exception as e:
+        print(f"ERROR restoring voltage state: {str(e)}")
+        return False
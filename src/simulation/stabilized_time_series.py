@@ -7,6 +7,77 @@ import os
 import sys
 import time
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+
+import adaptive_solver
+import circuit_builder
+import circuit_cache
+import dss_model
+import result_store
+import solve_cache
+import voltage_cube
+from solver_state import get_voltage_state, set_voltage_state
+from state_extraction import (get_branch_flows, get_bus_state, get_element_state,
+                              get_node_state, summarize_voltages)
+
+# Files redirected by the staged build, in the order they are added
+STAGED_BUILD_FILES = [
+    'confirm_kv_bases.dss',
+    'generators_fixed.dss',
+    'lines.dss',
+    'transformers.dss',
+    'shunts.dss',
+    'sw_shunts.dss',
+    'loads.dss'
+]
+
+# Very relaxed solution parameters used while building the circuit
+SOLVER_SETTINGS = [
+    'set algorithm=NEWTON',
+    'set maxcontroliter=1000',
+    'set maxiterations=1000',
+    'set tolerance=0.1',
+    'set controlmode=OFF'
+]
+
+# Load level the staged build converges the circuit at
+INITIAL_LOAD_MULT = 0.01
+
+# Settings stored alongside a cached circuit: the solver options and the build load level
+SNAPSHOT_SETTINGS = SOLVER_SETTINGS + [f'set loadmult={INITIAL_LOAD_MULT}']
+
+# Solver fallbacks tried in order until one converges, most accurate first
+SOLUTION_OPTIONS = [
+    {'algorithm': 'NEWTON', 'iterations': 100, 'tolerance': 0.001},
+    {'algorithm': 'NEWTON', 'iterations': 500, 'tolerance': 0.01},
+    {'algorithm': 'NEWTON', 'iterations': 1000, 'tolerance': 0.1},
+    {'algorithm': 'NORM', 'iterations': 500, 'tolerance': 0.01}
+]
+
+# Largest relative difference in hourly losses between a loadshape run and
+# snapshot solves with the same solver option; monitors record single precision
+LOADSHAPE_LOSS_TOLERANCE = 1e-6
+
+# Daily load profile (per unit of peak load)
+BASE_LOAD_MULTIPLIERS = [
+    0.65, 0.60, 0.58, 0.56, 0.55, 0.57,  # Hours 0-5
+    0.62, 0.72, 0.85, 0.95, 0.98, 1.00,  # Hours 6-11
+    0.99, 0.97, 0.95, 0.93, 0.94, 0.98,  # Hours 12-17
+    1.00, 0.97, 0.92, 0.85, 0.75, 0.68   # Hours 18-23
+]
+
+# Hourly profile used by the LoadShape mode, relative to the DSS files directory.
+# Columns besides Hour and LoadMultiplier are per-load profiles named after the load.
+LOAD_PROFILE_FILE = os.path.join('..', 'profiles', 'hourly_load_profile.csv')
+
+# Fraction of the maximum loadability the daily peak is scaled to
+LOADABILITY_MARGIN = 0.95
+
+# Refinement of a failed hour halves its sub-step after every failed solve and
+# gives up below MIN_REFINE_STEP; a converged sub-step lets the next one grow
+MIN_REFINE_STEP = 0.001
+REFINE_GROWTH = 1.5
+
 def print_section(title):
     """Print a section header"""
     print("\n" + "="*80)
@@ -14,7 +85,11 @@ def print_section(title):
     print("="*80)
 
 def fix_swing_bus():
-    """Fix the swing bus in the generators.dss file"""
+    """Write generators_fixed.dss, generators.dss with the swing bus enabled
+    
+    The file is only rewritten when generators.dss or generators_fixed.dss
+    changed since the last run.
+    """
     print_section("FIXING SWING BUS")
     
     try:
@@ -23,42 +98,61 @@ def fix_swing_bus():
             print("ERROR: generators.dss file not found")
             return None
         
-        # Check if swing bus is commented out
-        swing_bus_commented = False
-        with open('generators.dss', 'r') as f:
-            for line in f:
-                if '! New Generator.Gen_at_89_1' in line:
-                    swing_bus_commented = True
-                    print("WARNING: Swing bus is commented out in generators.dss")
-                    print("Line: " + line.strip())
-                    break
-        
-        # Create a fixed generators file if needed
-        if swing_bus_commented:
-            print("\nCreating fixed generators file...")
-            with open('generators.dss', 'r') as f:
-                lines = f.readlines()
-            
-            with open('generators_fixed.dss', 'w') as f:
-                for line in lines:
-                    if '! New Generator.Gen_at_89_1' in line:
-                        fixed_line = line.replace('! New Generator.Gen_at_89_1', 'New Generator.Gen_at_89_1')
-                        f.write(fixed_line)
-                        print("Fixed line: " + fixed_line.strip())
-                    else:
-                        f.write(line)
-            
+        # Enable the swing bus definition, however it is commented out or formatted
+        changed = dss_model.edit_file('generators.dss', 'generators_fixed.dss',
+                                      [['enable', dss_model.SWING_GENERATOR]])
+        if changed is None:
+            print("generators_fixed.dss is up to date with generators.dss")
+        elif changed:
             print("Created generators_fixed.dss with uncommented swing bus")
-            return 'generators_fixed.dss'
         else:
-            print("Swing bus is not commented out, using original file")
-            return 'generators.dss'
+            print("Swing bus is not commented out, generators_fixed.dss is a copy of generators.dss")
+        return 'generators_fixed.dss'
     
     except Exception as e:
         print(f"ERROR fixing swing bus: {str(e)}")
         return None
 
-def initialize_stabilized_circuit():
+def stabilized_build(dss_dir='.'):
+    """The staged build of the stabilized circuit, as a circuit_builder build
+    
+    The swing bus generator goes in first, then every component group,
+    solving after each one, and the loads at INITIAL_LOAD_MULT. The files
+    are read from dss_dir, so the build can be sent to any engine context
+    without changing directory.
+    """
+    def read(name):
+        return circuit_builder.read_commands(os.path.join(dss_dir, name))
+    
+    builder = circuit_builder.new_builder()
+    
+    # Define the circuit with relaxed solution parameters and voltage bases
+    circuit_builder.add_stage(builder, "Circuit definition", [
+        'Clear',
+        'Set DefaultBaseFrequency=50',
+        'New Circuit.ieee118bus basekv=138.0 phases=3 pu=1.0 angle=0 bus1=89_clinchrv',
+        'Set VoltageBases=[138.0]',
+        'Calcv'
+    ] + read('confirm_kv_bases.dss') + SOLVER_SETTINGS, solve=False)
+    
+    # First add only the swing bus generator with controlled voltage
+    circuit_builder.add_stage(builder, "Swing bus generator", [
+        'New Generator.SwingGen bus1=89_clinchrv phases=3 kV=138.0 kW=607000.0 model=3 '
+        'Vpu=1.0 maxkvar=300000.0 minkvar=-210000.0'
+    ])
+    
+    # Then the other components, solving after each group
+    circuit_builder.add_stage(builder, "Generators", read('generators_fixed.dss'))
+    circuit_builder.add_stage(builder, "Lines", read('lines.dss'))
+    circuit_builder.add_stage(builder, "Transformers", read('transformers.dss'))
+    circuit_builder.add_stage(builder, "Shunts", read('shunts.dss') + read('sw_shunts.dss'))
+    
+    # Add loads scaled to 1% of their defined kW and kvar
+    circuit_builder.add_stage(builder, "Loads at 1% level", read('loads.dss') +
+                              [f'Set LoadMult={INITIAL_LOAD_MULT}'])
+    return builder
+
+def initialize_stabilized_circuit(use_cache=True):
     """Initialize the circuit with voltage stabilization measures"""
     print_section("INITIALIZING STABILIZED CIRCUIT")
     
@@ -68,111 +162,27 @@ def initialize_stabilized_circuit():
             print("ERROR: Failed to start OpenDSS engine")
             return False
         
-        # Clear and create circuit
-        dss.Text.Command('Clear')
-        dss.Text.Command('Set DefaultBaseFrequency=50')
-        dss.Text.Command('New Circuit.ieee118bus basekv=138.0 phases=3 pu=1.0 angle=0 bus1=89_clinchrv')
-        
-        # Set voltage bases
-        dss.Text.Command('Set VoltageBases=[138.0]')
-        dss.Text.Command('Calcv')
-        dss.Text.Command('redirect confirm_kv_bases.dss')
-        
-        # Set very relaxed solution parameters
-        dss.Text.Command('set algorithm=NEWTON')
-        dss.Text.Command('set maxcontroliter=1000')
-        dss.Text.Command('set maxiterations=1000')
-        dss.Text.Command('set tolerance=0.1')
-        dss.Text.Command('set controlmode=OFF')
-        
-        print("Circuit initialized with relaxed settings")
+        # Skip the staged build if this exact circuit has been converged before
+        cache_key = circuit_cache.compute_cache_key(STAGED_BUILD_FILES, SNAPSHOT_SETTINGS)
+        if use_cache and circuit_cache.restore_snapshot(cache_key, SNAPSHOT_SETTINGS):
+            dss.Solution.Solve()
+            if dss.Solution.Converged():
+                print("Restored converged circuit from snapshot cache")
+                print_initial_metrics()
+                return True
+            print("WARNING: Cached snapshot did not converge, rebuilding circuit")
         
-        # First add only the swing bus generator with controlled voltage
-        print("\nAdding swing bus generator...")
-        dss.Text.Command('New Generator.SwingGen bus1=89_clinchrv phases=3 kV=138.0 kW=607000.0 model=3 Vpu=1.0 maxkvar=300000.0 minkvar=-210000.0')
-        
-        # Solve with just the swing bus
-        dss.Solution.Solve()
-        if not dss.Solution.Converged():
-            print("ERROR: Circuit with only swing bus generator did not converge")
-            return False
-        
-        print("Circuit with swing bus generator converged")
-        
-        # Now add other generators with controlled voltages
-        print("\nAdding other generators...")
-        dss.Text.Command('redirect generators_fixed.dss')
-        
-        # Solve with all generators
-        dss.Solution.Solve()
-        if not dss.Solution.Converged():
-            print("ERROR: Circuit with all generators did not converge")
-            return False
-        
-        print("Circuit with all generators converged")
-        
-        # Add lines
-        print("\nAdding lines...")
-        dss.Text.Command('redirect lines.dss')
-        
-        # Solve with generators and lines
-        dss.Solution.Solve()
-        if not dss.Solution.Converged():
-            print("ERROR: Circuit with generators and lines did not converge")
-            return False
-        
-        print("Circuit with generators and lines converged")
-        
-        # Add transformers
-        print("\nAdding transformers...")
-        dss.Text.Command('redirect transformers.dss')
-        
-        # Solve with generators, lines, and transformers
-        dss.Solution.Solve()
-        if not dss.Solution.Converged():
-            print("ERROR: Circuit with generators, lines, and transformers did not converge")
-            return False
-        
-        print("Circuit with generators, lines, and transformers converged")
-        
-        # Add shunts for voltage support
-        print("\nAdding shunts...")
-        dss.Text.Command('redirect shunts.dss')
-        dss.Text.Command('redirect sw_shunts.dss')
-        
-        # Solve with all components except loads
-        dss.Solution.Solve()
-        if not dss.Solution.Converged():
-            print("ERROR: Circuit with all components except loads did not converge")
-            return False
-        
-        print("Circuit with all components except loads converged")
-        
-        # Add loads at very reduced level (1%)
-        print("\nAdding loads at 1% level...")
-        dss.Text.Command('redirect loads.dss')
-        
-        # Scale all loads to 1%
-        dss.Text.Command('BatchEdit Load..* kW=0.01')
-        dss.Text.Command('BatchEdit Load..* kvar=0.01')
-        
-        # Solve with all components at 1% load
-        dss.Solution.Solve()
-        if not dss.Solution.Converged():
-            print("ERROR: Circuit with all components at 1% load did not converge")
+        # Build the circuit in stages, solving after each component group
+        if not circuit_builder.send(stabilized_build()):
             return False
         
         print("Circuit with all components at 1% load converged")
         
-        # Get initial metrics
-        metrics = get_system_metrics()
-        if metrics:
-            print("\nInitial System Metrics (1% load):")
-            print(f"  Active Losses: {metrics['active_loss_mw']:.2f} MW")
-            print(f"  Reactive Losses: {metrics['reactive_loss_mvar']:.2f} MVAR")
-            print(f"  Voltage Range: {metrics['min_voltage']:.3f} - {metrics['max_voltage']:.3f} pu")
-            print(f"  Average Voltage: {metrics['avg_voltage']:.3f} pu")
+        # Cache the converged circuit for the next run
+        if use_cache:
+            circuit_cache.save_snapshot(cache_key)
         
+        print_initial_metrics()
         return True
     
     except Exception as e:
@@ -182,47 +192,94 @@ def initialize_stabilized_circuit():
             print(f"OpenDSS Error: {error}")
         return False
 
+def print_initial_metrics():
+    """Print system metrics for the initialized circuit"""
+    metrics = get_system_metrics()
+    if metrics:
+        print("\nInitial System Metrics (1% load):")
+        print(f"  Active Losses: {metrics['active_loss_mw']:.2f} MW")
+        print(f"  Reactive Losses: {metrics['reactive_loss_mvar']:.2f} MVAR")
+        print(f"  Voltage Range: {metrics['min_voltage']:.3f} - {metrics['max_voltage']:.3f} pu")
+        print(f"  Average Voltage: {metrics['avg_voltage']:.3f} pu")
+
 def scale_loads_safely(multiplier):
     """Scale all loads with proper error handling"""
     print(f"\nScaling all loads to {multiplier*100:.0f}%...")
     try:
-        # Use BatchEdit for efficiency
-        dss.Text.Command(f'BatchEdit Load..* kW={multiplier}')
-        dss.Text.Command(f'BatchEdit Load..* kvar={multiplier}')
+        # LoadMult scales every load relative to its defined kW and kvar
+        dss.Solution.LoadMult(multiplier)
         return True
     except Exception as e:
         print(f"ERROR scaling loads: {str(e)}")
         return False
 
-def try_solve_with_options():
-    """Try to solve with multiple options"""
-    print("\nAttempting to solve with multiple options...")
+def apply_solver_options(options, engine=dss):
+    """Set the algorithm, iteration limit and tolerance of one solver option"""
+    engine.Text.Command(f"set algorithm={options['algorithm']}")
+    engine.Text.Command(f"set maxiterations={options['iterations']}")
+    engine.Text.Command(f"set tolerance={options['tolerance']}")
+
+def solver_ladder(overrides=None):
+    """SOLUTION_OPTIONS with the fields in overrides replacing their own in every option
+    
+    overrides is a dict with any of 'algorithm', 'iterations' and
+    'tolerance'. Options that become identical are only tried once.
+    """
+    ladder = []
+    for options in SOLUTION_OPTIONS:
+        options = dict(options, **(overrides or {}))
+        if options not in ladder:
+            ladder.append(options)
+    return ladder
+
+def try_solve_with_options(seed=None, stats=None, overrides=None,
+                           stats_file=adaptive_solver.STATS_FILE, engine=dss):
+    """Try to solve with multiple options
     
-    # Try different solution options
-    solution_options = [
-        {'algorithm': 'NEWTON', 'iterations': 100, 'tolerance': 0.001},
-        {'algorithm': 'NEWTON', 'iterations': 500, 'tolerance': 0.01},
-        {'algorithm': 'NEWTON', 'iterations': 1000, 'tolerance': 0.1},
-        {'algorithm': 'NORM', 'iterations': 500, 'tolerance': 0.01}
-    ]
+    If seed is a (voltages, node_order) pair, every attempt starts from it
+    instead of from whatever state the previous failed attempt left behind.
+    Iterations and attempts are accumulated into the stats dict if given,
+    and stats['option'] is set to the option that converged. The options
+    are those of solver_ladder(overrides), tried most accurate first,
+    leaving out any that adaptive_solver has seen keep failing at this
+    load level in the statistics of stats_file. engine is the OpenDSS
+    context to solve in, the module-level one unless a session's own
+    context is given.
+    """
+    print("\nAttempting to solve with multiple options...")
     
-    for i, options in enumerate(solution_options):
+    # Most accurate option first, without those that keep failing around this load level
+    load_mult = engine.Solution.LoadMult()
+    ladder = adaptive_solver.order_options(solver_ladder(overrides), load_mult, stats_file)
+    for i, options in enumerate(ladder):
         print(f"  Solution attempt {i+1}: {options['algorithm']}, tol={options['tolerance']}")
         
         # Apply options
-        dss.Text.Command(f"set algorithm={options['algorithm']}")
-        dss.Text.Command(f"set maxiterations={options['iterations']}")
-        dss.Text.Command(f"set tolerance={options['tolerance']}")
+        apply_solver_options(options, engine)
+        
+        # Start from the seed voltages rather than a failed attempt's state
+        if seed is not None:
+            set_voltage_state(*seed, engine=engine)
         
         # Try to solve
-        dss.Solution.Solve()
+        start_time = time.perf_counter()
+        engine.Solution.Solve()
+        adaptive_solver.record(options, load_mult, engine.Solution.Converged(),
+                               time.perf_counter() - start_time, engine.Solution.Iterations(),
+                               stats_file)
         
-        if dss.Solution.Converged():
+        if stats is not None:
+            stats['iterations'] = stats.get('iterations', 0) + engine.Solution.Iterations()
+            stats['attempts'] = stats.get('attempts', 0) + 1
+        
+        if engine.Solution.Converged():
             print("  SUCCESS: Solution converged!")
+            if stats is not None:
+                stats['option'] = options
             return True
         else:
             print("  FAILED: Solution did not converge")
-            error = dss.Error.Description()
+            error = engine.Error.Description()
             if error:
                 print(f"  Error: {error}")
     
@@ -238,22 +295,8 @@ def get_system_metrics():
         reactive_loss = losses[1]/1000000  # Convert to MVAR
         
         # Get voltage range
-        voltages = []
-        dss.Circuit.SetActiveBus("")
-        for bus in dss.Circuit.AllBusNames():
-            try:
-                dss.Circuit.SetActiveBus(bus)
-                v_mag = dss.Bus.puVmagAngle()[0]
-                voltages.append(v_mag)
-            except:
-                pass
-        
-        if voltages:
-            min_v = min(voltages)
-            max_v = max(voltages)
-            avg_v = sum(voltages) / len(voltages)
-        else:
-            min_v = max_v = avg_v = 0
+        bus_state = get_bus_state()
+        min_v, max_v, avg_v = summarize_voltages(bus_state['v_pu'])
         
         return {
             'active_loss_mw': active_loss,
@@ -266,67 +309,625 @@ def get_system_metrics():
         print(f"ERROR getting metrics: {str(e)}")
         return None
 
-def run_time_series():
-    """Run time series simulation with progressive loading"""
+def solution_cache_key(model_hash, multiplier, options, context=None):
+    """Solve cache key of a solution converged with one solver option"""
+    return solve_cache.make_key(model_hash, [multiplier], {'option': options, 'context': context})
+
+def lookup_solution(model_hash, multiplier, context=None, overrides=None):
+    """Most accurate cached solution at a load level, or None
+    
+    Entries are keyed by the option they converged with, so the options
+    of solver_ladder(overrides) are looked up in order, most accurate first.
+    """
+    for options in solver_ladder(overrides):
+        cached = solve_cache.lookup(solution_cache_key(model_hash, multiplier, options, context))
+        if cached:
+            return cached
+    return None
+
+def predict_voltages(history, multiplier):
+    """Extrapolate the voltage vector to a new load level from converged points"""
+    if len(history) < 2:
+        return history[-1][1]
+    
+    # Secant predictor through the last two converged points
+    (m0, v0), (m1, v1) = history[-2], history[-1]
+    if m1 == m0:
+        return v1
+    return v1 + (v1 - v0) * (multiplier - m1) / (m1 - m0)
+
+def solve_with_continuation(multiplier, history, node_order, max_step, stats, overrides=None):
+    """Move from the last converged load level to a new one with warm starts
+    
+    history holds (multiplier, voltages) for previously converged points and
+    is extended in place. Steps larger than max_step are split into predictor
+    steps, each seeded with voltages extrapolated from the ones before it.
+    """
+    last_multiplier = history[-1][0]
+    n_steps = max(1, int(np.ceil(abs(multiplier - last_multiplier) / max_step - 1e-9)))
+    if n_steps > 1:
+        print(f"Load step of {abs(multiplier - last_multiplier):.3f} exceeds {max_step:.3f}, "
+              f"inserting {n_steps - 1} predictor steps")
+    
+    for step in range(1, n_steps + 1):
+        step_multiplier = last_multiplier + (multiplier - last_multiplier) * step / n_steps
+        
+        if not scale_loads_safely(step_multiplier):
+            return False
+        
+        seed = (predict_voltages(history, step_multiplier), node_order)
+        if not try_solve_with_options(seed=seed, stats=stats, overrides=overrides):
+            return False
+        
+        voltages, _ = get_voltage_state()
+        history.append((step_multiplier, voltages))
+        del history[:-2]
+    
+    stats['steps'] = n_steps
+    return True
+
+def refine_load_step(multiplier, history, node_order, stats, overrides=None):
+    """Approach a load level that failed to converge in adaptive sub-steps
+    
+    Starts from the last converged point in history, which is extended in
+    place. Each sub-step is seeded with voltages extrapolated from the
+    converged points before it; a failed sub-step is retried at half the
+    size and a converged one lets the next grow by REFINE_GROWTH. Stops at
+    the target or once the sub-step falls below MIN_REFINE_STEP, leaving
+    the circuit solved at the highest load level reached, which is returned.
+    """
+    reached = history[-1][0]
+    step = abs(multiplier - reached) / 2
+    direction = 1 if multiplier > reached else -1
+    
+    while abs(multiplier - reached) > 1e-9 and step >= MIN_REFINE_STEP:
+        trial = reached + direction * min(step, abs(multiplier - reached))
+        print(f"\nRefining: {reached:.2%} converged, trying {trial:.2%}")
+        
+        if not scale_loads_safely(trial):
+            break
+        
+        seed = (predict_voltages(history, trial), node_order)
+        if try_solve_with_options(seed=seed, stats=stats, overrides=overrides):
+            voltages, _ = get_voltage_state()
+            history.append((trial, voltages))
+            del history[:-2]
+            reached = trial
+            stats['steps'] += 1
+            step *= REFINE_GROWTH
+        else:
+            step /= 2
+    
+    # Leave the circuit at the last point that converged
+    if abs(multiplier - reached) > 1e-9:
+        scale_loads_safely(reached)
+        set_voltage_state(history[-1][1], node_order)
+        dss.Solution.Solve()
+        return reached
+    return multiplier
+
+def find_max_load_factor(start=0.01, step=0.1, tolerance=0.005, max_multiplier=1.0):
+    """Find the highest load multiplier the circuit converges at
+    
+    Steps up from start until a solve fails, then bisects between the last
+    converged and the first failed multiplier until they are within
+    tolerance. Every solve is warm-started from voltages extrapolated from
+    the converged points. The circuit is left solved at the nose point.
+    Returns a dict with the nose point and its limiting buses, or None if
+    the starting point does not converge.
+    """
+    print_section("LOADABILITY SEARCH")
+    
+    stats = {'iterations': 0, 'attempts': 0}
+    
+    if not scale_loads_safely(start) or not try_solve_with_options(stats=stats):
+        print(f"ERROR: Circuit does not converge at the starting load of {start:.2%}")
+        return None
+    
+    voltages, node_order = get_voltage_state()
+    history = [(start, voltages)]
+    bus_history = [(start, get_bus_state())]
+    
+    lower, upper = start, None
+    solves = 1
+    
+    while True:
+        # Bracket the nose point first, then bisect it
+        if upper is None:
+            if lower >= max_multiplier:
+                break
+            trial = min(lower + step, max_multiplier)
+        else:
+            if upper - lower <= tolerance:
+                break
+            trial = (lower + upper) / 2
+        
+        print(f"\nLoadability search: {lower:.2%} converged, "
+              f"{'-' if upper is None else f'{upper:.2%}'} failed, trying {trial:.2%}")
+        
+        if not scale_loads_safely(trial):
+            return None
+        
+        seed = (predict_voltages(history, trial), node_order)
+        solves += 1
+        if try_solve_with_options(seed=seed, stats=stats):
+            voltages, _ = get_voltage_state()
+            history.append((trial, voltages))
+            del history[:-2]
+            bus_history.append((trial, get_bus_state()))
+            del bus_history[:-2]
+            lower = trial
+        else:
+            upper = trial
+    
+    adaptive_solver.save_stats()
+    
+    # Leave the circuit solved at the nose point
+    scale_loads_safely(lower)
+    set_voltage_state(history[-1][1], node_order)
+    dss.Solution.Solve()
+    
+    result = {
+        'max_load_factor': lower,
+        'failed_load_factor': upper,
+        'solves': solves,
+        'iterations': stats['iterations'],
+        'limiting_buses': get_limiting_buses(bus_history)
+    }
+    
+    print(f"\nMaximum converged load: {lower:.2%}"
+          + (f" (fails at {upper:.2%})" if upper is not None else " (search limit reached)"))
+    print(f"Solves: {solves}, iterations: {stats['iterations']}")
+    print("Limiting buses (voltage, drop per unit load):")
+    for bus, v_pu, sensitivity in result['limiting_buses']:
+        print(f"  {bus}: {v_pu:.3f} pu, {sensitivity:.3f} pu")
+    
+    return result
+
+def get_limiting_buses(bus_history, count=5):
+    """Buses whose voltage falls fastest with load at the last converged point"""
+    multiplier, state = bus_history[-1]
+    v_pu = state['v_pu']
+    
+    if len(bus_history) < 2:
+        sensitivity = np.zeros(len(v_pu))
+    else:
+        previous_multiplier, previous_state = bus_history[-2]
+        sensitivity = (previous_state['v_pu'] - v_pu) / (multiplier - previous_multiplier)
+    
+    # Rank by sensitivity, then by how low the voltage already is
+    order = np.lexsort((v_pu, -sensitivity))[:count]
+    return [(str(state['bus_names'][i]), float(v_pu[i]), float(sensitivity[i])) for i in order]
+
+def run_time_series(continuation=False, max_step=0.05, max_load_factor=None,
+                    use_solve_cache=True, loadshape=False, refine=False, check_loadshape=False):
+    """Run time series simulation with progressive loading
+    
+    With continuation=True each hour is warm-started from the previous
+    hour's converged voltages, and load steps larger than max_step are
+    split into predictor steps. Without a max_load_factor the profile is
+    scaled to just below the nose point found by find_max_load_factor().
+    With loadshape=True the profile from LOAD_PROFILE_FILE is run by
+    OpenDSS itself in daily/yearly mode instead of hour by hour, and with
+    check_loadshape=True its losses are compared with snapshot solves. With
+    refine=True hours that fail to converge are approached in smaller load
+    steps instead of being left out.
+    """
     print_section("RUNNING TIME SERIES SIMULATION")
     
     # Create output directory
     os.makedirs('simulation_results', exist_ok=True)
     
-    # Define load multipliers for 24 hours
-    # Scale these down to a maximum that works for the system
-    # For example, if the system only converges up to 60%, scale all values by 0.6
-    max_load_factor = 0.4  # Adjusted based on diagnostic results
-    
-    base_load_multipliers = [
-        0.65, 0.60, 0.58, 0.56, 0.55, 0.57,  # Hours 0-5
-        0.62, 0.72, 0.85, 0.95, 0.98, 1.00,  # Hours 6-11
-        0.99, 0.97, 0.95, 0.93, 0.94, 0.98,  # Hours 12-17
-        1.00, 0.97, 0.92, 0.85, 0.75, 0.68   # Hours 18-23
-    ]
+    # Scale the daily profile so its peak stays below the maximum loadability
+    if max_load_factor is None:
+        loadability = find_max_load_factor()
+        if not loadability:
+            print("\nFailed to find a convergent load level")
+            return False
+        max_load_factor = loadability['max_load_factor'] * LOADABILITY_MARGIN
     
     # Scale the multipliers
-    load_multipliers = [m * max_load_factor for m in base_load_multipliers]
+    base_multipliers, load_profiles = BASE_LOAD_MULTIPLIERS, {}
+    if loadshape and os.path.isfile(LOAD_PROFILE_FILE):
+        base_multipliers, load_profiles = read_load_profiles(LOAD_PROFILE_FILE)
+    load_multipliers = [m * max_load_factor for m in base_multipliers]
+    load_profiles = {name: [m * max_load_factor for m in profile]
+                     for name, profile in load_profiles.items()}
+    
+    # Write every hour to the result store and render the reports from it
+    writer = result_store.open_run()
+    
+    # Full per-phase voltages go to a memory-mapped cube instead of memory, one per run
+    cube = voltage_cube.create_cube(dss.Circuit.AllBusNames(), len(load_multipliers),
+                                    voltage_cube.cube_dir(writer['run_id']))
+    
+    if loadshape:
+        loadshape_results = simulate_loadshape(load_multipliers, load_profiles, writer=writer, cube=cube)
+        if check_loadshape:
+            compare_loadshape(loadshape_results, load_multipliers, load_profiles)
+    else:
+        simulate_profile(load_multipliers, continuation, max_step,
+                         use_solve_cache=use_solve_cache, writer=writer, cube=cube,
+                         refine=refine)
+    run_id = result_store.close_run(writer)
+    voltage_cube.flush_cube(cube)
+    print(f"\nResults stored under run ID {run_id}, voltages in {cube['directory']}")
+    
+    results = result_store.read_system_results(run_id)
+    
+    # Create visualizations if we have results
+    if results:
+        create_visualizations(results)
+        save_results_to_file(results, max_load_factor)
+        return True
+    else:
+        print("\nNo results to save")
+        return False
+
+def simulate_profile(load_multipliers, continuation=False, max_step=0.05,
+                     use_solve_cache=False, cache_context=None, writer=None, cube=None,
+                     first_hour=0, refine=False, solver_overrides=None):
+    """Solve the circuit for each hour of a load profile and collect metrics
     
+    With use_solve_cache=True, hours at an operating point solved before
+    (in this or an earlier run) reuse the cached solution. cache_context
+    describes any changes made to the circuit beyond the DSS files, such as
+    disabled elements, so they are part of the cache key. If a result store
+    writer is given, bus voltages and element losses and flows are recorded
+    for every solved hour, and if a voltage cube is given every node voltage
+    is written into it at the hour's index. Hours are numbered from
+    first_hour, so a long profile can be run in consecutive pieces.
+    
+    With refine=True an hour that fails to converge is approached from the
+    last converged point with refine_load_step(). If it still falls short,
+    the hour is recorded at the highest load level reached, with
+    'target_multiplier' holding the load level it was meant to have.
+    
+    solver_overrides replaces fields of every solver option, as
+    solver_ladder() describes, for this profile only.
+    """
     # Store results
     results = []
     
+    # Converged (multiplier, voltages) points used to seed the next hour
+    history = []
+    node_order = None
+    
+    # Refinement of the first hour starts from the state the circuit is in
+    if refine and dss.Solution.Converged():
+        voltages, node_order = get_voltage_state()
+        history = [(dss.Solution.LoadMult(), voltages)]
+    
+    # Everything besides the load level and solver option that determines a solution
+    model_hash = None
+    if use_solve_cache:
+        model_hash = circuit_cache.compute_cache_key(STAGED_BUILD_FILES, SNAPSHOT_SETTINGS)
+    
     # Run simulation for each hour
-    for hour, multiplier in enumerate(load_multipliers):
+    for hour, multiplier in enumerate(load_multipliers, start=first_hour):
         print_section(f"HOUR {hour:02d}:00 (LOAD: {multiplier:.2%})")
         
-        # Scale loads
-        if not scale_loads_safely(multiplier):
-            print(f"Failed to scale loads for hour {hour}")
-            continue
+        stats = {'iterations': 0, 'attempts': 0, 'steps': 1}
+        start_time = time.perf_counter()
         
-        # Try to solve
-        if not try_solve_with_options():
+        cached = None
+        if model_hash:
+            cached = lookup_solution(model_hash, multiplier, cache_context, solver_overrides)
+        
+        if cached:
+            # Put the engine in the cached state instead of solving again
+            print("Reusing cached solution")
+            if not scale_loads_safely(multiplier):
+                print(f"Failed to scale loads for hour {hour}")
+                continue
+            set_voltage_state(cached['voltages'], cached['node_order'])
+            stats['steps'] = 0
+            
+            if continuation or refine:
+                node_order = cached['node_order']
+                history.append((multiplier, cached['voltages']))
+                del history[:-2]
+            converged = True
+        
+        elif continuation and history:
+            # Walk from the last converged hour to this one
+            converged = solve_with_continuation(multiplier, history, node_order, max_step, stats,
+                                                solver_overrides)
+        else:
+            # Scale loads
+            if not scale_loads_safely(multiplier):
+                print(f"Failed to scale loads for hour {hour}")
+                continue
+            
+            # Try to solve
+            converged = try_solve_with_options(stats=stats, overrides=solver_overrides)
+            
+            if converged and (continuation or refine):
+                voltages, node_order = get_voltage_state()
+                history = [(multiplier, voltages)]
+        
+        # Close in on a failed hour from the last converged point
+        reached = multiplier
+        if not converged and refine and history:
+            print(f"Failed to converge for hour {hour}, refining the load step")
+            stats['steps'] = 0
+            reached = refine_load_step(multiplier, history, node_order, stats, solver_overrides)
+            converged = stats['steps'] > 0
+            if converged and reached != multiplier:
+                print(f"Hour {hour} reached {reached:.2%} of its {multiplier:.2%} load")
+        
+        if not converged:
             print(f"Failed to converge for hour {hour}")
             continue
         
+        solve_time = time.perf_counter() - start_time
+        
         # Get metrics
-        metrics = get_system_metrics()
+        if cached:
+            metrics = dict(cached['metrics'])
+        else:
+            metrics = get_system_metrics()
+            
+            if metrics:
+                metrics['solver_option'] = adaptive_solver.option_key(stats['option'])
+            
+            # Only a solution at the hour's own load level can be reused for it
+            if metrics and model_hash and reached == multiplier:
+                solve_cache.store(solution_cache_key(model_hash, multiplier, stats['option'], cache_context),
+                                  *get_voltage_state(), metrics)
+        
         if metrics:
             metrics['hour'] = hour
-            metrics['multiplier'] = multiplier
+            metrics['multiplier'] = reached
+            metrics['target_multiplier'] = multiplier
+            metrics['iterations'] = stats['iterations']
+            metrics['attempts'] = stats['attempts']
+            metrics['steps'] = stats['steps']
+            metrics['solve_time'] = solve_time
+            metrics['cached'] = cached is not None
             results.append(metrics)
             
+            if writer is not None:
+                result_store.record_hour(writer, hour, metrics, get_bus_state(),
+                                         get_element_state(), get_branch_flows())
+            
+            if cube is not None:
+                node_state = get_node_state()
+                voltage_cube.write_voltages(cube, hour, node_state['node_names'],
+                                            node_state['v_pu'], node_state['v_angle'])
+            
             # Print key metrics
             print("\nSystem Metrics:")
             print(f"  Active Losses: {metrics['active_loss_mw']:.2f} MW")
             print(f"  Reactive Losses: {metrics['reactive_loss_mvar']:.2f} MVAR")
             print(f"  Voltage Range: {metrics['min_voltage']:.3f} - {metrics['max_voltage']:.3f} pu")
             print(f"  Average Voltage: {metrics['avg_voltage']:.3f} pu")
+            if metrics['cached']:
+                print(f"  Reused cached solution in {metrics['solve_time']*1000:.3f} ms")
+            else:
+                print(f"  Iterations: {metrics['iterations']} in {metrics['steps']} step(s), "
+                      f"{metrics['solve_time']*1000:.1f} ms")
     
-    # Create visualizations if we have results
-    if results:
-        create_visualizations(results)
-        save_results_to_file(results, max_load_factor)
-        return True
-    else:
-        print("\nNo results to save")
-        return False
+    # Keep what was learned about the solver options for the next run
+    adaptive_solver.save_stats()
+    
+    return results
+
+def read_load_profiles(path):
+    """Read the system profile and any per-load profiles from a CSV file
+    
+    Returns the LoadMultiplier column and a dict of the remaining columns
+    (except Hour), keyed by load name.
+    """
+    with open(path, 'r') as f:
+        header = [name.strip() for name in f.readline().split(',')]
+        rows = [[float(value) for value in line.split(',')] for line in f if line.strip()]
+    
+    columns = {name: [row[i] for row in rows] for i, name in enumerate(header)}
+    multipliers = columns.pop('LoadMultiplier')
+    columns.pop('Hour', None)
+    return multipliers, columns
+
+def define_element(name, properties, existing):
+    """New an element, or Edit it if an earlier run already defined it"""
+    verb = 'Edit' if name.split('.', 1)[1].lower() in existing else 'New'
+    dss.Text.Command(f'{verb} {name} {properties}')
+
+def attach_monitors():
+    """Add the monitors a daily/yearly run is read back from
+    
+    One voltage monitor per bus on a terminal of a PD element at that bus,
+    a loss monitor on every line and transformer (the elements counted by
+    dss.Circuit.Losses()) and a solution monitor for iterations and
+    convergence. Returns the monitor names.
+    """
+    monitors = {'voltage': {}, 'loss': [], 'solution': 'ts_solution'}
+    existing = {name.lower() for name in dss.Monitors.AllNames()}
+    
+    for element in dss.PDElements.AllNames():
+        dss.Circuit.SetActiveElement(element)
+        for terminal, bus in enumerate(dss.CktElement.BusNames(), start=1):
+            bus = bus.split('.')[0].lower()
+            if bus not in monitors['voltage']:
+                name = f"ts_v{len(monitors['voltage'])}"
+                define_element(f'Monitor.{name}', f'element={element} terminal={terminal} '
+                               f'mode=0 VIPolar=yes enabled=yes', existing)
+                monitors['voltage'][bus] = name
+        
+        if element.lower().startswith(('line.', 'transformer.')):
+            name = f"ts_loss{len(monitors['loss'])}"
+            define_element(f'Monitor.{name}', f'element={element} terminal=1 mode=9 enabled=yes',
+                           existing)
+            monitors['loss'].append((element, name))
+    
+    define_element(f"Monitor.{monitors['solution']}", 'element=Vsource.source terminal=1 mode=5 enabled=yes',
+                   existing)
+    return monitors
+
+def read_monitor(name):
+    """Channels of a monitor as a dict of arrays, one value per time step"""
+    dss.Monitors.Name(name)
+    data = np.array(dss.Monitors.AsMatrix())
+    
+    # The first two columns are the hour and seconds of each sample
+    return {channel.strip(): data[:, i + 2] for i, channel in enumerate(dss.Monitors.Header())}
+
+def simulate_loadshape(load_multipliers, load_profiles=None, writer=None, cube=None):
+    """Run a load profile in OpenDSS daily (24 points) or yearly mode
+    
+    The profile becomes a LoadShape assigned to every load, with separate
+    LoadShapes for loads in load_profiles. OpenDSS steps through the hours
+    itself and the results are read back from monitors once at the end.
+    Returns the same per-hour metrics as simulate_profile().
+    """
+    print_section("RUNNING LOADSHAPE SIMULATION")
+    
+    n_hours = len(load_multipliers)
+    mode = 'daily' if n_hours == 24 else 'yearly'
+    results = []
+    
+    try:
+        # Shapes scale each load's defined kW and kvar, so LoadMult stays at 1
+        existing = {name.lower() for name in dss.LoadShape.AllNames()}
+        define_element('LoadShape.ts_profile', f"npts={n_hours} interval=1 "
+                       f"mult=({' '.join(str(m) for m in load_multipliers)})", existing)
+        dss.Text.Command(f'BatchEdit Load..* {mode}=ts_profile')
+        
+        for name, profile in (load_profiles or {}).items():
+            define_element(f'LoadShape.ts_{name}', f"npts={n_hours} interval=1 "
+                           f"mult=({' '.join(str(m) for m in profile)})", existing)
+            dss.Text.Command(f'Edit Load.{name} {mode}=ts_{name}')
+        
+        # Bases for converting the monitored voltages to per unit
+        bus_state = get_bus_state()
+        kv_base = dict(zip(np.char.lower(bus_state['bus_names'].astype(str)), bus_state['kv_base']))
+        
+        monitors = attach_monitors()
+        
+        # Every hour is solved with the most accurate option of the snapshot ladder,
+        # not whatever the build or the last snapshot solve left set
+        apply_solver_options(SOLUTION_OPTIONS[0])
+        
+        dss.Solution.LoadMult(1.0)
+        dss.Text.Command(f'Set mode={mode} stepsize=1h number={n_hours}')
+        dss.Monitors.ResetAll()
+        
+        start_time = time.perf_counter()
+        dss.Solution.Solve()
+        solve_time = time.perf_counter() - start_time
+        print(f"Solved {n_hours} hours in {mode} mode in {solve_time*1000:.1f} ms")
+        
+        # Pull the monitor arrays back once
+        solution = read_monitor(monitors['solution'])
+        
+        bus_names = np.array(list(monitors['voltage']))
+        n_phases = 3
+        v_pu = np.full((n_hours, len(bus_names), n_phases), np.nan)
+        v_angle = np.full((n_hours, len(bus_names), n_phases), np.nan)
+        for i, bus in enumerate(bus_names):
+            channels = read_monitor(monitors['voltage'][bus])
+            for phase in range(n_phases):
+                if f'V{phase + 1}' in channels:
+                    v_pu[:, i, phase] = channels[f'V{phase + 1}'] / (kv_base[bus] * 1000)
+                    v_angle[:, i, phase] = channels[f'VAngle{phase + 1}']
+        
+        loss_names = np.array([element for element, _ in monitors['loss']])
+        loss_kw = np.zeros((n_hours, len(loss_names)))
+        loss_kvar = np.zeros((n_hours, len(loss_names)))
+        for i, (_, name) in enumerate(monitors['loss']):
+            channels = read_monitor(name)
+            loss_kw[:, i] = channels['watts'] / 1000
+            loss_kvar[:, i] = channels['vars'] / 1000
+        
+    except Exception as e:
+        print(f"ERROR running loadshape simulation: {str(e)}")
+        error = dss.Error.Description()
+        if error:
+            print(f"OpenDSS Error: {error}")
+        return results
+    
+    finally:
+        # Back to snapshot solves, with the monitors no longer sampling
+        dss.Text.Command('Set mode=snapshot')
+        dss.Text.Command('BatchEdit Monitor.ts_.* enabled=no')
+    
+    node_names = [f'{bus}.{phase + 1}' for bus in bus_names for phase in range(n_phases)]
+    
+    for hour, multiplier in enumerate(load_multipliers):
+        if not solution['Converged'][hour]:
+            print(f"Failed to converge for hour {hour}")
+            continue
+        
+        min_v, max_v, avg_v = summarize_voltages(v_pu[hour, :, 0])
+        metrics = {
+            'active_loss_mw': loss_kw[hour].sum() / 1000,
+            'reactive_loss_mvar': loss_kvar[hour].sum() / 1000,
+            'min_voltage': min_v,
+            'max_voltage': max_v,
+            'avg_voltage': avg_v,
+            'hour': hour,
+            'multiplier': multiplier,
+            'iterations': int(solution['TotalIterations'][hour]),
+            'attempts': 1,
+            'steps': 1,
+            'solve_time': solve_time / n_hours,
+            'cached': False,
+            'solver_option': adaptive_solver.option_key(SOLUTION_OPTIONS[0])
+        }
+        results.append(metrics)
+        
+        if writer is not None:
+            bus_state = {
+                'bus_names': bus_names,
+                'v_pu': v_pu[hour, :, 0],
+                'v_angle': v_angle[hour, :, 0],
+                'kv_base': np.array([kv_base[bus] for bus in bus_names])
+            }
+            element_state = {
+                'element_names': loss_names,
+                'loss_kw': loss_kw[hour],
+                'loss_kvar': loss_kvar[hour]
+            }
+            result_store.record_hour(writer, hour, metrics, bus_state, element_state)
+        
+        if cube is not None:
+            voltage_cube.write_voltages(cube, hour, node_names,
+                                        v_pu[hour].ravel(), v_angle[hour].ravel())
+    
+    print(f"Converged hours: {len(results)} of {n_hours}")
+    return results
+
+def compare_loadshape(loadshape_results, load_multipliers, load_profiles=None):
+    """Solve the hours of a loadshape run as snapshots and compare the losses
+    
+    Only hours the snapshot loop solved with the option the loadshape run
+    uses, SOLUTION_OPTIONS[0], are compared: a looser tolerance moves the
+    losses by far more than LOADSHAPE_LOSS_TOLERANCE. Returns the largest
+    relative difference, or None if no hour can be compared.
+    """
+    print_section("CHECKING LOADSHAPE AGAINST SNAPSHOT SOLVES")
+    
+    if load_profiles:
+        print("Per-load profiles cannot be reproduced with LoadMult, skipping the check")
+        return None
+    
+    loadshape = {r['hour']: r for r in loadshape_results}
+    option = adaptive_solver.option_key(SOLUTION_OPTIONS[0])
+    differences = []
+    for r in simulate_profile(load_multipliers):
+        if r['hour'] in loadshape and r['solver_option'] == option:
+            expected = r['active_loss_mw']
+            differences.append(abs(loadshape[r['hour']]['active_loss_mw'] - expected) / max(abs(expected), 1e-12))
+    
+    if not differences:
+        print(f"No hour converged in both modes with {option}")
+        return None
+    
+    worst = max(differences)
+    status = "within" if worst <= LOADSHAPE_LOSS_TOLERANCE else "OUTSIDE"
+    print(f"Largest relative loss difference over {len(differences)} hours: {worst:.2e} "
+          f"({status} the tolerance of {LOADSHAPE_LOSS_TOLERANCE:.0e})")
+    return worst
 
 def create_visualizations(results):
     """Create visualizations of the results"""
@@ -405,6 +1006,11 @@ def create_visualizations(results):
     
     print("Visualizations saved to simulation_results directory")
 
+def short_of_target(result):
+    """Whether refinement left an hour below the load level it was meant to have"""
+    target = result.get('target_multiplier')
+    return target is not None and abs(target - result['multiplier']) > 1e-9
+
 def save_results_to_file(results, max_load_factor):
     """Save results to text file"""
     print_section("SAVING RESULTS")
@@ -420,10 +1026,13 @@ def save_results_to_file(results, max_load_factor):
         f.write("--------------\n")
         for r in results:
             f.write(f"Hour {r['hour']:02d}:00 (Load: {r['multiplier']:.2%})\n")
+            if short_of_target(r):
+                f.write(f"  Refined to {r['multiplier']:.2%} of a {r['target_multiplier']:.2%} target load\n")
             f.write(f"  Active Losses: {r['active_loss_mw']:.2f} MW\n")
             f.write(f"  Reactive Losses: {r['reactive_loss_mvar']:.2f} MVAR\n")
             f.write(f"  Voltage Range: {r['min_voltage']:.3f} - {r['max_voltage']:.3f} pu\n")
-            f.write(f"  Average Voltage: {r['avg_voltage']:.3f} pu\n\n")
+            f.write(f"  Average Voltage: {r['avg_voltage']:.3f} pu\n")
+            f.write(f"  Iterations: {r['iterations']} ({r['steps']} step(s), {r['solve_time']*1000:.1f} ms)\n\n")
         
         # Write summary statistics
         f.write("\nSummary Statistics:\n")
@@ -444,7 +1053,22 @@ def save_results_to_file(results, max_load_factor):
             f.write(f"Minimum reactive losses: {min(reactive_losses):.2f} MVAR\n\n")
             
             f.write(f"Lowest voltage: {min(min_voltages):.3f} pu\n")
-            f.write(f"Highest voltage: {max(max_voltages):.3f} pu\n")
+            f.write(f"Highest voltage: {max(max_voltages):.3f} pu\n\n")
+            
+            iterations = [r['iterations'] for r in results]
+            solve_times = [r['solve_time'] for r in results]
+            f.write(f"Average iterations per hour: {sum(iterations)/len(iterations):.1f}\n")
+            f.write(f"Total solve time: {sum(solve_times):.3f} s\n")
+            f.write(f"Hours reusing a cached solution: {sum(r['cached'] for r in results)}\n")
+            f.write(f"Hours short of their target load: {sum(short_of_target(r) for r in results)}\n")
+            
+            # Hours solved with a looser tolerance than the first option are worth knowing about
+            options_used = {}
+            for r in results:
+                option = r.get('solver_option') or 'unknown'
+                options_used[option] = options_used.get(option, 0) + 1
+            for option, count in sorted(options_used.items()):
+                f.write(f"Hours solved with {option}: {count}\n")
         
         # Write quadratic relationship
         f.write("\nLoad-Loss Relationship:\n")
@@ -482,8 +1106,18 @@ def main():
             print("Failed to initialize stabilized circuit")
             return
         
+        # Use a fixed peak load factor if one is given, otherwise search for it
+        max_load_factor = None
+        if '--max-load' in sys.argv:
+            max_load_factor = float(sys.argv[sys.argv.index('--max-load') + 1])
+        
         # Run time series simulation
-        run_time_series()
+        run_time_series(continuation='--continuation' in sys.argv,
+                        max_load_factor=max_load_factor,
+                        use_solve_cache='--no-solve-cache' not in sys.argv,
+                        loadshape='--loadshape' in sys.argv,
+                        refine='--refine' in sys.argv,
+                        check_loadshape='--check-loadshape' in sys.argv)
         
     except Exception as e:
         print(f"ERROR: {str(e)}")
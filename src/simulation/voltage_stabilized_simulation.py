@@ -3,6 +3,10 @@ import os
 import sys
 import time
 
+import circuit_builder
+import dss_model
+import time_series
+
 def print_section(title):
     """Print a section header"""
     print("\n" + "="*80)
@@ -10,7 +14,11 @@ def print_section(title):
     print("="*80)
 
 def fix_swing_bus():
-    """Fix the swing bus in the generators.dss file"""
+    """Read the generator definitions with the swing bus fixed in memory
+    
+    Returns the list of generator commands, or None if generators.dss is
+    missing. No fixed copy of the file is written.
+    """
     print_section("FIXING SWING BUS")
     
     try:
@@ -19,128 +27,69 @@ def fix_swing_bus():
             print("ERROR: generators.dss file not found")
             return None
         
-        # Check if swing bus is commented out
-        swing_bus_commented = False
-        with open('generators.dss', 'r') as f:
-            for line in f:
-                if '! New Generator.Gen_at_89_1' in line:
-                    swing_bus_commented = True
-                    print("WARNING: Swing bus is commented out in generators.dss")
-                    print("Line: " + line.strip())
-                    break
-        
-        # Create a fixed generators file if needed
-        if swing_bus_commented:
-            print("\nCreating fixed generators file...")
-            with open('generators.dss', 'r') as f:
-                lines = f.readlines()
-            
-            with open('generators_fixed.dss', 'w') as f:
-                for line in lines:
-                    if '! New Generator.Gen_at_89_1' in line:
-                        fixed_line = line.replace('! New Generator.Gen_at_89_1', 'New Generator.Gen_at_89_1')
-                        f.write(fixed_line)
-                        print("Fixed line: " + fixed_line.strip())
-                    else:
-                        f.write(line)
-            
-            print("Created generators_fixed.dss with uncommented swing bus")
-            return 'generators_fixed.dss'
+        # Check if swing bus is commented out, however the file is formatted
+        swing = dss_model.find_definition(dss_model.read_source('generators.dss'),
+                                          dss_model.SWING_GENERATOR)
+        if swing is not None and swing['commented']:
+            print("WARNING: Swing bus is commented out in generators.dss")
+            print("Line: " + swing['lines'][0].strip())
+            print("\nEnabling swing bus in memory...")
         else:
             print("Swing bus is not commented out, using original file")
-            return 'generators.dss'
+        
+        # Enable the swing bus in the commands sent to the engine
+        return circuit_builder.read_commands('generators.dss', [['enable', dss_model.SWING_GENERATOR]])
     
     except Exception as e:
         print(f"ERROR fixing swing bus: {str(e)}")
         return None
 
-def create_voltage_stabilized_circuit():
-    """Create a circuit file with voltage stabilization measures"""
+def create_voltage_stabilized_circuit(generators):
+    """Build the voltage-stabilized circuit in memory, one stage per component group
+    
+    generators are the generator commands from fix_swing_bus(). Every stage
+    is solved before the next one is added.
+    """
     print_section("CREATING VOLTAGE-STABILIZED CIRCUIT")
     
     try:
-        # Create a modified master file with voltage stabilization
-        with open('voltage_stabilized_circuit.dss', 'w') as f:
-            f.write("""Clear
-
-! Set system base frequency
-Set DefaultBaseFrequency=50
-
-! Define the circuit with controlled settings
-New Circuit.ieee118bus
-~ basekv=138.0 
-~ phases=3 
-~ pu=1.0
-~ angle=0
-~ bus1=89_clinchrv
-
-! Set voltage bases
-Set VoltageBases = [138.0]
-Calcv
-redirect confirm_kv_bases.dss
-
-! Very relaxed solution parameters
-set algorithm=NEWTON
-set maxcontroliter=1000
-set maxiterations=1000
-set tolerance=0.1
-set controlmode=OFF
-
-! First add only the swing bus generator with controlled voltage
-New Generator.SwingGen bus1=89_clinchrv phases=3 kV=138.0 kW=607000.0 model=3 Vpu=1.0 maxkvar=300000.0 minkvar=-210000.0
-
-! Solve with just the swing bus
-Solve
-
-! Now add other generators with controlled voltages
-redirect generators_fixed.dss
-
-! Solve with all generators
-Solve
-
-! Add lines
-redirect lines.dss
-
-! Solve with generators and lines
-Solve
-
-! Add transformers
-redirect transformers.dss
-
-! Solve with generators, lines, and transformers
-Solve
-
-! Add shunts for voltage support
-redirect shunts.dss
-redirect sw_shunts.dss
-
-! Solve with all components except loads
-Solve
-
-! Add loads at very reduced level (1%)
-redirect loads.dss
-
-! Scale all loads to 1%
-BatchEdit Load..* kW=0.01
-BatchEdit Load..* kvar=0.01
-
-! Solve with all components at 1% load
-Solve
-
-! Show initial results
-show voltages ln Nodes
-show losses
-""")
-        
-        print("Created voltage_stabilized_circuit.dss")
-        return True
+        builder = circuit_builder.new_builder()
+        
+        # Define the circuit with controlled settings and voltage bases
+        circuit_builder.add_stage(builder, "Circuit definition", [
+            'Clear',
+            'Set DefaultBaseFrequency=50',
+            'New Circuit.ieee118bus basekv=138.0 phases=3 pu=1.0 angle=0 bus1=89_clinchrv',
+            'Set VoltageBases=[138.0]',
+            'Calcv'
+        ] + circuit_builder.read_commands('confirm_kv_bases.dss') + time_series.SOLVER_SETTINGS, solve=False)
+        
+        # First add only the swing bus generator with controlled voltage
+        circuit_builder.add_stage(builder, "Swing bus generator", [
+            'New Generator.SwingGen bus1=89_clinchrv phases=3 kV=138.0 kW=607000.0 model=3 '
+            'Vpu=1.0 maxkvar=300000.0 minkvar=-210000.0'
+        ])
+        
+        # Then the other components, solving after each group
+        circuit_builder.add_stage(builder, "Generators", generators)
+        circuit_builder.add_stage(builder, "Lines", circuit_builder.read_commands('lines.dss'))
+        circuit_builder.add_stage(builder, "Transformers", circuit_builder.read_commands('transformers.dss'))
+        circuit_builder.add_stage(builder, "Shunts", circuit_builder.read_commands('shunts.dss') +
+                                  circuit_builder.read_commands('sw_shunts.dss'))
+        
+        # Add loads scaled to 1% of their defined kW and kvar
+        circuit_builder.add_stage(builder, "Loads at 1% level", circuit_builder.read_commands('loads.dss') +
+                                  [f'Set LoadMult={time_series.INITIAL_LOAD_MULT}'])
+        
+        print(f"Built voltage-stabilized circuit in memory ({len(builder['stages'])} stages)")
+        return builder
     
     except Exception as e:
         print(f"Error creating voltage-stabilized circuit: {str(e)}")
-        return False
+        return None
 
-def run_voltage_stabilized_simulation():
-    """Run a simulation with voltage stabilization measures"""
+def run_voltage_stabilized_simulation(builder):
+    """Run a simulation with voltage stabilization measures on a circuit build"""
     print_section("RUNNING VOLTAGE-STABILIZED SIMULATION")
     
     try:
@@ -149,12 +98,9 @@ def run_voltage_stabilized_simulation():
             print("ERROR: Failed to start OpenDSS engine")
             return False
         
-        # Use the voltage-stabilized circuit
+        # Send the voltage-stabilized circuit to the engine, one batch per stage
         print("Loading voltage-stabilized circuit...")
-        dss.Text.Command('Redirect voltage_stabilized_circuit.dss')
-        
-        # Check if circuit was created
-        if dss.Circuit.Name() == '':
+        if not circuit_builder.send(builder) or dss.Circuit.Name() == '':
             print("ERROR: Failed to create circuit")
             return False
         
@@ -170,74 +116,13 @@ def run_voltage_stabilized_simulation():
         # Create output directory
         os.makedirs('simulation_results', exist_ok=True)
         
-        # Progressive loading test
-        print_section("PROGRESSIVE LOADING TEST")
+        # Search for the highest load level that still converges
+        loadability = time_series.find_max_load_factor(start=0.01)
+        if not loadability:
+            print("ERROR: Circuit did not converge at the starting load level")
+            return False
         
-        load_levels = [0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]
-        max_converged_level = 0.01  # We already know 1% works
-        
-        for level in load_levels:
-            print(f"\nTesting at {level*100:.0f}% load...")
-            
-            # Scale all loads
-            dss.Text.Command(f'BatchEdit Load..* kW={level}')
-            dss.Text.Command(f'BatchEdit Load..* kvar={level}')
-            
-            # Try to solve with multiple options
-            solution_options = [
-                {'algorithm': 'NEWTON', 'iterations': 100, 'tolerance': 0.001},
-                {'algorithm': 'NEWTON', 'iterations': 500, 'tolerance': 0.01},
-                {'algorithm': 'NEWTON', 'iterations': 1000, 'tolerance': 0.1},
-                {'algorithm': 'NORM', 'iterations': 500, 'tolerance': 0.01}
-            ]
-            
-            converged = False
-            
-            for i, options in enumerate(solution_options):
-                print(f"  Solution attempt {i+1}: {options['algorithm']}, tol={options['tolerance']}")
-                
-                # Apply options
-                dss.Text.Command(f"set algorithm={options['algorithm']}")
-                dss.Text.Command(f"set maxiterations={options['iterations']}")
-                dss.Text.Command(f"set tolerance={options['tolerance']}")
-                
-                # Try to solve
-                dss.Solution.Solve()
-                
-                if dss.Solution.Converged():
-                    print(f"  SUCCESS: Converged at {level*100:.0f}% load")
-                    converged = True
-                    max_converged_level = level
-                    
-                    # Get system metrics
-                    losses = dss.Circuit.Losses()
-                    print(f"  Losses: {losses[0]/1000000:.2f} MW, {losses[1]/1000000:.2f} MVAR")
-                    
-                    # Get voltage range
-                    voltages = []
-                    dss.Circuit.SetActiveBus("")
-                    for bus in dss.Circuit.AllBusNames():
-                        try:
-                            dss.Circuit.SetActiveBus(bus)
-                            v_mag = dss.Bus.puVmagAngle()[0]
-                            voltages.append(v_mag)
-                        except:
-                            pass
-                    
-                    if voltages:
-                        min_v = min(voltages)
-                        max_v = max(voltages)
-                        avg_v = sum(voltages) / len(voltages)
-                        print(f"  Voltage range: {min_v:.3f} - {max_v:.3f} pu, Avg: {avg_v:.3f} pu")
-                    
-                    break
-                else:
-                    print(f"  FAILED: Did not converge at {level*100:.0f}% load")
-            
-            if not converged:
-                print(f"\nWARNING: Could not converge at {level*100:.0f}% load")
-                print(f"Maximum converged load level: {max_converged_level*100:.0f}%")
-                break
+        max_converged_level = loadability['max_load_factor']
         
         # Summary
         print_section("SIMULATION SUMMARY")
@@ -256,7 +141,12 @@ def run_voltage_stabilized_simulation():
         with open('simulation_results/voltage_stabilized_results.txt', 'w') as f:
             f.write("Voltage-Stabilized Simulation Results\n")
             f.write("===================================\n\n")
-            f.write(f"Maximum converged load level: {max_converged_level*100:.0f}%\n\n")
+            f.write(f"Maximum converged load level: {max_converged_level*100:.1f}%\n\n")
+            
+            f.write("Limiting buses (voltage, drop per unit load):\n")
+            for bus, v_pu, sensitivity in loadability['limiting_buses']:
+                f.write(f"  {bus}: {v_pu:.3f} pu, {sensitivity:.3f} pu\n")
+            f.write("\n")
             
             if max_converged_level >= 1.0:
                 f.write("The system converges at full load (100%).\n")
@@ -288,18 +178,24 @@ def run_voltage_stabilized_simulation():
 def main():
     try:
         # Fix the swing bus
-        generators_file = fix_swing_bus()
-        if not generators_file:
+        generators = fix_swing_bus()
+        if generators is None:
             print("Failed to fix or verify swing bus")
             return
         
         # Create voltage-stabilized circuit
-        if not create_voltage_stabilized_circuit():
+        builder = create_voltage_stabilized_circuit(generators)
+        if not builder:
             print("Failed to create voltage-stabilized circuit")
             return
         
+        # Only write the circuit to disk when asked to
+        if '--export' in sys.argv:
+            path = circuit_builder.export(builder, 'voltage_stabilized_circuit.dss')
+            print(f"Exported voltage-stabilized circuit to {path}")
+        
         # Run voltage-stabilized simulation
-        run_voltage_stabilized_simulation()
+        run_voltage_stabilized_simulation(builder)
         
     except Exception as e:
         print(f"ERROR: {str(e)}")
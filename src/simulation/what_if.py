@@ -0,0 +1,164 @@
+import opendssdirect as dss
+import contextlib
+import numpy as np
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+
+import adaptive_solver
+import time_series
+from solver_state import get_voltage_state, set_voltage_state
+from state_extraction import get_bus_state
+
+# Solver statistics of what-if solves, kept apart from those of the base time series
+STATS_FILE = '.what_if_solver_stats.json'
+
+# Solver options the fallback ladder sets on every attempt
+LADDER_OPTIONS = ['algorithm', 'maxiterations', 'tolerance']
+
+def take_snapshot():
+    """Record the converged base state that what-if changes are undone to
+
+    The snapshot holds the node voltages and load level. Property values
+    are only read when a change is made through it, so taking a snapshot
+    costs one voltage copy however large the circuit is.
+    """
+    voltages, node_order = get_voltage_state()
+    return {
+        'voltages': voltages,
+        'node_order': node_order,
+        'load_mult': dss.Solution.LoadMult(),
+        'changes': []
+    }
+
+def get_property(element, name):
+    """Current value of an element property, as the DSS text interface reports it"""
+    dss.Text.Command(f'? {element}.{name}')
+    return dss.Text.Result()
+
+def set_property(snapshot, element, name, value):
+    """Change an element property, such as a generator's Vpu, keeping its base value"""
+    snapshot['changes'].append(('property', element, name, get_property(element, name)))
+    dss.Text.Command(f'{element}.{name}={value}')
+
+def set_option(snapshot, name, value):
+    """Change a solver option, such as the algorithm, keeping its base value"""
+    dss.Text.Command(f'get {name}')
+    snapshot['changes'].append(('option', None, name, dss.Text.Result()))
+    dss.Text.Command(f'set {name}={value}')
+
+def disable_element(snapshot, element):
+    """Take an element such as a line out of service"""
+    dss.Circuit.SetActiveElement(element)
+    snapshot['changes'].append(('enabled', element, None, dss.CktElement.Enabled()))
+    dss.Text.Command(f'Disable {element}')
+
+    # Renumber the nodes now so seeds are matched against the new order
+    dss.Solution.BuildYMatrix(2, False)
+
+def base_seed(snapshot):
+    """The base voltages in the engine's current node order, or None if nodes are missing"""
+    node_order = list(dss.Circuit.YNodeOrder())
+    if node_order == snapshot['node_order']:
+        return snapshot['voltages'], node_order
+
+    position = {node: i for i, node in enumerate(snapshot['node_order'])}
+    if any(node not in position for node in node_order):
+        return None
+    return snapshot['voltages'][[position[node] for node in node_order]], node_order
+
+def solve(snapshot, stats=None):
+    """Solve the changed circuit, warm-started from the base voltages
+
+    The solver options the fallback ladder sets are recorded as changes,
+    so restore() puts back the base options as well.
+    """
+    logged = {name for kind, _, name, _ in snapshot['changes'] if kind == 'option'}
+    for name in LADDER_OPTIONS:
+        if name not in logged:
+            dss.Text.Command(f'get {name}')
+            snapshot['changes'].append(('option', None, name, dss.Text.Result()))
+
+    return time_series.try_solve_with_options(seed=base_seed(snapshot), stats=stats,
+                                              stats_file=STATS_FILE)
+
+def restore(snapshot):
+    """Undo every change made through the snapshot and put back the base voltages
+
+    Only the changed properties are written back, so restoring takes time
+    in proportion to the changes made, without recompiling the circuit.
+    """
+    for kind, element, name, value in reversed(snapshot['changes']):
+        if kind == 'enabled':
+            dss.Text.Command(f"{'Enable' if value else 'Disable'} {element}")
+        elif kind == 'option':
+            dss.Text.Command(f'set {name}={value}')
+        else:
+            dss.Text.Command(f'{element}.{name}={value}')
+
+    # Back to the base node numbering if elements came back into service
+    if any(kind == 'enabled' for kind, _, _, _ in snapshot['changes']):
+        dss.Solution.BuildYMatrix(2, False)
+    snapshot['changes'].clear()
+
+    dss.Solution.LoadMult(snapshot['load_mult'])
+    return set_voltage_state(snapshot['voltages'], snapshot['node_order'])
+
+@contextlib.contextmanager
+def branch(snapshot):
+    """Branch off the base state; the changes made inside are undone on exit"""
+    try:
+        yield snapshot
+    finally:
+        restore(snapshot)
+
+def main():
+    time_series.print_section("WHAT-IF ANALYSIS")
+
+    if not time_series.initialize_stabilized_circuit():
+        print("Failed to initialize stabilized circuit")
+        return
+
+    load_mult = float(sys.argv[1]) if len(sys.argv) > 1 else time_series.INITIAL_LOAD_MULT
+    if not time_series.scale_loads_safely(load_mult) or not time_series.try_solve_with_options():
+        print("Base case did not converge")
+        return
+
+    base = take_snapshot()
+    base_v = get_bus_state()['v_pu']
+
+    # One generator voltage set point, one shunt step and one line outage
+    generator = f'Generator.{dss.Generators.AllNames()[0]}'
+    capacitors = dss.Capacitors.AllNames()
+    line = f'Line.{dss.Lines.AllNames()[0]}'
+
+    cases = [(f'{generator} Vpu +0.02', 'property',
+              (generator, 'Vpu', float(get_property(generator, 'Vpu')) + 0.02))]
+    if capacitors:
+        cases.append((f'Capacitor.{capacitors[0]} switched off', 'property',
+                      (f'Capacitor.{capacitors[0]}', 'states', '[0]')))
+    cases.append((f'{line} out of service', 'disable', (line,)))
+
+    for description, kind, args in cases:
+        start_time = time.perf_counter()
+        with branch(base):
+            if kind == 'disable':
+                disable_element(base, *args)
+            else:
+                set_property(base, *args)
+
+            if solve(base):
+                v_pu = get_bus_state()['v_pu']
+                result = (f"voltage {v_pu.min():.3f} - {v_pu.max():.3f} pu, "
+                          f"largest change {np.abs(v_pu - base_v).max():.4f} pu")
+            else:
+                result = "did not converge"
+        print(f"\n{description}: {result} ({(time.perf_counter() - start_time) * 1000:.1f} ms "
+              f"including restore)")
+
+    adaptive_solver.save_stats(STATS_FILE)
+
+if __name__ == "__main__":
+    main()
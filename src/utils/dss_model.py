@@ -0,0 +1,557 @@
+import numpy as np
+import hashlib
+import json
+import os
+import re
+
+# Component files that make up the 118-bus network, in compile order
+NETWORK_FILES = [
+    'confirm_kv_bases.dss',
+    'generators.dss',
+    'lines.dss',
+    'transformers.dss',
+    'loads.dss',
+    'shunts.dss'
+]
+
+# Swing generator definition, commented out in the original generators.dss
+SWING_GENERATOR = 'Generator.Gen_at_89_1'
+
+# A property value: bracketed, quoted or bare
+_VALUE_PATTERN = r'''\[[^\]]*\]|\([^)]*\)|"[^"]*"|'[^']*'|[^\s]+'''
+
+# key=value pairs, where the value may be bracketed, quoted or bare
+_PROPERTY_PATTERN = re.compile(rf'''([^\s=]+)\s*=\s*({_VALUE_PATTERN})|(\S+)''')
+
+def strip_comments(text):
+    """Remove /* */ blocks and ! or // line comments from DSS source"""
+    text = re.sub(r'/\*.*?\*/', ' ', text, flags=re.DOTALL)
+
+    lines = []
+    for line in text.splitlines():
+        for marker in ('!', '//'):
+            position = line.find(marker)
+            if position >= 0:
+                line = line[:position]
+        lines.append(line.rstrip())
+    return lines
+
+def parse_properties(text):
+    """Split 'key=value key2=[a, b]' into a list of (key, value) pairs
+
+    Positional values without a key are returned with key None.
+    """
+    pairs = []
+    for match in _PROPERTY_PATTERN.finditer(text):
+        if match.group(1):
+            pairs.append((match.group(1).lower(), match.group(2)))
+        else:
+            pairs.append((None, match.group(3)))
+    return pairs
+
+def parse_array(value):
+    """Parse a DSS array value such as '[1.0, 0.985]' into a list of strings"""
+    value = value.strip().strip('[]()"\'')
+    return [item for item in re.split(r'[\s,]+', value) if item]
+
+def parse_float(value, default=0.0):
+    """Parse a DSS numeric value"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+def bus_name(value):
+    """Bus name without node suffixes, lower-cased like OpenDSS does"""
+    return value.split('.')[0].lower()
+
+def read_dss_file(path, options=None):
+    """Read the element definitions and setkvbase commands from a DSS file
+
+    Returns a list of dicts with 'class', 'name' and 'properties' (keys
+    lower-cased). '~' and 'more' lines continue the previous element.
+    Redirect and Compile read the named file in place, relative to the file
+    naming it. Edit, BatchEdit, Enable, Disable and 'Class.Name.prop=value'
+    commands change the elements defined before them, and Set commands are
+    collected into the options dict if one is given.
+    """
+    elements = []
+    _read_commands(path, elements, {}, options if options is not None else {})
+    return elements
+
+def _read_commands(path, elements, index, options):
+    """Apply the commands of one DSS file to the elements parsed so far"""
+    with open(path, 'r') as f:
+        lines = strip_comments(f.read())
+
+    # Elements the next '~' line continues
+    targets = []
+
+    for line in lines:
+        stripped = line.strip()
+        if not stripped:
+            continue
+
+        if stripped.startswith('~'):
+            command, rest = '~', stripped[1:]
+        else:
+            command, _, rest = stripped.partition(' ')
+        command = command.lower()
+
+        if command == 'new':
+            pairs = parse_properties(rest)
+            if not pairs:
+                continue
+
+            # First token is either 'Class.Name' or 'object=Class.Name'
+            key, value = pairs[0]
+            full_name = value if key in (None, 'object') else key
+            element_class, _, name = full_name.partition('.')
+
+            element = {
+                'class': element_class.lower(),
+                'name': name.lower(),
+                'properties': {k: v for k, v in pairs[1:] if k is not None}
+            }
+            elements.append(element)
+            index[(element['class'], element['name'])] = element
+            targets = [element]
+
+        elif command in ('~', 'more'):
+            set_properties(targets, rest)
+
+        elif command == 'edit':
+            full_name, _, rest = rest.strip().partition(' ')
+            targets = find_elements(index, full_name)
+            set_properties(targets, rest)
+
+        elif command == 'batchedit':
+            # Class.pattern, with the name a regular expression
+            full_name, _, rest = rest.strip().partition(' ')
+            element_class, _, pattern = full_name.lower().partition('.')
+            matcher = re.compile(pattern)
+            targets = [element for (cls, name), element in index.items()
+                       if cls == element_class and matcher.search(name)]
+            set_properties(targets, rest)
+
+        elif command in ('enable', 'disable'):
+            targets = find_elements(index, rest.strip())
+            set_properties(targets, f"enabled={'true' if command == 'enable' else 'false'}")
+
+        elif command in ('redirect', 'compile'):
+            file = rest.strip().strip('"\'')
+            redirected = os.path.join(os.path.dirname(path), file)
+            if os.path.isfile(redirected):
+                _read_commands(redirected, elements, index, options)
+            else:
+                print(f"WARNING: {redirected} not found, skipping")
+
+        elif command == 'set':
+            for key, value in parse_properties(rest):
+                if key is not None:
+                    options[key] = value
+
+        elif command == 'clear':
+            elements.clear()
+            index.clear()
+            options.clear()
+
+        elif command == 'setkvbase':
+            properties = dict(parse_properties(rest))
+            elements.append({
+                'class': 'kvbase',
+                'name': bus_name(properties.get('bus', '')),
+                'properties': properties
+            })
+
+        elif '=' in command and command.partition('=')[0].count('.') >= 2:
+            # Class.Name.property=value
+            target, _, value = stripped.partition(' ')[0].partition('=')
+            full_name, _, key = target.rpartition('.')
+            targets = find_elements(index, full_name)
+            set_properties(targets, f'{key}={value} {rest}')
+
+def find_elements(index, full_name):
+    """Elements named 'Class.Name' (a list of at most one)"""
+    element_class, _, name = full_name.lower().partition('.')
+    element = index.get((element_class, name))
+    return [element] if element is not None else []
+
+def set_properties(elements, text):
+    """Apply 'key=value' pairs to every element"""
+    for key, value in parse_properties(text):
+        if key is None:
+            continue
+        for element in elements:
+            element['properties'][key] = value
+
+def load_network(dss_dir='.', files=NETWORK_FILES):
+    """Parse the network files into lists of element dicts grouped by class"""
+    network = {
+        'kv_bases': {},
+        'lines': [],
+        'transformers': [],
+        'generators': [],
+        'loads': [],
+        'shunts': []
+    }
+
+    for file in files:
+        path = os.path.join(dss_dir, file)
+        if not os.path.isfile(path):
+            print(f"WARNING: {path} not found, skipping")
+            continue
+
+        for element in read_dss_file(path):
+            element_class = element['class']
+            properties = element['properties']
+
+            if element_class == 'kvbase':
+                network['kv_bases'][element['name']] = parse_float(properties.get('kvll'))
+            elif element_class == 'line':
+                network['lines'].append(element)
+            elif element_class == 'transformer':
+                network['transformers'].append(element)
+            elif element_class == 'generator':
+                network['generators'].append(element)
+            elif element_class == 'load':
+                network['loads'].append(element)
+            elif element_class in ('capacitor', 'reactor'):
+                network['shunts'].append(element)
+
+    return network
+
+# Values of the enabled property that take an element out of service
+_FALSE_VALUES = ('false', 'no', 'n', 'f')
+
+def is_enabled(element):
+    """Check the enabled property of an element definition"""
+    return element['properties'].get('enabled', 'true').lower() not in _FALSE_VALUES
+
+# Numeric columns of the typed model as (column, property, default), with the
+# OpenDSS defaults for properties a definition leaves out
+MODEL_COLUMNS = {
+    'lines': [('r1', 'r1', 0.058), ('x1', 'x1', 0.1206), ('c1', 'c1', 3.4), ('length', 'length', 1.0),
+              ('normamps', 'normamps', 400.0), ('emergamps', 'emergamps', 600.0)],
+    'transformers': [('kva', 'kva', 1000.0), ('xhl', 'xhl', 7.0)],
+    'generators': [('kv', 'kv', 12.47), ('kw', 'kw', 1000.0), ('kvar', 'kvar', 0.0), ('vpu', 'vpu', 1.0),
+                   ('model', 'model', 1), ('maxkvar', 'maxkvar', np.inf), ('minkvar', 'minkvar', -np.inf)],
+    'loads': [('kv', 'kv', 12.47), ('kw', 'kw', 10.0), ('kvar', 'kvar', 5.0), ('model', 'model', 1)],
+    'shunts': [('kv', 'kv', 12.47), ('kvar', 'kvar', 1200.0)]
+}
+
+def load_model(dss_dir='.', files=NETWORK_FILES):
+    """Parse the network files into typed arrays, without the OpenDSS engine
+
+    Returns a dict with a 'buses' table ('name', 'kv_base') and one table
+    per element class ('lines', 'transformers', 'generators', 'loads',
+    'shunts'). Each table is a dict of equally long numpy arrays: 'name',
+    'enabled', bus columns holding positions in the bus table, and the
+    numeric columns of MODEL_COLUMNS in the units of the DSS files.
+    Transformers also get per-winding 'kv1', 'kv2', 'tap1', 'tap2' and the
+    total '%r' of both windings, and shunts a 'kind' column.
+    """
+    parsed = load_network(dss_dir, files)
+
+    # Declared kV bases first, then buses only referenced by elements
+    bus_names = list(parsed['kv_bases'])
+    bus_index = {name: i for i, name in enumerate(bus_names)}
+
+    def index_of(name):
+        name = bus_name(name)
+        if name not in bus_index:
+            bus_index[name] = len(bus_names)
+            bus_names.append(name)
+        return bus_index[name]
+
+    model = {}
+    for table, columns in MODEL_COLUMNS.items():
+        elements = parsed[table]
+        data = {
+            'name': np.array([element['name'] for element in elements], dtype=str),
+            'enabled': np.array([is_enabled(element) for element in elements], dtype=bool)
+        }
+        for column, key, default in columns:
+            dtype = int if isinstance(default, int) else float
+            data[column] = np.array([parse_float(element['properties'].get(key), default)
+                                     for element in elements], dtype=dtype)
+
+        if table == 'lines':
+            data['bus1'] = np.array([index_of(e['properties'].get('bus1', '')) for e in elements], dtype=np.int32)
+            data['bus2'] = np.array([index_of(e['properties'].get('bus2', '')) for e in elements], dtype=np.int32)
+        elif table == 'transformers':
+            # Two windings each, padded where a definition gives fewer
+            windings = [((parse_array(e['properties'].get('buses', '[]')) + ['', ''])[:2],
+                         parse_array(e['properties'].get('kvs', '[12.47, 12.47]')) * 2,
+                         parse_array(e['properties'].get('taps', '[1, 1]')) * 2,
+                         parse_array(e['properties'].get('%rs', '[0.2, 0.2]'))[:2]) for e in elements]
+            data['bus1'] = np.array([index_of(buses[0]) for buses, _, _, _ in windings], dtype=np.int32)
+            data['bus2'] = np.array([index_of(buses[1]) for buses, _, _, _ in windings], dtype=np.int32)
+            data['kv1'] = np.array([parse_float(kvs[0]) for _, kvs, _, _ in windings])
+            data['kv2'] = np.array([parse_float(kvs[1]) for _, kvs, _, _ in windings])
+            data['tap1'] = np.array([parse_float(taps[0], 1.0) for _, _, taps, _ in windings])
+            data['tap2'] = np.array([parse_float(taps[1], 1.0) for _, _, taps, _ in windings])
+            data['%r'] = np.array([sum(parse_float(r) for r in rs) for _, _, _, rs in windings])
+        else:
+            data['bus'] = np.array([index_of(e['properties'].get('bus1', e['properties'].get('bus', '')))
+                                    for e in elements], dtype=np.int32)
+        if table == 'shunts':
+            data['kind'] = np.array([element['class'] for element in elements], dtype=str)
+
+        model[table] = data
+
+    model['buses'] = {
+        'name': np.array(bus_names, dtype=str),
+        'kv_base': np.array([parsed['kv_bases'].get(name, np.nan) for name in bus_names])
+    }
+    return model
+
+# Record of the edits written by edit_file(), kept next to the edited files
+EDIT_RECORD = '.dss_edits.json'
+
+# A ! or // line comment marker at the start of a line, with one space after it
+_COMMENT_PREFIX = re.compile(r'^(\s*)(?:!|//) ?')
+
+def _split_line(line):
+    """Split a source line into comment prefix, command text and the rest
+
+    The rest is the trailing whitespace, an inline comment and the line
+    ending, so prefix + code + rest is always the original line.
+    """
+    match = _COMMENT_PREFIX.match(line)
+    start = match.end() if match else 0
+    end = len(line.rstrip('\r\n'))
+    for marker in ('!', '//'):
+        position = line.find(marker, start, end)
+        if position >= 0:
+            end = position
+    end = start + len(line[start:end].rstrip())
+    return line[:start], line[start:end], line[end:]
+
+def parse_source(text):
+    """Parse DSS source into statements that render back to the same text
+
+    Each statement is a dict with the 'lines' it spans (verbatim, line
+    endings included), the lower-cased 'command' (None for blank lines and
+    comments) and 'commented'. Lines commented out with ! or // are parsed
+    like the others, so a commented-out definition can still be found and
+    enabled. Definitions made by New get 'class' and 'name', and '~' and
+    'more' lines join the definition they continue.
+    """
+    statements = []
+    in_block = False
+
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+
+        # /* */ blocks are kept as comment lines
+        if in_block or stripped.startswith('/*'):
+            in_block = '*/' not in (stripped if in_block else stripped[2:])
+            statements.append({'lines': [line], 'command': None, 'commented': True})
+            continue
+
+        _, code, _ = _split_line(line)
+        commented = _COMMENT_PREFIX.match(line) is not None
+        if code.startswith('~'):
+            command, rest = '~', code[1:]
+        else:
+            command, _, rest = code.partition(' ')
+        command = command.lower() or None
+
+        previous = statements[-1] if statements else None
+        if (command in ('~', 'more') and previous is not None and 'class' in previous
+                and previous['commented'] == commented):
+            previous['lines'].append(line)
+            continue
+
+        statement = {'lines': [line], 'command': command, 'commented': commented}
+        if command == 'new':
+            pairs = parse_properties(rest)
+            key, value = pairs[0] if pairs else (None, '')
+            full_name = value if key in (None, 'object') else key
+            if '.' in full_name:
+                element_class, _, name = full_name.lower().partition('.')
+                statement['class'] = element_class
+                statement['name'] = name
+
+        # Commented-out text that is not a definition is an ordinary comment
+        if commented and 'class' not in statement:
+            statement['command'] = None
+        statements.append(statement)
+
+    return statements
+
+def render_source(statements):
+    """The DSS source text of parsed statements"""
+    return ''.join(line for statement in statements for line in statement['lines'])
+
+def read_source(path):
+    """Parse a DSS file with parse_source(), keeping its line endings"""
+    with open(path, 'r', newline='') as f:
+        return parse_source(f.read())
+
+def definitions(statements, element_class=None):
+    """Definition statements, commented-out ones included, optionally of one class"""
+    element_class = element_class.lower() if element_class else None
+    return [statement for statement in statements if 'class' in statement and
+            (element_class is None or statement['class'] == element_class)]
+
+def find_definition(statements, full_name):
+    """The statement defining 'Class.Name', or None
+
+    An active definition is preferred over a commented-out one.
+    """
+    element_class, _, name = full_name.lower().partition('.')
+    matches = [statement for statement in definitions(statements, element_class)
+               if statement['name'] == name]
+    active = [statement for statement in matches if not statement['commented']]
+    return (active or matches or [None])[-1]
+
+def get_property(statement, key):
+    """Value of a property in a definition statement, or None if it is not given"""
+    value = None
+    for line in statement['lines']:
+        _, code, _ = _split_line(line)
+        for k, v in parse_properties(code):
+            if k == key.lower():
+                value = v
+    return value
+
+def set_property(statement, key, value):
+    """Set a property of a definition statement in place
+
+    The last occurrence of the property is rewritten and the rest of the
+    text is left as it is; a property the definition does not give yet is
+    appended to its last line. Returns True if the text changed.
+    """
+    pattern = re.compile(rf'(?<!\S){re.escape(key)}\s*=\s*({_VALUE_PATTERN})', re.IGNORECASE)
+    lines = statement['lines']
+
+    for i in reversed(range(len(lines))):
+        prefix, code, rest = _split_line(lines[i])
+        matches = list(pattern.finditer(code))
+        if matches:
+            match = matches[-1]
+            if match.group(1) == value:
+                return False
+            lines[i] = prefix + code[:match.start(1)] + value + code[match.end(1):] + rest
+            return True
+
+    prefix, code, rest = _split_line(lines[-1])
+    lines[-1] = f'{prefix}{code} {key}={value}{rest}'
+    return True
+
+def enable_element(statements, full_name):
+    """Bring a definition into service: uncomment it and clear enabled=false
+
+    Returns True if the text changed.
+    """
+    statement = find_definition(statements, full_name)
+    if statement is None:
+        return False
+
+    changed = False
+    if statement['commented']:
+        statement['lines'] = [_COMMENT_PREFIX.sub(r'\1', line, count=1) for line in statement['lines']]
+        statement['commented'] = False
+        changed = True
+
+    enabled = get_property(statement, 'enabled')
+    if enabled is not None and enabled.lower() in _FALSE_VALUES:
+        changed = set_property(statement, 'enabled', 'true') or changed
+    return changed
+
+def disable_element(statements, full_name):
+    """Take an active definition out of service with enabled=false
+
+    Returns True if the text changed.
+    """
+    statement = find_definition(statements, full_name)
+    if statement is None or statement['commented']:
+        return False
+
+    enabled = get_property(statement, 'enabled')
+    if enabled is not None and enabled.lower() in _FALSE_VALUES:
+        return False
+    return set_property(statement, 'enabled', 'false')
+
+def apply_edits(statements, edits):
+    """Apply a list of edits and return the number that changed the text
+
+    Each edit is a list: ['enable', 'Class.Name'], ['disable', 'Class.Name']
+    or ['set', 'Class.Name', property, value].
+    """
+    changed = 0
+    for action, full_name, *args in edits:
+        statement = find_definition(statements, full_name)
+        if statement is None:
+            print(f"WARNING: {full_name} is not defined, skipping {action}")
+            continue
+
+        if action == 'enable':
+            changed += enable_element(statements, full_name)
+        elif action == 'disable':
+            changed += disable_element(statements, full_name)
+        elif action == 'set':
+            changed += set_property(statement, *args)
+        else:
+            raise ValueError(f"Unknown edit action: {action}")
+    return changed
+
+def file_digest(path):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+def edit_file(source, target, edits, backup=None):
+    """Write the DSS file source to target with edits applied
+
+    The hashes of the input and output are recorded in EDIT_RECORD next to
+    target. While target still holds the output of the same edits to the
+    same source, nothing is parsed or written and None is returned;
+    otherwise the number of edits that changed the text is returned.
+    source and target may be the same file, in which case backup names a
+    copy of the original that is written before the file is changed.
+    """
+    edits = json.loads(json.dumps(edits))
+    record_path = os.path.join(os.path.dirname(os.path.abspath(target)), EDIT_RECORD)
+    records = {}
+    if os.path.isfile(record_path):
+        with open(record_path, 'r') as f:
+            records = json.load(f)
+
+    # An in-place edit finds its own output as the source on the next run
+    record = records.get(os.path.basename(target))
+    source_hash = file_digest(source)
+    if (record is not None and record['edits'] == edits and os.path.isfile(target) and
+            source_hash in (record['input'], record['output']) and
+            file_digest(target) == record['output']):
+        return None
+
+    statements = read_source(source)
+    changed = apply_edits(statements, edits)
+
+    in_place = os.path.abspath(source) == os.path.abspath(target)
+    if changed or not in_place:
+        if in_place and backup:
+            with open(source, 'rb') as original, open(backup, 'wb') as f:
+                f.write(original.read())
+
+        tmp_path = f'{target}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', newline='') as f:
+            f.write(render_source(statements))
+        os.replace(tmp_path, target)
+
+    records[os.path.basename(target)] = {
+        'edits': edits,
+        'input': source_hash,
+        'output': file_digest(target)
+    }
+    tmp_path = f'{record_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(records, f, indent=2)
+    os.replace(tmp_path, record_path)
+
+    return changed
@@ -0,0 +1,224 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import os
+import shutil
+import time
+
+# Parquet tables live under the results directory of the simulation scripts
+STORE_DIR = os.path.join('simulation_results', 'store')
+
+# Hours buffered in memory before they are written out as a part file
+FLUSH_HOURS = 168
+
+# Per-hour system metrics
+SYSTEM_SCHEMA = pa.schema([
+    ('hour', pa.int32()),
+    ('multiplier', pa.float64()),
+    ('target_multiplier', pa.float64()),
+    ('active_loss_mw', pa.float64()),
+    ('reactive_loss_mvar', pa.float64()),
+    ('min_voltage', pa.float64()),
+    ('max_voltage', pa.float64()),
+    ('avg_voltage', pa.float64()),
+    ('iterations', pa.int32()),
+    ('attempts', pa.int32()),
+    ('steps', pa.int32()),
+    ('solve_time', pa.float64()),
+    ('cached', pa.bool_()),
+    ('solver_option', pa.string())
+])
+
+# Per-hour, per-bus voltages
+BUS_SCHEMA = pa.schema([
+    ('hour', pa.int32()),
+    ('bus', pa.dictionary(pa.int32(), pa.string())),
+    ('v_pu', pa.float64()),
+    ('v_angle', pa.float64()),
+    ('kv_base', pa.float64())
+])
+
+# Per-hour, per-element losses and flows
+ELEMENT_SCHEMA = pa.schema([
+    ('hour', pa.int32()),
+    ('element', pa.dictionary(pa.int32(), pa.string())),
+    ('loss_kw', pa.float64()),
+    ('loss_kvar', pa.float64()),
+    ('p_kw', pa.float64()),
+    ('q_kvar', pa.float64()),
+    ('pct_normal', pa.float64())
+])
+
+TABLE_SCHEMAS = {
+    'system': SYSTEM_SCHEMA,
+    'bus': BUS_SCHEMA,
+    'element': ELEMENT_SCHEMA
+}
+
+# Runs are hive partitions, so run_id is a column when the tables are read back
+RUN_PARTITIONING = ds.partitioning(pa.schema([('run_id', pa.string())]), flavor='hive')
+
+def new_run_id():
+    """Run ID from the current time and process"""
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+
+def run_dir(table, run_id, root=STORE_DIR):
+    """Partition directory of one run in one table"""
+    return os.path.join(root, table, f'run_id={run_id}')
+
+def open_run(run_id=None, root=STORE_DIR, resume_parts=None):
+    """Start writing a run to the store and return its writer dict
+
+    An existing run with the same ID is replaced, unless resume_parts is
+    given: then its first resume_parts part files are kept, any later ones
+    are removed, and writing continues after them.
+    """
+    run_id = run_id or new_run_id()
+    for table in TABLE_SCHEMAS:
+        if resume_parts is None:
+            shutil.rmtree(run_dir(table, run_id, root), ignore_errors=True)
+            continue
+
+        # Parts written after the point being resumed from would duplicate hours
+        directory = run_dir(table, run_id, root)
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if name.startswith('part-') and int(name[5:10]) >= resume_parts:
+                    os.remove(os.path.join(directory, name))
+
+    return {
+        'run_id': run_id,
+        'root': root,
+        'buffers': {table: [] for table in TABLE_SCHEMAS},
+        'buffered_hours': 0,
+        'parts': resume_parts or 0
+    }
+
+def record_hour(writer, hour, metrics, bus_state=None, element_state=None, branch_flows=None):
+    """Buffer one hour of results
+
+    metrics is the dict from get_system_metrics() plus the solve statistics,
+    bus_state comes from get_bus_state(), and element_state and
+    branch_flows from get_element_state() and get_branch_flows().
+    """
+    buffers = writer['buffers']
+
+    buffers['system'].append({
+        name: [hour if name == 'hour' else metrics.get(name)] for name in SYSTEM_SCHEMA.names
+    })
+
+    if bus_state is not None:
+        buffers['bus'].append({
+            'hour': np.full(len(bus_state['bus_names']), hour, dtype=np.int32),
+            'bus': bus_state['bus_names'],
+            'v_pu': bus_state['v_pu'],
+            'v_angle': bus_state['v_angle'],
+            'kv_base': bus_state['kv_base']
+        })
+
+    if element_state is not None:
+        names = element_state['element_names']
+        columns = {
+            'hour': np.full(len(names), hour, dtype=np.int32),
+            'element': names,
+            'loss_kw': element_state['loss_kw'],
+            'loss_kvar': element_state['loss_kvar'],
+            'p_kw': np.full(len(names), np.nan),
+            'q_kvar': np.full(len(names), np.nan),
+            'pct_normal': np.full(len(names), np.nan)
+        }
+
+        # Flows only exist for PD elements, so line them up by name
+        if branch_flows is not None:
+            position = {name: i for i, name in enumerate(np.char.lower(names.astype(str)))}
+            index = np.array([position.get(name.lower(), -1) for name in branch_flows['element_names']])
+            found = index >= 0
+            columns['p_kw'][index[found]] = branch_flows['p_kw'][found]
+            columns['q_kvar'][index[found]] = branch_flows['q_kvar'][found]
+            columns['pct_normal'][index[found]] = branch_flows['pct_normal'][found]
+
+        buffers['element'].append(columns)
+
+    writer['buffered_hours'] += 1
+    if writer['buffered_hours'] >= FLUSH_HOURS:
+        flush(writer)
+
+def flush(writer):
+    """Write the buffered hours of every table as a new part file"""
+    for table, schema in TABLE_SCHEMAS.items():
+        chunks = writer['buffers'][table]
+        if not chunks:
+            continue
+
+        columns = {
+            name: np.concatenate([np.asarray(chunk[name]) for chunk in chunks])
+            for name in schema.names
+        }
+        arrays = []
+        for field in schema:
+            if pa.types.is_dictionary(field.type):
+                arrays.append(pa.array(columns[field.name].astype(str)).dictionary_encode())
+            else:
+                arrays.append(pa.array(columns[field.name], type=field.type, from_pandas=True))
+
+        directory = run_dir(table, writer['run_id'], writer['root'])
+        os.makedirs(directory, exist_ok=True)
+        pq.write_table(pa.Table.from_arrays(arrays, schema=schema),
+                       os.path.join(directory, f"part-{writer['parts']:05d}.parquet"))
+        writer['buffers'][table] = []
+
+    writer['buffered_hours'] = 0
+    writer['parts'] += 1
+
+def close_run(writer):
+    """Write out anything still buffered and return the run ID"""
+    if writer['buffered_hours']:
+        flush(writer)
+    return writer['run_id']
+
+def list_runs(root=STORE_DIR):
+    """IDs of the runs in the store"""
+    directory = os.path.join(root, 'system')
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name.split('=', 1)[1] for name in os.listdir(directory) if name.startswith('run_id='))
+
+def read_table(table, run_id=None, hours=None, columns=None, root=STORE_DIR):
+    """Read a table into a pandas DataFrame, optionally for one run and some hours"""
+    directory = os.path.join(root, table)
+    if not os.path.isdir(directory):
+        return TABLE_SCHEMAS[table].empty_table().to_pandas()
+
+    # Columns added since older runs were written read back as nulls
+    schema = pa.unify_schemas([TABLE_SCHEMAS[table], RUN_PARTITIONING.schema])
+    dataset = ds.dataset(directory, schema=schema, format='parquet', partitioning=RUN_PARTITIONING)
+
+    condition = None
+    if run_id is not None:
+        condition = ds.field('run_id') == run_id
+    if hours is not None:
+        hour_condition = ds.field('hour').isin(list(hours))
+        condition = hour_condition if condition is None else condition & hour_condition
+
+    return dataset.to_table(columns=columns, filter=condition).to_pandas()
+
+def read_system_results(run_id, root=STORE_DIR):
+    """Per-hour metrics of a run as the list of dicts simulate_profile() returns"""
+    frame = read_table('system', run_id, root=root).sort_values('hour')
+    frame = frame.drop(columns=['run_id'], errors='ignore')
+    return frame.to_dict('records')
+
+def read_bus_voltages(run_id, root=STORE_DIR):
+    """Hour x bus matrix of per unit voltages for a run
+
+    Returns (hours, bus_names, v_pu) with v_pu shaped (len(hours), len(bus_names)).
+    """
+    frame = read_table('bus', run_id, columns=['hour', 'bus', 'v_pu'], root=root)
+    hours, hour_index = np.unique(frame['hour'].to_numpy(), return_inverse=True)
+
+    # Scatter straight into the matrix using the dictionary codes of the bus column
+    buses = frame['bus'].astype('category')
+    v_pu = np.full((len(hours), len(buses.cat.categories)), np.nan)
+    v_pu[hour_index, buses.cat.codes.to_numpy()] = frame['v_pu'].to_numpy()
+    return hours, buses.cat.categories.astype(str).to_numpy(), v_pu
@@ -0,0 +1,104 @@
+import opendssdirect as dss
+import numpy as np
+
+def get_bus_state(engine=dss):
+    """Get voltages for every bus using a fixed number of bulk engine calls
+
+    Arrays are indexed by bus ID, which is the position of the bus in
+    dss.Circuit.AllBusNames(). engine is the OpenDSS context to read, the
+    module-level one unless a session's own context is given.
+    """
+    bus_names = np.array(engine.Circuit.AllBusNames())
+    node_names = engine.Circuit.AllNodeNames()
+    node_volts = np.array(engine.Circuit.AllBusVolts()).view(complex)
+    node_pu = np.array(engine.Circuit.AllBusMagPu())
+
+    # Map every node ('bus.phase') onto its bus ID
+    bus_index = {name: i for i, name in enumerate(bus_names)}
+    node_bus = np.array([bus_index[name.split('.')[0]] for name in node_names], dtype=int)
+    n_buses = len(bus_names)
+
+    # First node of each bus, as returned by Bus.puVmagAngle()[0]
+    first_node = np.full(n_buses, -1, dtype=int)
+    first_node[node_bus[::-1]] = np.arange(len(node_bus))[::-1]
+
+    node_mag = np.abs(node_volts)
+    node_count = np.bincount(node_bus, minlength=n_buses)
+
+    # Per-node base voltage follows from the actual and per unit magnitudes
+    with np.errstate(divide='ignore', invalid='ignore'):
+        node_base_kv = np.where(node_pu > 0, node_mag / node_pu / 1000, np.nan)
+        v_mean = np.bincount(node_bus, weights=node_mag, minlength=n_buses) / node_count
+
+    return {
+        'bus_names': bus_names,
+        'v_pu': node_pu[first_node],
+        'v_angle': np.degrees(np.angle(node_volts[first_node])),
+        'v_mean': v_mean,
+        'kv_base': node_base_kv[first_node],
+        'num_nodes': node_count
+    }
+
+def get_node_state(engine=dss):
+    """Get per unit magnitude and angle of every node ('bus.phase')
+
+    Arrays are in the order of dss.Circuit.AllNodeNames().
+    """
+    node_volts = np.array(engine.Circuit.AllBusVolts()).view(complex)
+
+    return {
+        'node_names': engine.Circuit.AllNodeNames(),
+        'v_pu': np.array(engine.Circuit.AllBusMagPu()),
+        'v_angle': np.degrees(np.angle(node_volts))
+    }
+
+def get_element_state(engine=dss):
+    """Get losses for every circuit element using bulk engine calls
+
+    Arrays are indexed by element ID, which is the position of the element
+    in dss.Circuit.AllElementNames(). Losses are in kW and kvar.
+    """
+    element_names = np.array(engine.Circuit.AllElementNames())
+    losses = np.array(engine.Circuit.AllElementLosses()).view(complex)
+
+    return {
+        'element_names': element_names,
+        'loss_kw': losses.real,
+        'loss_kvar': losses.imag
+    }
+
+def get_branch_flows(engine=dss):
+    """Get sending-end power flows and loading for every PD element
+
+    Arrays are indexed by the position of the element in
+    dss.PDElements.AllNames(). Flows are in kW and kvar at terminal 1.
+    """
+    names = np.array(engine.PDElements.AllNames())
+    powers = np.array(engine.PDElements.AllPowers()).view(complex)
+    n_terminals = np.array(engine.PDElements.AllNumTerminals(), dtype=int)
+    n_conductors = np.array(engine.PDElements.AllNumConductors(), dtype=int)
+
+    # Powers are packed per element, terminal by terminal, conductor by conductor
+    sizes = n_terminals * n_conductors
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    element_id = np.repeat(np.arange(len(names)), sizes)
+    position = np.arange(len(powers)) - np.repeat(starts, sizes)
+    from_terminal = position < np.repeat(n_conductors, sizes)
+
+    flow = np.bincount(element_id[from_terminal], weights=powers.real[from_terminal], minlength=len(names))
+    flow_q = np.bincount(element_id[from_terminal], weights=powers.imag[from_terminal], minlength=len(names))
+
+    return {
+        'element_names': names,
+        'p_kw': flow,
+        'q_kvar': flow_q,
+        'max_current': np.array(engine.PDElements.AllMaxCurrents()),
+        'pct_normal': np.array(engine.PDElements.AllPctNorm()),
+        'pct_emergency': np.array(engine.PDElements.AllPctEmerg())
+    }
+
+def summarize_voltages(v_pu):
+    """Min, max and average of a per unit voltage array"""
+    if len(v_pu) == 0:
+        return 0, 0, 0
+    return float(np.min(v_pu)), float(np.max(v_pu)), float(np.mean(v_pu))
@@ -0,0 +1,105 @@
+import numpy as np
+import json
+import os
+
+# Cubes live under the results directory of the simulation scripts, one per run
+CUBE_DIR = os.path.join('simulation_results', 'voltage_cube')
+
+# Phases stored per bus
+PHASES = 3
+
+def cube_dir(run_id, root=CUBE_DIR):
+    """Cube directory of one run, partitioned by run ID like the result store"""
+    return os.path.join(root, f'run_id={run_id}')
+
+def list_cubes(root=CUBE_DIR):
+    """IDs of the runs with a complete cube, oldest first"""
+    if not os.path.isdir(root):
+        return []
+    return sorted(name.split('=', 1)[1] for name in os.listdir(root)
+                  if name.startswith('run_id=') and has_cube(os.path.join(root, name)))
+
+def create_cube(bus_names, n_times, directory, n_phases=PHASES):
+    """Preallocate memory-mapped time x bus x phase voltage arrays on disk
+
+    Magnitudes (per unit) and angles (degrees) are float32 .npy files that
+    the simulation writes into in place. Entries never written stay NaN.
+    """
+    os.makedirs(directory, exist_ok=True)
+    shape = (n_times, len(bus_names), n_phases)
+
+    magnitude = np.lib.format.open_memmap(os.path.join(directory, 'magnitude.npy'),
+                                          mode='w+', dtype=np.float32, shape=shape)
+    angle = np.lib.format.open_memmap(os.path.join(directory, 'angle.npy'),
+                                      mode='w+', dtype=np.float32, shape=shape)
+    magnitude[:] = np.nan
+    angle[:] = np.nan
+
+    bus_names = [str(name) for name in bus_names]
+    with open(os.path.join(directory, 'buses.json'), 'w') as f:
+        json.dump({'bus_names': bus_names, 'n_phases': n_phases}, f)
+
+    return {
+        'directory': directory,
+        'bus_names': bus_names,
+        'bus_index': {name.lower(): i for i, name in enumerate(bus_names)},
+        'magnitude': magnitude,
+        'angle': angle,
+        'node_names': None,
+        'node_map': None
+    }
+
+def map_nodes(cube, node_names):
+    """Bus and phase position in the cube of every 'bus.phase' node name"""
+    n_phases = cube['magnitude'].shape[2]
+    bus = np.full(len(node_names), -1, dtype=int)
+    phase = np.full(len(node_names), -1, dtype=int)
+
+    for i, node in enumerate(node_names):
+        name, _, number = node.rpartition('.')
+        if not name or not number.isdigit():
+            continue
+        bus[i] = cube['bus_index'].get(name.lower(), -1)
+        phase[i] = int(number) - 1
+
+    valid = (bus >= 0) & (phase >= 0) & (phase < n_phases)
+    return bus[valid], phase[valid], valid
+
+def write_voltages(cube, index, node_names, v_pu, v_angle):
+    """Write per-node voltage magnitudes and angles for one time step in place"""
+    # The node order only changes if the circuit does, so map it once
+    if cube['node_names'] != list(node_names):
+        cube['node_names'] = list(node_names)
+        cube['node_map'] = map_nodes(cube, node_names)
+
+    bus, phase, valid = cube['node_map']
+    cube['magnitude'][index, bus, phase] = np.asarray(v_pu)[valid]
+    cube['angle'][index, bus, phase] = np.asarray(v_angle)[valid]
+
+def flush_cube(cube):
+    """Make sure everything written so far is on disk"""
+    cube['magnitude'].flush()
+    cube['angle'].flush()
+
+def open_cube(directory, mode='r'):
+    """Open a cube, read-only by default; the arrays are views onto the files, not copies
+
+    With mode='r+' the cube can be written into again, to continue a run.
+    """
+    with open(os.path.join(directory, 'buses.json'), 'r') as f:
+        metadata = json.load(f)
+
+    return {
+        'directory': directory,
+        'bus_names': metadata['bus_names'],
+        'bus_index': {name.lower(): i for i, name in enumerate(metadata['bus_names'])},
+        'magnitude': np.load(os.path.join(directory, 'magnitude.npy'), mmap_mode=mode),
+        'angle': np.load(os.path.join(directory, 'angle.npy'), mmap_mode=mode),
+        'node_names': None,
+        'node_map': None
+    }
+
+def has_cube(directory):
+    """Check whether a complete cube exists in a directory"""
+    return all(os.path.isfile(os.path.join(directory, name))
+               for name in ('magnitude.npy', 'angle.npy', 'buses.json'))
@@ -2,6 +2,11 @@ import networkx as nx
 import matplotlib.pyplot as plt
 import numpy as np
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analysis'))
+
+from modal_analysis import scenario_critical_buses
 
 def clean_bus_name(name):
     """Clean bus name by removing special characters"""
@@ -10,14 +15,14 @@ def clean_bus_name(name):
 # Create output directory
 os.makedirs('thesis_figures', exist_ok=True)
 
-# Define the key buses and their voltage levels
-bus_data = {
-    'bus89': {'voltage': 0.678, 'name': 'CLINCHRV'},
-    'bus92': {'voltage': 0.550, 'name': 'SALTVLLE'},
-    'bus77': {'voltage': 0.227, 'name': 'TURNER'},
-    'bus85': {'voltage': 0.526, 'name': 'BEAVERCK'},
-    'bus69': {'voltage': 0.161, 'name': 'SPORN'}
-}
+# The key buses are those of the least stable Q-V mode of the solved circuit
+scenario = scenario_critical_buses()
+if scenario is None:
+    sys.exit(1)
+
+bus_data = {}
+for bus, voltage in zip(scenario['Bus'], scenario['Voltage']):
+    bus_data[bus] = {'voltage': voltage, 'name': bus.partition('_')[2] or bus}
 
 # Create graph
 G = nx.Graph()
@@ -28,13 +33,8 @@ for bus_id, data in bus_data.items():
                voltage=data['voltage'],
                name=data['name'])
 
-# Add edges (connections between buses)
-edges = [
-    ('bus89', 'bus92', {'loss': 11601.50}),
-    ('bus92', 'bus77', {'loss': 8710.97}),
-    ('bus77', 'bus85', {'loss': 8700.41}),
-    ('bus85', 'bus69', {'loss': 3601.15})
-]
+# Add edges (branches between the key buses and their losses)
+edges = [(a, b, {'loss': loss}) for a, b, loss in scenario['Branches']]
 
 G.add_edges_from(edges)
 
@@ -61,10 +61,11 @@ for node in G.nodes():
 # Draw edges with width based on losses
 edge_widths = []
 edge_colors = []
+max_loss = max([d['loss'] for _, _, d in G.edges(data=True)] + [1e-9])
 for (u, v, d) in G.edges(data=True):
     if 'loss' in d:
-        # Normalize loss for width
-        width = d['loss'] / 2000  # Adjust divisor to scale line width
+        # Normalize loss for width, relative to the largest loss shown
+        width = 1 + 9 * d['loss'] / max_loss
         edge_widths.append(width)
         edge_colors.append('gray')
 
@@ -1,6 +1,14 @@
 import matplotlib.pyplot as plt
 import numpy as np
 import seaborn as sns
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analysis'))
+
+from modal_analysis import cube_critical_buses, most_critical, scenario_critical_buses
+from voltage_cube import cube_dir, list_cubes, open_cube
 
 # Time series data
 hours = np.arange(24)
@@ -8,13 +16,26 @@ load_multipliers = [0.65, 0.60, 0.58, 0.56, 0.55, 0.57, 0.62, 0.72, 0.85,
                    0.95, 0.98, 1.00, 0.99, 0.97, 0.95, 0.93, 0.94, 0.98, 
                    1.00, 0.97, 0.92, 0.85, 0.75, 0.68]
 
-# Critical bus voltages over time
-critical_buses = {
-    'Bus 89_CLINCHRV': [0.678 * m for m in load_multipliers],
-    'Bus 69_SPORN': [0.161 * m for m in load_multipliers],
-    'Bus 77_TURNER': [0.227 * m for m in load_multipliers],
-    'Bus 92_SALTVLLE': [0.550 * m for m in load_multipliers]
-}
+# Critical bus voltages over time, for the buses of the least stable Q-V mode
+critical_buses = {}
+
+# Use the simulated voltages if a time series run left a voltage cube, with
+# the critical buses found hour by hour from them
+runs = list_cubes()
+if runs:
+    cube = open_cube(cube_dir(runs[-1]))
+    if cube['magnitude'].shape[0] == len(hours):
+        steps = cube_critical_buses(cube, count=4)
+        for bus in most_critical(steps or [], count=4):
+            # Phase 1 magnitude; the memmap slice is a view, not a copy
+            critical_buses[f'Bus {bus.upper()}'] = cube['magnitude'][:, cube['bus_index'][bus], 0]
+
+# Otherwise scale the base case voltages of the critical buses with the load
+if not critical_buses:
+    scenario = scenario_critical_buses(count=4)
+    if scenario is not None:
+        for bus, voltage in zip(scenario['Bus'], scenario['Voltage']):
+            critical_buses[f'Bus {bus}'] = [voltage * m for m in load_multipliers]
 
 # System losses (approximated using quadratic relationship)
 losses = {
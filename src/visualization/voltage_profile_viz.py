@@ -4,6 +4,11 @@ import seaborn as sns
 import numpy as np
 import opendssdirect as dss
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+
+from state_extraction import get_bus_state
 
 def initialize_opendss():
     """Initialize OpenDSS and load the circuit"""
@@ -42,21 +47,12 @@ def initialize_opendss():
 
 def get_voltage_data():
     """Get voltage data for all buses"""
-    voltages = []
-    bus_names = []
-    
-    # Get all bus names
-    dss.Circuit.SetActiveBus('')
-    for bus in dss.Circuit.AllBusNames():
-        dss.Circuit.SetActiveBus(bus)
-        # Get voltage in kV
-        v_mag = dss.Bus.puVmagAngle()[0]  # Get per unit voltage magnitude
-        voltages.append(v_mag)
-        bus_names.append(bus)
+    # Per unit voltage magnitude of every bus
+    bus_state = get_bus_state()
     
     return pd.DataFrame({
-        'Bus': bus_names,
-        'Voltage (pu)': voltages
+        'Bus': bus_state['bus_names'],
+        'Voltage (pu)': bus_state['v_pu']
     })
 
 def plot_voltage_profile(df):